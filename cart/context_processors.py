@@ -1,8 +1,15 @@
+from .summary import get_cart_summary
+
+
 def cart_item_count(request):
-    """Make cart item count available in every template."""
+    """Make cart item count available in every template.
+
+    Served from the session copy kept by ``get_cart_summary``, so pages whose
+    cart has not changed issue no query for it.
+    """
     if request.user.is_authenticated:
         try:
-            count = request.user.cart.item_count
+            count = get_cart_summary(request)["count"]
         except Exception:
             count = 0
     else:
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:15
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def backfill_cart_totals(apps, schema_editor):
+    Cart = apps.get_model("cart", "Cart")
+    CartItem = apps.get_model("cart", "CartItem")
+    for cart in Cart.objects.all():
+        items = CartItem.objects.filter(cart=cart).select_related("product")
+        cart.item_count = sum(item.quantity for item in items)
+        cart.total = sum(
+            ((item.product.discount_price or item.product.price) * item.quantity for item in items),
+            Decimal("0.00"),
+        )
+        cart.save(update_fields=["item_count", "total"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0001_initial'),
+        ('products', '0006_product_units_sold'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=12),
+        ),
+        migrations.RunPython(backfill_cart_totals, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,9 @@
+from decimal import Decimal
+
 from django.conf import settings
 from django.db import models
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, NullIf
 
 
 class Cart(models.Model):
@@ -8,19 +12,39 @@ class Cart(models.Model):
         on_delete=models.CASCADE,
         related_name="cart",
     )
+    # Denormalized from the cart's items by recalculate_totals(), which the
+    # cart signals run on every CartItem change and product price change.
+    item_count = models.PositiveIntegerField(default=0, editable=False)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"), editable=False)
+    # Bumped with every recalculation; identifies session copies of the totals.
+    version = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Cart for {self.user.email}"
 
-    @property
-    def total(self):
-        return sum(item.line_total for item in self.items.all())
-
-    @property
-    def item_count(self):
-        return sum(item.quantity for item in self.items.all())
+    @staticmethod
+    def recalculate_totals(carts):
+        """Recompute ``item_count`` and ``total`` of ``carts`` and bump ``version``, in one UPDATE."""
+        items = CartItem.objects.filter(cart=OuterRef("pk")).values("cart")
+        line_total = F("quantity") * Coalesce(NullIf("product__discount_price", Value(0)), "product__price")
+        carts.update(
+            item_count=Coalesce(
+                Subquery(items.annotate(count=Sum("quantity")).values("count")),
+                0,
+            ),
+            total=Coalesce(
+                Subquery(
+                    items.annotate(
+                        total=Sum(line_total, output_field=DecimalField(max_digits=12, decimal_places=2))
+                    ).values("total")
+                ),
+                Value(Decimal("0.00")),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+            version=F("version") + 1,
+        )
 
 
 class CartItem(models.Model):
@@ -0,0 +1,105 @@
+"""Cart pricing.
+
+``price_cart`` loads a cart's items with their products and inventory in a
+single query and prices every line once. The result is an immutable
+``PricedCart`` snapshot: templates and checkout read prices, totals and
+stock from it instead of walking ``cart.items.all`` (one query per call plus
+one per product). A line's ``available`` is the ledger balance (see
+``products.stock``) minus other carts' holds, so units this cart holds
+count as available to it.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.db.models import F, OuterRef
+from django.db.models.functions import Coalesce
+
+from products.stock import held_quantity, pending_delta
+
+from .models import CartItem
+
+
+@dataclass(frozen=True)
+class PricedLine:
+    item_id: int
+    product: object
+    quantity: int
+    unit_price: Decimal
+    line_total: Decimal
+    available: int
+
+    @property
+    def pk(self):
+        return self.item_id
+
+    @property
+    def shortfall(self) -> bool:
+        return self.quantity > self.available
+
+
+@dataclass(frozen=True)
+class PricedCart:
+    cart_id: int | None
+    lines: tuple[PricedLine, ...]
+    item_count: int
+    total: Decimal
+
+    def __bool__(self) -> bool:
+        return bool(self.lines)
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def stock_errors(self) -> list[str]:
+        """Messages for every line asking for more than is in stock."""
+        errors = []
+        for line in self.lines:
+            if not line.shortfall:
+                continue
+            if line.available == 0:
+                errors.append(f"{line.product.name} is out of stock.")
+            else:
+                errors.append(
+                    f"{line.product.name}: only {line.available} available (you requested {line.quantity})."
+                )
+        return errors
+
+
+def price_cart(cart) -> PricedCart:
+    """Price ``cart`` from one query over its items, products and inventory."""
+    items = (
+        CartItem.objects.filter(cart=cart)
+        .select_related("product__inventory")
+        .annotate(
+            stock_available=Coalesce(F("product__inventory__quantity"), 0)
+            + pending_delta(OuterRef("product_id"))
+            - held_quantity(OuterRef("product_id"), exclude_cart_id=cart.pk)
+        )
+        .order_by("added_at", "pk")
+    )
+    lines = []
+    for item in items:
+        product = item.product
+        unit_price = product.effective_price
+        lines.append(
+            PricedLine(
+                item_id=item.pk,
+                product=product,
+                quantity=item.quantity,
+                unit_price=unit_price,
+                line_total=unit_price * item.quantity,
+                available=max(item.stock_available, 0),
+            )
+        )
+    return PricedCart(
+        cart_id=cart.pk,
+        lines=tuple(lines),
+        item_count=sum(line.quantity for line in lines),
+        total=sum((line.line_total for line in lines), Decimal("0.00")),
+    )
@@ -0,0 +1,53 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from products.models import Product
+from products.stock import release_cart_holds
+
+from .models import Cart, CartItem
+from .summary import forget_cart_version
+
+PRICE_FIELDS = {"price", "discount_price"}
+
+
+def refresh_carts(cart_ids):
+    cart_ids = set(cart_ids)
+    if not cart_ids:
+        return
+    carts = Cart.objects.filter(pk__in=cart_ids)
+    Cart.recalculate_totals(carts)
+    forget_cart_version(carts.values_list("user_id", flat=True))
+
+
+@receiver(post_save, sender=Cart, dispatch_uid="cart_summary_on_cart_save")
+def invalidate_summary_on_cart_save(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        forget_cart_version([instance.user_id])
+
+
+@receiver(post_delete, sender=Cart, dispatch_uid="cart_summary_on_cart_delete")
+def invalidate_summary_on_cart_delete(sender, instance, **kwargs):
+    forget_cart_version([instance.user_id])
+
+
+@receiver(post_save, sender=CartItem, dispatch_uid="cart_totals_on_item_save")
+def update_totals_on_item_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    refresh_carts([instance.cart_id])
+
+
+@receiver(post_delete, sender=CartItem, dispatch_uid="cart_totals_on_item_delete")
+def update_totals_on_item_delete(sender, instance, **kwargs):
+    # Also runs for queryset and cascade deletes.
+    refresh_carts([instance.cart_id])
+    release_cart_holds(instance.cart_id, [instance.product_id])
+
+
+@receiver(post_save, sender=Product, dispatch_uid="cart_totals_on_price_change")
+def update_totals_on_price_change(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    if raw or created:
+        return
+    if update_fields is not None and not PRICE_FIELDS & set(update_fields):
+        return
+    refresh_carts(CartItem.objects.filter(product=instance).values_list("cart_id", flat=True))
@@ -0,0 +1,57 @@
+"""Session-cached cart summary for the navbar badge.
+
+The badge needs the cart's item count on every page. The denormalized
+``Cart.item_count``/``Cart.total`` are copied into the session together with
+the cart's row version (``Cart.version``, bumped by every recalculation).
+Pages compare the session copy against the row version remembered in the
+Django cache and only query the cart when they differ or the cache has no
+entry, so most renders issue no query.
+
+The cart signals drop the cached version when the cart changes. With a
+shared cache backend that reaches every process at once; with the default
+per-process cache, other processes notice once their entry expires after
+``CART_SUMMARY_VERSION_TTL`` seconds, which bounds how long their badge can
+lag behind the cart.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Cart
+
+SESSION_KEY = "cart_summary"
+
+
+def _version_key(user_id):
+    return f"cart:user:{user_id}:version"
+
+
+def _version_ttl():
+    return getattr(settings, "CART_SUMMARY_VERSION_TTL", 30)
+
+
+def forget_cart_version(user_ids):
+    cache.delete_many([_version_key(user_id) for user_id in user_ids])
+
+
+def get_cart_summary(request):
+    """Return ``{"user_id", "count", "total", "version"}`` for the current user."""
+    user_id = request.user.pk
+    version = cache.get(_version_key(user_id))
+    summary = request.session.get(SESSION_KEY)
+    if version is not None and summary and summary.get("user_id") == user_id and summary.get("version") == version:
+        return summary
+
+    cart = Cart.objects.filter(user_id=user_id).values("pk", "item_count", "total", "version").first()
+    summary = {
+        "user_id": user_id,
+        "count": cart["item_count"] if cart else 0,
+        "total": str(cart["total"]) if cart else "0.00",
+        # The cart pk tells a recreated cart apart from the one it replaced.
+        "version": f"{cart['pk']}:{cart['version']}" if cart else "none",
+    }
+    # A change committed between this query and the set leaves an old version
+    # cached; it expires with the TTL like any other stale entry.
+    cache.set(_version_key(user_id), summary["version"], timeout=_version_ttl())
+    request.session[SESSION_KEY] = summary
+    return summary
@@ -0,0 +1,343 @@
+import uuid
+from dataclasses import FrozenInstanceError
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import User
+from orders.checkout import CheckoutError, place_order
+from orders.models import Order
+from products import stock
+from products.models import Category, Inventory, Product
+
+from .context_processors import cart_item_count
+from .models import Cart, CartItem
+from .pricing import price_cart
+from .summary import _version_key
+
+
+class CartTestBase(TestCase):
+    """One shopper with an empty cart and two stocked products."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.merchant = User.objects.create_user(
+            email="merchant@example.com",
+            password="StrongPass123!",
+            role=User.Role.MERCHANT,
+            store_name="Cart Store",
+        )
+        cls.shopper = User.objects.create_user(
+            email="shopper@example.com",
+            password="StrongPass123!",
+            role=User.Role.SHOPPER,
+        )
+        category = Category.objects.create(name="Gadgets")
+        cls.gadget = Product.objects.create(
+            merchant=cls.merchant, category=category, name="Gadget", price=Decimal("10.00")
+        )
+        cls.gizmo = Product.objects.create(
+            merchant=cls.merchant,
+            category=category,
+            name="Gizmo",
+            price=Decimal("8.00"),
+            discount_price=Decimal("5.00"),
+        )
+        for product in (cls.gadget, cls.gizmo):
+            Inventory.objects.create(product=product, quantity=10)
+
+    def setUp(self):
+        cache.clear()
+        self.cart = Cart.objects.create(user=self.shopper)
+
+    def assertTotals(self, item_count, total):
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.item_count, item_count)
+        self.assertEqual(self.cart.total, Decimal(total))
+
+
+class CartTotalsTests(CartTestBase):
+    def test_totals_follow_item_changes(self):
+        item = CartItem.objects.create(cart=self.cart, product=self.gadget, quantity=2)
+        CartItem.objects.create(cart=self.cart, product=self.gizmo)
+        self.assertTotals(3, "25.00")
+
+        item.quantity = 4
+        item.save()
+        self.assertTotals(5, "45.00")
+
+        item.delete()
+        self.assertTotals(1, "5.00")
+
+    def test_queryset_delete_resets_totals(self):
+        CartItem.objects.create(cart=self.cart, product=self.gadget, quantity=2)
+        self.cart.items.all().delete()
+        self.assertTotals(0, "0.00")
+
+    def test_price_change_updates_carts_holding_product(self):
+        CartItem.objects.create(cart=self.cart, product=self.gadget, quantity=3)
+        self.gadget.price = Decimal("12.00")
+        self.gadget.save()
+        self.assertTotals(3, "36.00")
+
+    def test_add_to_cart_view_updates_totals(self):
+        self.client.force_login(self.shopper)
+        self.client.post(reverse("cart:add_to_cart", args=[self.gizmo.pk]))
+        self.client.post(reverse("cart:add_to_cart", args=[self.gizmo.pk]))
+        self.assertTotals(2, "10.00")
+
+
+class CartSummaryTests(CartTestBase):
+    def _request(self, session=None):
+        request = RequestFactory().get("/")
+        request.user = self.shopper
+        request.session = session if session is not None else SessionStore()
+        return request
+
+    def test_badge_is_served_from_session(self):
+        CartItem.objects.create(cart=self.cart, product=self.gadget, quantity=2)
+        request = self._request()
+        self.assertEqual(cart_item_count(request), {"cart_item_count": 2})
+
+        with self.assertNumQueries(0):
+            self.assertEqual(cart_item_count(self._request(request.session)), {"cart_item_count": 2})
+
+    def test_cart_change_refreshes_session_copy(self):
+        request = self._request()
+        self.assertEqual(cart_item_count(request)["cart_item_count"], 0)
+
+        CartItem.objects.create(cart=self.cart, product=self.gizmo, quantity=3)
+        with self.assertNumQueries(1):
+            self.assertEqual(cart_item_count(self._request(request.session))["cart_item_count"], 3)
+
+    def test_session_of_another_user_is_ignored(self):
+        request = self._request()
+        cart_item_count(request)
+        request.session["cart_summary"]["user_id"] = self.merchant.pk
+        request.session["cart_summary"]["count"] = 99
+        self.assertEqual(cart_item_count(self._request(request.session))["cart_item_count"], 0)
+
+    def test_change_made_elsewhere_shows_once_the_cached_version_expires(self):
+        request = self._request()
+        self.assertEqual(cart_item_count(request)["cart_item_count"], 0)
+
+        # As if another process changed the cart: this process's cache is untouched.
+        CartItem.objects.bulk_create([CartItem(cart=self.cart, product=self.gadget, quantity=2)])
+        Cart.recalculate_totals(Cart.objects.filter(pk=self.cart.pk))
+        self.assertEqual(cart_item_count(self._request(request.session))["cart_item_count"], 0)
+
+        cache.delete(_version_key(self.shopper.pk))
+        self.assertEqual(cart_item_count(self._request(request.session))["cart_item_count"], 2)
+
+
+class CartPricingTests(CartTestBase):
+    def test_snapshot_prices_every_line_in_one_query(self):
+        CartItem.objects.create(cart=self.cart, product=self.gadget, quantity=2)
+        CartItem.objects.create(cart=self.cart, product=self.gizmo, quantity=3)
+
+        with self.assertNumQueries(1):
+            priced = price_cart(self.cart)
+            lines = [(line.product.name, line.unit_price, line.line_total, line.available) for line in priced]
+
+        self.assertEqual(
+            lines,
+            [("Gadget", Decimal("10.00"), Decimal("20.00"), 10), ("Gizmo", Decimal("5.00"), Decimal("15.00"), 10)],
+        )
+        self.assertEqual(priced.item_count, 5)
+        self.assertEqual(priced.total, Decimal("35.00"))
+
+    def test_snapshot_is_immutable(self):
+        priced = price_cart(self.cart)
+        self.assertFalse(priced)
+        with self.assertRaises(FrozenInstanceError):
+            priced.total = Decimal("1.00")
+
+    def test_stock_errors(self):
+        CartItem.objects.create(cart=self.cart, product=self.gadget, quantity=12)
+        self.assertEqual(
+            price_cart(self.cart).stock_errors(),
+            ["Gadget: only 10 available (you requested 12)."],
+        )
+
+    def test_cart_pages_do_not_query_per_item(self):
+        self.client.force_login(self.shopper)
+        CartItem.objects.create(cart=self.cart, product=self.gadget)
+
+        def page_queries(name):
+            # The first request after a cart change refills the recommendation
+            # and navbar caches; measure the one after it.
+            self.client.get(reverse(name))
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse(name))
+            return response, len(queries)
+
+        for name in ("cart:cart_detail", "cart:checkout"):
+            _, one_item = page_queries(name)
+            CartItem.objects.create(cart=self.cart, product=self.gizmo)
+            response, two_items = page_queries(name)
+            self.assertContains(response, "$15.00")
+            self.assertEqual(two_items, one_item, name)
+            CartItem.objects.filter(product=self.gizmo).delete()
+
+
+class CheckoutTests(CartTestBase):
+    def _fill_cart(self):
+        CartItem.objects.create(cart=self.cart, product=self.gadget, quantity=2)
+        CartItem.objects.create(cart=self.cart, product=self.gizmo, quantity=3)
+
+    def test_place_order_takes_stock_and_empties_cart(self):
+        self._fill_cart()
+        order, _ = place_order(self.shopper, self.cart, "Sam Shopper", "1 Main St")
+
+        self.assertEqual(order.subtotal, Decimal("35.00"))
+        self.assertEqual(order.total, Decimal("35.00"))
+        self.assertEqual(
+            list(order.items.values_list("product_name", "product_price", "quantity")),
+            [("Gadget", Decimal("10.00"), 2), ("Gizmo", Decimal("5.00"), 3)],
+        )
+        self.assertEqual(stock.available(self.gadget.pk), 8)
+        self.assertEqual(stock.available(self.gizmo.pk), 7)
+        self.assertTotals(0, "0.00")
+
+        stock.compact_stock()
+        self.assertEqual(Inventory.objects.get(product=self.gadget).quantity, 8)
+        self.assertEqual(Inventory.objects.get(product=self.gizmo).quantity, 7)
+
+    def test_concurrent_sellout_rolls_back(self):
+        self._fill_cart()
+
+        def stale_snapshot(cart):
+            # Another checkout takes the gizmos after this one priced the cart.
+            priced = price_cart(cart)
+            Inventory.objects.filter(product=self.gizmo).update(quantity=1)
+            return priced
+
+        with mock.patch("orders.checkout.price_cart", stale_snapshot):
+            with self.assertRaises(CheckoutError) as raised:
+                place_order(self.shopper, self.cart, "Sam Shopper", "1 Main St")
+
+        self.assertEqual(raised.exception.messages, ["Gizmo sold out while you were checking out."])
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(stock.available(self.gadget.pk), 10)
+        self.assertTotals(5, "35.00")
+
+    def test_checkout_view_reports_stock_errors(self):
+        CartItem.objects.create(cart=self.cart, product=self.gadget, quantity=11)
+        self.client.force_login(self.shopper)
+        response = self.client.post(
+            reverse("cart:checkout"), {"shipping_name": "Sam", "shipping_address": "1 Main St"}, follow=True
+        )
+        self.assertRedirects(response, reverse("cart:cart_detail"))
+        self.assertContains(response, "Gadget: only 10 available (you requested 11).")
+        self.assertFalse(Order.objects.exists())
+
+
+class CartHoldTests(CartTestBase):
+    def setUp(self):
+        super().setUp()
+        self.other = User.objects.create_user(email="other@example.com", password="StrongPass123!")
+        self.client.force_login(self.shopper)
+
+    def test_adding_to_cart_holds_stock(self):
+        self.client.post(reverse("cart:add_to_cart", args=[self.gadget.pk]))
+        self.client.post(reverse("cart:add_to_cart", args=[self.gadget.pk]))
+
+        hold = stock.cart_hold(self.cart.pk, self.gadget.pk)
+        self.assertEqual(hold.quantity, 2)
+        self.assertEqual(stock.available(self.gadget.pk), 8)
+
+    def test_held_units_cannot_be_added_by_another_cart(self):
+        stock.reserve(self.gadget.pk, 10, cart_id=Cart.objects.create(user=self.other).pk)
+
+        response = self.client.post(reverse("cart:add_to_cart", args=[self.gadget.pk]), follow=True)
+
+        self.assertContains(response, "only 0 unit(s) of Gadget available")
+        self.assertFalse(CartItem.objects.filter(cart=self.cart).exists())
+
+    def test_removing_item_releases_hold(self):
+        self.client.post(reverse("cart:add_to_cart", args=[self.gadget.pk]))
+        item = CartItem.objects.get(cart=self.cart)
+
+        self.client.post(reverse("cart:remove_from_cart", args=[item.pk]))
+
+        self.assertIsNone(stock.cart_hold(self.cart.pk, self.gadget.pk))
+        self.assertEqual(stock.available(self.gadget.pk), 10)
+
+    def test_restocked_product_can_be_added(self):
+        inventory = Inventory.objects.get(product=self.gadget)
+        inventory.decrease(10)
+        inventory.increase(5)
+
+        self.client.post(reverse("cart:add_to_cart", args=[self.gadget.pk]))
+
+        self.assertEqual(stock.cart_hold(self.cart.pk, self.gadget.pk).quantity, 1)
+
+    def test_checkout_counts_units_not_yet_compacted(self):
+        Inventory.objects.get(product=self.gadget).decrease(9)
+        self.client.post(reverse("cart:add_to_cart", args=[self.gadget.pk]))
+        # A restock whose compaction has not run yet.
+        stock.restock(self.gadget.pk, 10)
+        self.client.post(reverse("cart:add_to_cart", args=[self.gadget.pk]))
+
+        self.assertEqual(price_cart(self.cart).stock_errors(), [])
+        order, _ = place_order(self.shopper, self.cart, "Sam Shopper", "1 Main St")
+        self.assertEqual(order.items.get().quantity, 2)
+
+    def test_checkout_commits_the_hold(self):
+        self.client.post(reverse("cart:add_to_cart", args=[self.gizmo.pk]))
+        hold = stock.cart_hold(self.cart.pk, self.gizmo.pk)
+
+        order, _ = place_order(self.shopper, self.cart, "Sam Shopper", "1 Main St")
+
+        commit = hold.settlements.get()
+        self.assertEqual((commit.kind, commit.order), (stock.Kind.COMMIT, order))
+        self.assertEqual(stock.available(self.gizmo.pk), 9)
+
+
+class IdempotentCheckoutTests(CartTestBase):
+    def test_resubmitted_form_returns_the_first_order(self):
+        CartItem.objects.create(cart=self.cart, product=self.gadget, quantity=2)
+        self.client.force_login(self.shopper)
+        token = self.client.get(reverse("cart:checkout")).context["checkout_token"]
+        data = {"shipping_name": "Sam", "shipping_address": "1 Main St", "checkout_token": str(token)}
+
+        first = self.client.post(reverse("cart:checkout"), data)
+        second = self.client.post(reverse("cart:checkout"), data)
+
+        order = Order.objects.get()
+        self.assertEqual(order.checkout_token, token)
+        self.assertRedirects(first, reverse("orders:order_detail", args=[order.order_number]))
+        self.assertRedirects(second, reverse("orders:order_detail", args=[order.order_number]))
+        self.assertEqual(stock.available(self.gadget.pk), 8)
+
+    def test_concurrent_duplicate_rolls_back_and_returns_the_winner(self):
+        CartItem.objects.create(cart=self.cart, product=self.gadget, quantity=2)
+        token = uuid.uuid4()
+        winner = Order.objects.create(
+            user=self.shopper, shipping_name="Sam", shipping_address="1 Main St", checkout_token=token
+        )
+
+        # The winner commits between this request's lookup and its insert.
+        with mock.patch("orders.checkout._order_for_token", side_effect=[None, winner]):
+            order, created = place_order(self.shopper, self.cart, "Sam", "1 Main St", checkout_token=token)
+
+        self.assertEqual((order, created), (winner, False))
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(stock.available(self.gadget.pk), 10)
+        self.assertTotals(2, "20.00")
+
+    def test_tokens_are_per_user(self):
+        token = uuid.uuid4()
+        Order.objects.create(user=self.merchant, shipping_name="M", shipping_address="2 Side St", checkout_token=token)
+        CartItem.objects.create(cart=self.cart, product=self.gizmo)
+
+        order, created = place_order(self.shopper, self.cart, "Sam", "1 Main St", checkout_token=token)
+
+        self.assertTrue(created)
+        self.assertEqual(order.user, self.shopper)
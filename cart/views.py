@@ -1,11 +1,14 @@
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
 from django.shortcuts import get_object_or_404, redirect, render
 
-from orders.models import Order, OrderItem
+from orders.checkout import CheckoutError, new_checkout_token, parse_checkout_token, place_order
 from products.models import Product
+from products.stock import InsufficientStock, hold_for_cart
 
 from .models import Cart, CartItem
+from .pricing import price_cart
 
 
 def _get_or_create_cart(user):
@@ -28,7 +31,7 @@ def cart_detail(request):
         request,
         "cart/cart_detail.html",
         {
-            "cart": cart,
+            "cart": price_cart(cart),
             "recommended_items": recommended_items,
         },
     )
@@ -44,17 +47,24 @@ def add_to_cart(request, product_id):
         messages.error(request, f"Sorry, {product.name} is currently out of stock.")
         return redirect("products:product_detail", slug=product.slug)
 
-    item, created = CartItem.objects.get_or_create(cart=cart, product=product)
-    if not created:
-        new_qty = item.quantity + 1
-        if new_qty > product.stock_quantity:
+    # The cart holds its units for STOCK_HOLD_MINUTES; the hold is what
+    # checks availability, against other carts' holds as well as sales.
+    with transaction.atomic():
+        item, created = CartItem.objects.get_or_create(cart=cart, product=product)
+        new_qty = item.quantity if created else item.quantity + 1
+        try:
+            hold_for_cart(cart.pk, product.pk, new_qty)
+        except InsufficientStock as exc:
+            if created:
+                item.delete()
             messages.warning(
                 request,
-                f"Cannot add more — only {product.stock_quantity} unit(s) of {product.name} available.",
+                f"Cannot add more — only {exc.available} unit(s) of {product.name} available.",
             )
             return redirect("cart:cart_detail")
-        item.quantity = new_qty
-        item.save()
+        if not created:
+            item.quantity = new_qty
+            item.save()
 
     messages.success(request, f"Added {product.name} to your cart.")
     return redirect("cart:cart_detail")
@@ -71,53 +81,31 @@ def remove_from_cart(request, item_id):
 @login_required
 def checkout(request):
     cart = _get_or_create_cart(request.user)
-    if not cart.items.exists():
-        messages.warning(request, "Your cart is empty.")
-        return redirect("cart:cart_detail")
-
     if request.method == "POST":
-        # Validate stock for all items before creating the order
-        stock_errors = []
-        for cart_item in cart.items.select_related("product__inventory"):
-            available = cart_item.product.stock_quantity
-            if cart_item.quantity > available:
-                if available == 0:
-                    stock_errors.append(f"{cart_item.product.name} is out of stock.")
-                else:
-                    stock_errors.append(
-                        f"{cart_item.product.name}: only {available} available (you requested {cart_item.quantity})."
-                    )
-
-        if stock_errors:
-            for err in stock_errors:
+        try:
+            order, created = place_order(
+                request.user,
+                cart,
+                shipping_name=request.POST.get("shipping_name", request.user.full_name),
+                shipping_address=request.POST.get("shipping_address", ""),
+                shipping_phone=request.POST.get("shipping_phone", request.user.phone_number),
+                checkout_token=parse_checkout_token(request.POST.get("checkout_token")),
+            )
+        except CheckoutError as exc:
+            for err in exc.messages:
                 messages.error(request, err)
             return redirect("cart:cart_detail")
 
-        order = Order.objects.create(
-            user=request.user,
-            shipping_name=request.POST.get("shipping_name", request.user.full_name),
-            shipping_address=request.POST.get("shipping_address", ""),
-            shipping_phone=request.POST.get("shipping_phone", request.user.phone_number),
-        )
-
-        for cart_item in cart.items.select_related("product"):
-            OrderItem.objects.create(
-                order=order,
-                product=cart_item.product,
-                product_name=cart_item.product.name,
-                product_price=cart_item.product.effective_price,
-                quantity=cart_item.quantity,
-            )
-            # Decrease stock via Inventory model
-            try:
-                cart_item.product.inventory.decrease(cart_item.quantity)
-            except (ValueError, cart_item.product.inventory.DoesNotExist.__class__):
-                pass
-
-        order.calculate_totals()
-        cart.items.all().delete()
-
-        messages.success(request, f"Order {order.order_number} placed successfully!")
+        if created:
+            messages.success(request, f"Order {order.order_number} placed successfully!")
         return redirect("orders:order_detail", order_number=order.order_number)
 
-    return render(request, "cart/checkout.html", {"cart": cart})
+    priced = price_cart(cart)
+    if not priced:
+        messages.warning(request, "Your cart is empty.")
+        return redirect("cart:cart_detail")
+    return render(
+        request,
+        "cart/checkout.html",
+        {"cart": priced, "checkout_token": new_checkout_token()},
+    )
@@ -163,3 +163,69 @@ ENABLE_AI_RECOMMENDATIONS = os.environ.get("ENABLE_AI_RECOMMENDATIONS", "True").
     "1",
     "yes",
 )
+
+# Number of precomputed neighbours kept per product in the similarity index.
+RECOMMENDATION_SIMILARITY_TOP_K = int(os.environ.get("RECOMMENDATION_SIMILARITY_TOP_K", "20"))
+
+# Seconds a process may reuse its cached recommendation feature matrix before
+# rebuilding it, even without an invalidation signal.
+RECOMMENDATION_FEATURE_TTL = int(os.environ.get("RECOMMENDATION_FEATURE_TTL", "300"))
+
+# Minimum seconds between event-driven refreshes of the popularity leaderboard
+# (0 refreshes after every change). With RECOMMENDATION_POPULARITY_REFRESH_THREAD
+# a timer thread runs the trailing refresh; otherwise the next popular read
+# after the interval does. Also run `manage.py refresh_popularity` on a
+# schedule so recency keeps decaying.
+RECOMMENDATION_POPULARITY_REFRESH_INTERVAL = int(
+    os.environ.get("RECOMMENDATION_POPULARITY_REFRESH_INTERVAL", "60")
+)
+RECOMMENDATION_POPULARITY_REFRESH_THREAD = os.environ.get(
+    "RECOMMENDATION_POPULARITY_REFRESH_THREAD", "False"
+).lower() in ("true", "1", "yes")
+
+# LSH shortlisting for content similarity: used once the active catalog has at
+# least RECOMMENDATION_LSH_MIN_CATALOG products. More bands / fewer rows raise
+# recall at the cost of larger shortlists.
+RECOMMENDATION_LSH_MIN_CATALOG = int(os.environ.get("RECOMMENDATION_LSH_MIN_CATALOG", "2000"))
+RECOMMENDATION_LSH_BANDS = int(os.environ.get("RECOMMENDATION_LSH_BANDS", "16"))
+RECOMMENDATION_LSH_ROWS = int(os.environ.get("RECOMMENDATION_LSH_ROWS", "4"))
+
+# In-process cache of computed recommendation payloads (TTL of 0 disables it).
+RECOMMENDATION_CACHE_TTL = int(os.environ.get("RECOMMENDATION_CACHE_TTL", "60"))
+RECOMMENDATION_CACHE_MAX_ENTRIES = int(os.environ.get("RECOMMENDATION_CACHE_MAX_ENTRIES", "1024"))
+
+# Product views are buffered in process and written in bulk once the buffer
+# holds RECOMMENDATION_VIEW_BUFFER_SIZE (user, product) pairs or its oldest
+# view is RECOMMENDATION_VIEW_FLUSH_INTERVAL seconds old (0 writes each view
+# immediately). RECOMMENDATION_VIEW_FLUSH_THREAD also flushes from a
+# background thread so idle processes do not hold views back.
+RECOMMENDATION_VIEW_BUFFER_SIZE = int(os.environ.get("RECOMMENDATION_VIEW_BUFFER_SIZE", "500"))
+RECOMMENDATION_VIEW_FLUSH_INTERVAL = float(os.environ.get("RECOMMENDATION_VIEW_FLUSH_INTERVAL", "5"))
+RECOMMENDATION_VIEW_FLUSH_THREAD = os.environ.get("RECOMMENDATION_VIEW_FLUSH_THREAD", "False").lower() in (
+    "true",
+    "1",
+    "yes",
+)
+
+# Maximum number of ranked results returned by the shop search (?q=).
+PRODUCT_SEARCH_RESULT_LIMIT = int(os.environ.get("PRODUCT_SEARCH_RESULT_LIMIT", "100"))
+
+# Products per page on the keyset-paginated shop and category listings.
+PRODUCT_PAGE_SIZE = int(os.environ.get("PRODUCT_PAGE_SIZE", "24"))
+
+# Shop facets: upper bounds of the price bands (the last band is open-ended)
+# and seconds a process may reuse its facet bitmap index before rebuilding.
+PRODUCT_PRICE_BANDS = [
+    int(bound) for bound in os.environ.get("PRODUCT_PRICE_BANDS", "25,50,100,250").split(",") if bound.strip()
+]
+PRODUCT_FACET_TTL = int(os.environ.get("PRODUCT_FACET_TTL", "300"))
+
+# Stock ledger (products.stock): minutes a cart holds the units it contains.
+# Run `manage.py compact_stock` on a schedule to release expired holds and
+# fold any movements whose after-commit compaction did not run.
+STOCK_HOLD_MINUTES = int(os.environ.get("STOCK_HOLD_MINUTES", "15"))
+
+# Seconds a process trusts its cached copy of a cart's version for the navbar
+# badge. Cart changes clear it right away in a shared cache; with the default
+# per-process cache this bounds how stale other processes' badges can get.
+CART_SUMMARY_VERSION_TTL = int(os.environ.get("CART_SUMMARY_VERSION_TTL", "30"))
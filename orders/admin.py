@@ -23,4 +23,10 @@ class ReturnRequestAdmin(admin.ModelAdmin):
     list_display = ("order_item", "user", "quantity", "status", "created_at")
     list_filter = ("status", "created_at")
     search_fields = ("order_item__product_name", "user__email", "order_item__order__order_number")
-    readonly_fields = ("created_at", "updated_at")
\ No newline at end of file
+    readonly_fields = ("created_at", "updated_at")
+    actions = ["restock_returned_units"]
+
+    @admin.action(description="Put returned units back in stock")
+    def restock_returned_units(self, request, queryset):
+        restocked = sum(1 for return_request in queryset.select_related("order_item") if return_request.restock())
+        self.message_user(request, f"Put the units of {restocked} return request(s) back in stock.")
\ No newline at end of file
@@ -0,0 +1,121 @@
+"""Checkout: turn a user's cart into an order.
+
+``place_order`` runs in one transaction. Each line commits the cart's stock
+hold in the ``products.stock`` ledger, re-reserving first when the hold has
+expired or no longer matches the quantity; a line whose units were sold to
+someone else makes the whole order roll back instead of overselling. The
+order lines are written with one ``bulk_create`` and the order totals come
+from the same priced-cart snapshot, so no ``calculate_totals`` pass is
+needed.
+
+``bulk_create`` bypasses model signals; ``order_placed`` is sent for the
+receivers that follow new order lines.
+
+The checkout form carries a ``checkout_token`` that is stored on the order
+under a unique constraint. Submitting the same token again - a double
+click, a client or proxy retry - returns the order it already created
+instead of placing a second one.
+"""
+
+import uuid
+
+from django.db import IntegrityError, transaction
+
+from cart.models import CartItem
+from cart.pricing import price_cart
+from products.stock import InsufficientStock, commit_cart_line, schedule_compaction
+
+from .models import Order, OrderItem
+from .signals import order_placed
+
+
+class CheckoutError(Exception):
+    """The cart cannot be ordered; ``messages`` says why, one line each."""
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+        super().__init__(" ".join(self.messages))
+
+
+def new_checkout_token():
+    return uuid.uuid4()
+
+
+def parse_checkout_token(value):
+    """The token posted with the checkout form, or None when missing or malformed."""
+    try:
+        return uuid.UUID(str(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _order_for_token(user, checkout_token):
+    if checkout_token is None:
+        return None
+    return Order.objects.filter(user=user, checkout_token=checkout_token).first()
+
+
+def place_order(user, cart, shipping_name, shipping_address, shipping_phone="", checkout_token=None):
+    """Create a pending order from ``cart``, take its stock and empty the cart.
+
+    Returns ``(order, created)``. ``created`` is False when ``checkout_token``
+    already placed an order, which is returned untouched.
+    """
+    existing = _order_for_token(user, checkout_token)
+    if existing is not None:
+        return existing, False
+    try:
+        order, items = _place_order(user, cart, shipping_name, shipping_address, shipping_phone, checkout_token)
+    except (IntegrityError, CheckoutError):
+        # A concurrent submission of the same token won: it either holds the
+        # token (IntegrityError) or has already emptied the cart.
+        existing = _order_for_token(user, checkout_token)
+        if existing is None:
+            raise
+        return existing, False
+    order_placed.send(sender=Order, order=order, items=items)
+    return order, True
+
+
+def _place_order(user, cart, shipping_name, shipping_address, shipping_phone, checkout_token):
+    with transaction.atomic():
+        priced = price_cart(cart)
+        if not priced:
+            raise CheckoutError(["Your cart is empty."])
+        stock_errors = priced.stock_errors()
+        if stock_errors:
+            raise CheckoutError(stock_errors)
+
+        order = Order(
+            user=user,
+            shipping_name=shipping_name,
+            shipping_address=shipping_address,
+            shipping_phone=shipping_phone,
+            checkout_token=checkout_token,
+            subtotal=priced.total,
+        )
+        order.total = order.subtotal + order.shipping_cost
+        order.save()
+
+        # A fixed lock order keeps concurrent checkouts from deadlocking.
+        for line in sorted(priced, key=lambda line: line.product.pk):
+            try:
+                commit_cart_line(cart.pk, line.product.pk, line.quantity, order)
+            except InsufficientStock:
+                raise CheckoutError([f"{line.product.name} sold out while you were checking out."]) from None
+
+        items = OrderItem.objects.bulk_create(
+            [
+                OrderItem(
+                    order=order,
+                    product=line.product,
+                    product_name=line.product.name,
+                    product_price=line.unit_price,
+                    quantity=line.quantity,
+                )
+                for line in priced
+            ]
+        )
+        CartItem.objects.filter(cart=cart).delete()
+        schedule_compaction(line.product.pk for line in priced)
+    return order, items
@@ -0,0 +1,69 @@
+"""Batched loading for the order detail page.
+
+``OrderDetailLoader`` fetches everything the page shows for an order in a
+fixed number of queries, however many lines the order has: the items with
+their products and return requests (one query) and the viewer's reviews of
+those products (one query). The result is an ``OrderDetail`` whose lines
+carry the related objects, so the template never touches a lazy relation.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+from products.models import Review
+
+from .models import Order, OrderItem, ReturnRequest
+
+
+@dataclass(frozen=True)
+class OrderLine:
+    item: OrderItem
+    return_request: ReturnRequest | None
+    review: Review | None
+
+    @property
+    def product(self):
+        return self.item.product
+
+
+@dataclass(frozen=True)
+class OrderDetail:
+    order: Order
+    lines: tuple[OrderLine, ...]
+
+    @property
+    def delivered(self) -> bool:
+        return self.order.status == Order.Status.DELIVERED
+
+
+class OrderDetailLoader:
+    """Load order detail pages for one viewer (whose reviews are shown)."""
+
+    def __init__(self, user):
+        self.user = user
+
+    def load(self, order: Order) -> OrderDetail:
+        items = list(
+            OrderItem.objects.filter(order=order)
+            .select_related("product", "return_request")
+            .order_by("pk")
+        )
+        reviews = self._reviews({item.product_id for item in items if item.product_id})
+        lines = tuple(
+            OrderLine(
+                item=item,
+                return_request=getattr(item, "return_request", None),
+                review=reviews.get(item.product_id),
+            )
+            for item in items
+        )
+        return OrderDetail(order=order, lines=lines)
+
+    def _reviews(self, product_ids) -> dict[int, Review]:
+        if not product_ids or not self.user.is_authenticated:
+            return {}
+        return {
+            review.product_id: review
+            for review in Review.objects.filter(user=self.user, product_id__in=product_ids)
+        }
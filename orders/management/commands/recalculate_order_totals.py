@@ -0,0 +1,38 @@
+"""
+Management command: recalculate_order_totals
+
+Recomputes Order.subtotal and Order.total from the order lines in SQL. Orders
+are processed in primary-key ranges of --chunk-size, one UPDATE per range, so
+the command can repair a large order history without loading it and without
+holding one long transaction.
+
+Usage:
+    python manage.py recalculate_order_totals
+    python manage.py recalculate_order_totals --chunk-size 5000
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    help = "Recalculate order subtotals and totals from their items in chunked UPDATEs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = max(options["chunk_size"], 1)
+        bounds = Order.objects.aggregate(first=Min("pk"), last=Max("pk"))
+        if bounds["first"] is None:
+            self.stdout.write("No orders.")
+            return
+
+        updated = 0
+        for start in range(bounds["first"], bounds["last"] + 1, chunk_size):
+            with transaction.atomic():
+                updated += Order.recalculate_totals(Order.objects.filter(pk__gte=start, pk__lt=start + chunk_size))
+        self.stdout.write(self.style.SUCCESS(f"Recalculated totals of {updated} orders."))
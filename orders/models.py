@@ -1,7 +1,33 @@
 import uuid
+from collections import Counter
+from decimal import Decimal
 
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Sum
+from django.db.models.functions import Coalesce, Greatest, Round
+
+from products.models import Product
+
+
+MONEY = models.DecimalField(max_digits=12, decimal_places=2)
+
+# product_price × quantity of one OrderItem, evaluated by the database.
+LINE_TOTAL = models.ExpressionWrapper(models.F("product_price") * models.F("quantity"), output_field=MONEY)
+
+
+def apply_units_sold(quantities, sign=1):
+    """Add (``sign=1``) or remove (``sign=-1``) units from ``Product.units_sold``.
+
+    ``quantities`` maps product ids to units. Each product is one UPDATE
+    with an F() expression, so concurrent orders never lose counts.
+    """
+    for product_id, quantity in quantities.items():
+        if product_id is None or not quantity:
+            continue
+        Product.objects.filter(pk=product_id).update(
+            units_sold=Greatest(models.F("units_sold") + sign * quantity, 0)
+        )
 
 
 class Order(models.Model):
@@ -13,6 +39,9 @@ class Order(models.Model):
         CANCELLED = "CANCELLED", "Cancelled"
         REFUNDED = "REFUNDED", "Refunded"
 
+    # Orders in these states do not count towards Product.units_sold.
+    UNSOLD_STATUSES = frozenset({Status.PENDING, Status.CANCELLED, Status.REFUNDED})
+
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -31,20 +60,66 @@ class Order(models.Model):
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
     notes = models.TextField(blank=True)
+    # Idempotency key issued with the checkout form; a resubmitted form finds
+    # the order it already created (see orders.checkout.place_order).
+    checkout_token = models.UUIDField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["-created_at"]
+        constraints = [
+            models.UniqueConstraint(fields=["user", "checkout_token"], name="order_unique_checkout_token"),
+        ]
 
     def __str__(self):
         return f"Order {self.order_number} — {self.user.email}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_status = instance.__dict__.get("status")
+        return instance
+
+    @property
+    def counts_as_sold(self):
+        return self.status not in self.UNSOLD_STATUSES
+
+    def save(self, *args, **kwargs):
+        stored = getattr(self, "_stored_status", None)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # Moving in or out of the unsold statuses adds or removes every
+            # line of the order from the products' units_sold counters.
+            if stored is not None and (stored not in self.UNSOLD_STATUSES) != self.counts_as_sold:
+                quantities = Counter()
+                for product_id, quantity in self.items.values_list("product_id", "quantity"):
+                    quantities[product_id] += quantity
+                apply_units_sold(quantities, 1 if self.counts_as_sold else -1)
+        self._stored_status = self.status
+
     def calculate_totals(self):
-        self.subtotal = sum(item.line_total for item in self.items.all())
+        subtotal = self.items.aggregate(subtotal=Sum(LINE_TOTAL, output_field=MONEY))["subtotal"]
+        self.subtotal = subtotal or Decimal("0.00")
         self.total = self.subtotal + self.shipping_cost
         self.save(update_fields=["subtotal", "total"])
 
+    @staticmethod
+    def recalculate_totals(orders):
+        """Recompute ``subtotal`` and ``total`` of ``orders`` in one UPDATE.
+
+        Returns the number of orders updated. Values are rounded to cents in
+        SQL because some backends (SQLite) multiply decimals as floats.
+        """
+        line_sum = (
+            OrderItem.objects.filter(order=models.OuterRef("pk"))
+            .values("order")
+            .annotate(subtotal=Sum(LINE_TOTAL, output_field=MONEY))
+            .values("subtotal")
+        )
+        subtotal = Round(Coalesce(models.Subquery(line_sum), models.Value(Decimal("0.00")), output_field=MONEY), 2)
+        return orders.update(subtotal=subtotal, total=subtotal + models.F("shipping_cost"))
+
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="items")
@@ -60,6 +135,24 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f"{self.quantity}× {self.product_name}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_line = (instance.__dict__.get("product_id"), instance.__dict__.get("quantity"))
+        return instance
+
+    def save(self, *args, **kwargs):
+        stored = getattr(self, "_stored_line", None)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if self.order.counts_as_sold:
+                quantities = Counter({self.product_id: self.quantity})
+                if stored is not None and stored[1] is not None:
+                    quantities[stored[0]] -= stored[1]
+                apply_units_sold(quantities)
+        self._stored_line = (self.product_id, self.quantity)
+
     @property
     def line_total(self):
         if self.product_price is None:
@@ -96,11 +189,36 @@ class ReturnRequest(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+
     def __str__(self):
         if self.order_item is not None:
             return f"Return request for {self.order_item.product_name}"
         return f"Return request #{self.pk}"
 
+    def restock(self):
+        """Put the returned units back in stock, once. Returns whether it did.
+
+        Only for approved or refunded returns; staff decide per request
+        whether the goods can be sold again.
+        """
+        from products import stock
+        from products.models import StockMovement
+
+        item = self.order_item
+        if item is None or item.product_id is None:
+            return False
+        if self.status not in (self.Status.APPROVED, self.Status.REFUNDED):
+            return False
+        with transaction.atomic():
+            returned = StockMovement.objects.filter(
+                kind=StockMovement.Kind.RETURN, order_id=item.order_id, product_id=item.product_id
+            )
+            if returned.exists():
+                return False
+            stock.return_stock(item.product_id, self.quantity, order=item.order)
+            stock.schedule_compaction([item.product_id])
+        return True
+
     @property
     def order(self):
         return self.order_item.order
\ No newline at end of file
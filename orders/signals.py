@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete
+from django.dispatch import Signal, receiver
+
+from .models import Order, OrderItem, apply_units_sold
+
+# Sent by orders.checkout.place_order with ``order`` and its ``items``. The
+# lines are bulk-created, so no post_save is sent for them.
+order_placed = Signal()
+
+
+@receiver(post_delete, sender=OrderItem, dispatch_uid="orders_units_sold_on_item_delete")
+def remove_units_on_item_delete(sender, instance, **kwargs):
+    # Also runs for queryset and cascade deletes. Items are deleted before
+    # their order, so the order's status can still be read here.
+    product_id, quantity = getattr(instance, "_stored_line", (instance.product_id, instance.quantity))
+    status = Order.objects.filter(pk=instance.order_id).values_list("status", flat=True).first()
+    if status is not None and status not in Order.UNSOLD_STATUSES:
+        apply_units_sold({product_id: quantity}, -1)
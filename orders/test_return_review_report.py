@@ -1,11 +1,17 @@
 from decimal import Decimal
+from io import StringIO
 
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from accounts.models import User
+from orders.loaders import OrderDetailLoader
 from orders.models import Order, OrderItem, ReturnRequest
-from products.models import Category, Product, Review
+from products import stock
+from products.models import Category, Inventory, Product, Review, StockMovement
 from reports.models import MerchantReport
 
 
@@ -410,4 +416,156 @@ class ReturnRequestValidationTests(BaseValidationTestCase):
         )
 
         self.assertEqual(response.status_code, 200)
-        self.assertContains(response, "View Return Requests")
\ No newline at end of file
+        self.assertContains(response, "View Return Requests")
+
+    def test_restock_puts_returned_units_back_once(self):
+        Inventory.objects.create(product=self.product, quantity=5)
+        order, item = self.create_order_with_item(status=Order.Status.DELIVERED)
+        return_request = ReturnRequest.objects.create(order_item=item, user=self.shopper, quantity=2, reason="Broken")
+
+        # Requested returns are not restocked until staff approve them.
+        self.assertFalse(return_request.restock())
+        return_request.status = ReturnRequest.Status.REFUNDED
+        return_request.save()
+        self.assertTrue(return_request.restock())
+        self.assertFalse(return_request.restock())
+
+        returns = StockMovement.objects.filter(kind=StockMovement.Kind.RETURN)
+        self.assertEqual(list(returns.values_list("quantity", "order")), [(2, order.pk)])
+        self.assertEqual(stock.available(self.product.pk), 7)
+
+
+class UnitsSoldCounterTests(BaseValidationTestCase):
+    # ---------------------------
+    # Best sellers: Product.units_sold
+    # ---------------------------
+
+    def units_sold(self):
+        return Product.objects.get(pk=self.product.pk).units_sold
+
+    def test_pending_orders_count_once_confirmed(self):
+        order, _ = self.create_order_with_item(status=Order.Status.PENDING, quantity=3)
+        self.assertEqual(self.units_sold(), 0)
+
+        order = Order.objects.get(pk=order.pk)
+        order.status = Order.Status.PROCESSING
+        order.save()
+        self.assertEqual(self.units_sold(), 3)
+
+        order.status = Order.Status.SHIPPED
+        order.save()
+        self.assertEqual(self.units_sold(), 3)
+
+        order.status = Order.Status.REFUNDED
+        order.save()
+        self.assertEqual(self.units_sold(), 0)
+
+    def test_item_changes_on_confirmed_orders(self):
+        order, item = self.create_order_with_item(status=Order.Status.DELIVERED, quantity=2)
+        self.assertEqual(self.units_sold(), 2)
+
+        item = OrderItem.objects.get(pk=item.pk)
+        item.quantity = 5
+        item.save()
+        self.assertEqual(self.units_sold(), 5)
+
+        order.delete()
+        self.assertEqual(self.units_sold(), 0)
+
+    def test_best_sellers_reads_the_counter(self):
+        self.create_order_with_item(status=Order.Status.DELIVERED, quantity=4)
+        self.create_order_with_item(status=Order.Status.CANCELLED, quantity=7)
+
+        response = self.client.get(reverse("products:best_sellers"))
+
+        self.assertEqual(list(response.context["top_sellers"]), [self.product])
+        self.assertContains(response, "4 sold")
+
+
+class OrderTotalsTests(BaseValidationTestCase):
+    # ---------------------------
+    # Order totals: SQL aggregation and bulk recalculation
+    # ---------------------------
+
+    def test_calculate_totals_sums_lines_in_sql(self):
+        order, item = self.create_order_with_item(status=Order.Status.PENDING, quantity=3)
+        OrderItem.objects.create(order=order, product_name="Extra", product_price=Decimal("0.10"), quantity=3)
+        order.shipping_cost = Decimal("4.50")
+
+        # The aggregate and the UPDATE (plus the savepoint around save()).
+        with self.assertNumQueries(4):
+            order.calculate_totals()
+
+        order.refresh_from_db()
+        self.assertEqual(order.subtotal, Decimal("60.27"))
+        self.assertEqual(order.total, Decimal("64.77"))
+
+    def test_recalculate_command_fixes_every_chunk(self):
+        orders = [self.create_order_with_item(status=Order.Status.PENDING, quantity=n)[0] for n in (1, 2, 3)]
+        empty = Order.objects.create(
+            user=self.shopper, shipping_name="Test Shopper", shipping_address="123 Test Street", total=Decimal("5.00")
+        )
+        Order.objects.update(subtotal=Decimal("0.00"), shipping_cost=Decimal("1.00"))
+
+        out = StringIO()
+        call_command("recalculate_order_totals", chunk_size=2, stdout=out)
+
+        self.assertIn("Recalculated totals of 4 orders.", out.getvalue())
+        totals = dict(Order.objects.values_list("pk", "total"))
+        self.assertEqual([totals[order.pk] for order in orders], [Decimal("20.99"), Decimal("40.98"), Decimal("60.97")])
+        self.assertEqual(Order.objects.get(pk=empty.pk).subtotal, Decimal("0.00"))
+        self.assertEqual(totals[empty.pk], Decimal("1.00"))
+
+
+class OrderDetailLoaderTests(BaseValidationTestCase):
+    # ---------------------------
+    # Order detail: batched items, returns and reviews
+    # ---------------------------
+
+    def add_line(self, order, name, price="5.00"):
+        product = Product.objects.create(
+            name=name, price=Decimal(price), category=self.category, merchant=self.merchant, is_active=True
+        )
+        return OrderItem.objects.create(
+            order=order, product=product, product_name=name, product_price=product.price, quantity=1
+        )
+
+    def test_loader_uses_constant_queries(self):
+        order, item = self.create_order_with_item(status=Order.Status.DELIVERED)
+        extra = self.add_line(order, "Second Product")
+        self.add_line(order, "Third Product")
+        Review.objects.create(product=self.product, user=self.shopper, rating=4, comment="Good")
+        ReturnRequest.objects.create(order_item=extra, user=self.shopper, quantity=1, reason="Wrong size")
+
+        with self.assertNumQueries(2):
+            detail = OrderDetailLoader(self.shopper).load(order)
+            rows = [
+                (line.item.product_name, line.product.slug, bool(line.review), bool(line.return_request))
+                for line in detail.lines
+            ]
+
+        self.assertEqual(
+            rows,
+            [
+                ("Test Product", "test-product", True, False),
+                ("Second Product", "second-product", False, True),
+                ("Third Product", "third-product", False, False),
+            ],
+        )
+
+    def test_page_queries_do_not_grow_with_items(self):
+        order, _ = self.create_order_with_item(status=Order.Status.DELIVERED)
+        url = reverse("orders:order_detail", args=[order.order_number])
+        self.client.force_login(self.shopper)
+
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as one_item:
+            self.client.get(url)
+        self.add_line(order, "Second Product")
+        self.add_line(order, "Third Product")
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as three_items:
+            response = self.client.get(url)
+
+        self.assertContains(response, "Third Product")
+        self.assertEqual(len(three_items), len(one_item))
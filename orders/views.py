@@ -3,8 +3,8 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404, redirect, render
 
 from .forms import ReturnRequestForm
+from .loaders import OrderDetailLoader
 from .models import Order, OrderItem, ReturnRequest
-from products.models import Review
 
 @login_required
 def order_history(request):
@@ -15,25 +15,16 @@ def order_history(request):
 @login_required
 def order_detail(request, order_number):
     order = get_object_or_404(Order, order_number=order_number, user=request.user)
-
-    review_map = {}
-    for item in order.items.select_related("product"):
-        if item.product_id:
-            review_map[item.id] = Review.objects.filter(
-                product=item.product,
-                user=request.user,
-            ).first()
-        else:
-            review_map[item.id] = None
-
     return render(
         request,
         "orders/order_detail.html",
         {
             "order": order,
-            "review_map": review_map,
+            "detail": OrderDetailLoader(request.user).load(order),
         },
     )
+
+
 @login_required
 def request_return(request, order_number, item_id):
     order = get_object_or_404(Order, order_number=order_number, user=request.user)
@@ -1,14 +1,49 @@
+from django import forms
 from django.contrib import admin
 
-from .models import Category, Inventory, Product, Review
+from . import stock
+from .models import Category, Inventory, Product, Review, StockMovement
+
+
+class InventoryAdjustmentForm(forms.ModelForm):
+    """Inventory form whose stock changes go through the ledger as ADJUST rows."""
+
+    adjustment = forms.IntegerField(
+        required=False,
+        help_text="Units to add, or to remove if negative. Recorded in the stock ledger.",
+    )
+
+    class Meta:
+        model = Inventory
+        fields = ("low_stock_threshold",)
+
+    def clean_adjustment(self):
+        adjustment = self.cleaned_data.get("adjustment")
+        if adjustment and adjustment < 0:
+            free = stock.available(self.instance.product_id) if self.instance.pk else 0
+            if -adjustment > free:
+                raise forms.ValidationError(f"Only {free} unit(s) can be removed.")
+        return adjustment
+
+    def apply_adjustment(self):
+        adjustment = self.cleaned_data.get("adjustment")
+        if adjustment:
+            stock.adjust(self.instance.product_id, adjustment)
+            stock.compact_stock([self.instance.product_id])
+
+
+@admin.display(description="On hand")
+def on_hand(obj):
+    return stock.balance(obj.product_id)[0] if obj.pk else 0
 
 
 class InventoryInline(admin.StackedInline):
     model = Inventory
+    form = InventoryAdjustmentForm
     extra = 0
     min_num = 1
-    fields = ("quantity", "low_stock_threshold", "last_restocked")
-    readonly_fields = ("last_restocked",)
+    fields = (on_hand, "adjustment", "low_stock_threshold", "last_restocked")
+    readonly_fields = (on_hand, "last_restocked")
 
 
 @admin.register(Category)
@@ -34,11 +69,18 @@ class ProductAdmin(admin.ModelAdmin):
     prepopulated_fields = {"slug": ("name",)}
     inlines = [InventoryInline]
 
+    def save_formset(self, request, form, formset, change):
+        super().save_formset(request, form, formset, change)
+        if formset.model is Inventory:
+            for inline_form in formset.forms:
+                if inline_form.instance.pk and inline_form not in formset.deleted_forms:
+                    inline_form.apply_adjustment()
+
     @admin.display(description="Stock", ordering="inventory__quantity")
     def get_stock(self, obj):
         return obj.stock_quantity
 
-    @admin.display(description="Avg Rating")
+    @admin.display(description="Avg Rating", ordering="rating_average")
     def get_avg_rating(self, obj):
         avg = obj.average_rating
         return f"{avg}/5" if avg else "—"
@@ -49,7 +91,13 @@ class InventoryAdmin(admin.ModelAdmin):
     list_display = ("product", "quantity", "low_stock_threshold", "is_low_stock", "last_restocked", "updated_at")
     list_filter = ("last_restocked",)
     search_fields = ("product__name",)
-    readonly_fields = ("updated_at",)
+    form = InventoryAdjustmentForm
+    fields = ("product", on_hand, "adjustment", "low_stock_threshold", "last_restocked", "updated_at")
+    readonly_fields = (on_hand, "updated_at")
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        form.apply_adjustment()
 
     @admin.display(description="Low Stock?", boolean=True)
     def is_low_stock(self, obj):
@@ -66,3 +114,17 @@ class ReviewAdmin(admin.ModelAdmin):
     @admin.display(description="Comment")
     def short_comment(self, obj):
         return obj.comment[:80] + "…" if len(obj.comment) > 80 else obj.comment
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ("product", "kind", "quantity", "cart", "order", "expires_at", "created_at")
+    list_filter = ("kind",)
+    raw_id_fields = ("product", "hold", "cart", "order")
+
+    # The ledger is append-only.
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,308 @@
+"""Faceted navigation for the shop page.
+
+Facet counts come from an in-memory bitmap index over active products: each
+facet value (a category, a price band, ...) owns a Python ``int`` whose bit
+``i`` is set when row ``i`` has that value. The count for a value is the
+popcount of its bitmap ANDed with the other facets' selections, so a page
+shows live counts for every facet without any ``GROUP BY`` query.
+
+The index is cached per process and versioned through the Django cache like
+the recommendation feature matrix. Product, inventory and review signals
+mark the touched product dirty; the owning process re-reads just those rows
+on its next read, other processes see a foreign version and rebuild, and
+``PRODUCT_FACET_TTL`` bounds any drift.
+
+The listing itself is filtered with the equivalent ORM conditions
+(``filter_queryset``) so it keeps using the keyset pagination indexes.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q, Value
+from django.db.models.functions import Coalesce, NullIf
+
+from .models import Product
+
+VERSION_CACHE_KEY = "products:facet-index-version"
+
+RATING_BUCKETS = (4, 3, 2, 1)
+
+# (facet key, query parameter, heading) in display order.
+FACETS = (
+    ("category", "category", "Category"),
+    ("price", "price", "Price"),
+    ("in_stock", "in_stock", "Availability"),
+    ("rating", "rating", "Rating"),
+    ("merchant", "merchant", "Merchant"),
+)
+
+_ROW_FIELDS = (
+    "pk",
+    "category__slug",
+    "category__name",
+    "merchant_id",
+    "merchant__store_name",
+    "merchant__email",
+    "price",
+    "discount_price",
+    "inventory__quantity",
+    "rating_average",
+    "rating_count",
+)
+
+
+def price_bands() -> list[tuple[str, Decimal, Decimal | None]]:
+    """``(key, low, high)`` bands from ``PRODUCT_PRICE_BANDS`` boundaries."""
+    bounds = [Decimal(str(bound)) for bound in getattr(settings, "PRODUCT_PRICE_BANDS", (25, 50, 100, 250))]
+    bands = []
+    low = Decimal(0)
+    for high in bounds:
+        bands.append((f"{low:g}-{high:g}", low, high))
+        low = high
+    bands.append((f"{low:g}+", low, None))
+    return bands
+
+
+def _band_label(key: str) -> str:
+    if key.endswith("+"):
+        return f"${key[:-1]} & up"
+    low, high = key.split("-")
+    return f"${low} – ${high}"
+
+
+def _row_values(row, bands) -> dict[str, list[str]]:
+    """Facet values of one ``_ROW_FIELDS`` row."""
+    _, slug, _, merchant_id, _, _, price, discount, quantity, rating, rating_count = row
+    effective = discount or price
+    return {
+        "category": [slug] if slug else [],
+        "price": [key for key, low, high in bands if effective >= low and (high is None or effective < high)],
+        "in_stock": ["1"] if quantity else [],
+        "rating": [str(bucket) for bucket in RATING_BUCKETS if rating_count and rating >= bucket],
+        "merchant": [str(merchant_id)],
+    }
+
+
+@dataclass
+class FacetIndex:
+    positions: dict[int, int] = field(default_factory=dict)  # product id -> bit
+    free: list[int] = field(default_factory=list)  # bits of removed products, reused first
+    live: int = 0  # bits of rows that are active products
+    bitmaps: dict[str, dict[str, int]] = field(default_factory=lambda: {key: {} for key, _, _ in FACETS})
+    labels: dict[str, dict[str, str]] = field(default_factory=lambda: {key: {} for key, _, _ in FACETS})
+    bands: list = field(default_factory=price_bands)
+    version: str | None = None
+    built_at: float = field(default_factory=time.monotonic)
+
+    def _set_row(self, row) -> None:
+        pk = row[0]
+        position = self.positions.get(pk)
+        if position is None:
+            position = self.free.pop() if self.free else len(self.positions)
+            self.positions[pk] = position
+        bit = 1 << position
+        self.live |= bit
+        for facet, values in _row_values(row, self.bands).items():
+            for value in values:
+                self.bitmaps[facet][value] = self.bitmaps[facet].get(value, 0) | bit
+        if row[1]:
+            self.labels["category"][row[1]] = row[2]
+        self.labels["merchant"][str(row[3])] = row[4] or row[5]
+
+    def _clear_row(self, pk: int) -> None:
+        position = self.positions.pop(pk, None)
+        if position is None:
+            return
+        self.free.append(position)
+        mask = ~(1 << position)
+        self.live &= mask
+        for values in self.bitmaps.values():
+            for value in list(values):
+                values[value] &= mask
+                if not values[value]:
+                    del values[value]
+
+    def patched(self, product_ids, version: str | None) -> FacetIndex:
+        """A copy with ``product_ids`` re-read (one query); ``self`` is left untouched.
+
+        Readers hold on to the index they got and count without the lock, so
+        changes are applied to a copy that replaces the shared one.
+        """
+        index = replace(
+            self,
+            positions=dict(self.positions),
+            free=list(self.free),
+            bitmaps={facet: dict(values) for facet, values in self.bitmaps.items()},
+            labels={facet: dict(values) for facet, values in self.labels.items()},
+            version=version,
+        )
+        product_ids = set(product_ids)
+        for pk in product_ids:
+            index._clear_row(pk)
+        for row in Product.objects.filter(pk__in=product_ids, is_active=True).values_list(*_ROW_FIELDS):
+            index._set_row(row)
+        return index
+
+    def bitmap_for(self, ids) -> int:
+        bits = 0
+        for pk in ids:
+            position = self.positions.get(pk)
+            if position is not None:
+                bits |= 1 << position
+        return bits & self.live
+
+    def _selection_bits(self, facet: str, values) -> int:
+        bits = 0
+        for value in values:
+            bits |= self.bitmaps[facet].get(value, 0)
+        return bits
+
+    def counts(self, selected: dict[str, list[str]], within: int | None = None) -> dict[str, dict[str, int]]:
+        """Per-value counts; each facet is counted under the *other* facets' selections."""
+        base = self.live if within is None else within
+        selections = {facet: self._selection_bits(facet, values) for facet, values in selected.items() if values}
+        result = {}
+        for facet, _, _ in FACETS:
+            scope = base
+            for other, bits in selections.items():
+                if other != facet:
+                    scope &= bits
+            result[facet] = {
+                value: (bits & scope).bit_count() for value, bits in self.bitmaps[facet].items() if bits & scope
+            }
+        return result
+
+
+def build_facet_index(version: str | None = None) -> FacetIndex:
+    index = FacetIndex(version=version)
+    for row in Product.objects.filter(is_active=True).order_by("pk").values_list(*_ROW_FIELDS):
+        index._set_row(row)
+    return index
+
+
+_index: FacetIndex | None = None
+_pending: set[int] = set()
+_pending_version: str | None = None
+_lock = threading.Lock()
+
+
+def _facet_ttl() -> float:
+    return getattr(settings, "PRODUCT_FACET_TTL", 300)
+
+
+def get_facet_index() -> FacetIndex:
+    global _index, _pending_version
+    version = cache.get(VERSION_CACHE_KEY)
+    with _lock:
+        current = _index
+        if current is not None and time.monotonic() - current.built_at <= _facet_ttl():
+            if current.version == version:
+                return current
+            if version is not None and version == _pending_version:
+                # Only this process changed products since the last read.
+                _index = current.patched(_pending, version)
+                _pending.clear()
+                return _index
+        _index = build_facet_index(version)
+        _pending.clear()
+        _pending_version = None
+        return _index
+
+
+def mark_product_dirty(product_id: int) -> None:
+    """Record a product change and publish a new index version."""
+    global _pending_version
+    version = str(time.time_ns())
+    with _lock:
+        # Changes are only patched in if nobody else moved the version since
+        # this process last built or marked; otherwise a rebuild is due anyway.
+        if _index is not None and cache.get(VERSION_CACHE_KEY) in (_index.version, _pending_version):
+            _pending.add(product_id)
+            _pending_version = version
+        cache.set(VERSION_CACHE_KEY, version, timeout=None)
+
+
+def invalidate_facet_index() -> None:
+    """Force a full rebuild in every process (e.g. after a category rename)."""
+    global _pending_version
+    with _lock:
+        _pending.clear()
+        _pending_version = None
+        cache.set(VERSION_CACHE_KEY, str(time.time_ns()), timeout=None)
+
+
+def parse_selection(params) -> dict[str, list[str]]:
+    return {facet: [value for value in params.getlist(param) if value] for facet, param, _ in FACETS}
+
+
+def filter_queryset(queryset, selected: dict[str, list[str]]):
+    """Apply the same selection as ``FacetIndex.counts`` with ORM filters."""
+    if selected.get("category"):
+        queryset = queryset.filter(category__slug__in=selected["category"])
+    if selected.get("price"):
+        bands = {key: (low, high) for key, low, high in price_bands()}
+        condition = Q()
+        for key in selected["price"]:
+            if key in bands:
+                low, high = bands[key]
+                band = Q(effective_price_value__gte=low)
+                if high is not None:
+                    band &= Q(effective_price_value__lt=high)
+                condition |= band
+        queryset = queryset.annotate(
+            effective_price_value=Coalesce(NullIf("discount_price", Value(0)), "price")
+        ).filter(condition or Q(pk__in=[]))
+    if selected.get("in_stock"):
+        queryset = queryset.filter(inventory__quantity__gt=0)
+    if selected.get("rating"):
+        buckets = [int(value) for value in selected["rating"] if value.isdigit()]
+        queryset = queryset.filter(rating_count__gt=0, rating_average__gte=min(buckets, default=6))
+    if selected.get("merchant"):
+        queryset = queryset.filter(merchant_id__in=[value for value in selected["merchant"] if value.isdigit()])
+    return queryset
+
+
+def _sort_key(facet: str, value: str, label: str):
+    if facet == "price":
+        return (float(value.rstrip("+").split("-")[0]), "")
+    if facet == "rating":
+        return (-float(value) if value.isdigit() else 0.0, "")
+    return (0.0, label.lower())
+
+
+def facet_groups(index: FacetIndex, selected: dict[str, list[str]], counts: dict[str, dict[str, int]]):
+    """Template-ready facets: ``[{"key", "param", "title", "values": [...]}]``."""
+    band_keys = {key for key, _, _ in index.bands}
+    groups = []
+    for facet, param, title in FACETS:
+        values = []
+        for value in set(counts[facet]) | set(selected.get(facet, [])):
+            if facet == "price":
+                if value not in band_keys:
+                    continue
+                label = _band_label(value)
+            elif facet == "in_stock":
+                label = "In stock"
+            elif facet == "rating":
+                label = f"{value}★ & up"
+            else:
+                label = index.labels[facet].get(value, value)
+            values.append(
+                {
+                    "value": value,
+                    "label": label,
+                    "count": counts[facet].get(value, 0),
+                    "selected": value in selected.get(facet, []),
+                }
+            )
+        values.sort(key=lambda item: _sort_key(facet, item["value"], item["label"]))
+        if values:
+            groups.append({"key": facet, "param": param, "title": title, "values": values})
+    return groups
@@ -0,0 +1,24 @@
+"""
+Management command: compact_stock
+
+Records a RELEASE for every expired cart hold, then folds the stock ledger
+into each product's Inventory.quantity snapshot. Changes compact their own
+products right after they commit; run this on a schedule so expired holds
+are released and movements whose compaction did not run are folded too.
+
+Usage:
+    python manage.py compact_stock
+"""
+
+from django.core.management.base import BaseCommand
+
+from products.stock import compact_stock, release_expired
+
+
+class Command(BaseCommand):
+    help = "Release expired stock holds and compact the stock ledger."
+
+    def handle(self, *args, **options):
+        released = release_expired()
+        changed = compact_stock()
+        self.stdout.write(self.style.SUCCESS(f"Released {released} expired holds; compacted {changed} products."))
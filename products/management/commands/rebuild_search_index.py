@@ -0,0 +1,25 @@
+"""
+Management command: rebuild_search_index
+
+Re-creates every row of the product full-text search index from the product
+table. Product saves keep the index in sync; run this after bulk imports or
+raw SQL writes that bypass model signals.
+
+Usage:
+    python manage.py rebuild_search_index
+"""
+
+from django.core.management.base import BaseCommand
+
+from products.search import rebuild_search_index, search_index_available
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product full-text search index."
+
+    def handle(self, *args, **options):
+        if not search_index_available():
+            self.stdout.write("Full-text index not available on this database; search uses the fallback.")
+            return
+        count = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} products."))
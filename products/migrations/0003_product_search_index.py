@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    from products.search import create_search_index
+
+    create_search_index(schema_editor)
+
+
+def drop_index(apps, schema_editor):
+    from products.search import drop_search_index
+
+    drop_search_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0002_remove_product_stock_inventory_review"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_rating_totals(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    Review = apps.get_model("products", "Review")
+    totals = (
+        Review.objects.values("product")
+        .annotate(total=models.Sum("rating"), count=models.Count("id"))
+        .values_list("product", "total", "count")
+    )
+    for product_id, total, count in totals:
+        Product.objects.filter(pk=product_id).update(
+            rating_sum=total,
+            rating_count=count,
+            rating_average=total / count,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_product_listing_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_average',
+            field=models.FloatField(default=0.0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-rating_average', '-rating_count'], name='product_rating_idx'),
+        ),
+        migrations.RunPython(backfill_rating_totals, migrations.RunPython.noop),
+    ]
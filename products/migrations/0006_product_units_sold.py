@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+UNSOLD_STATUSES = ["PENDING", "CANCELLED", "REFUNDED"]
+
+
+def backfill_units_sold(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    OrderItem = apps.get_model("orders", "OrderItem")
+    totals = (
+        OrderItem.objects.filter(product__isnull=False)
+        .exclude(order__status__in=UNSOLD_STATUSES)
+        .values("product")
+        .annotate(total=models.Sum("quantity"))
+        .values_list("product", "total")
+    )
+    for product_id, total in totals:
+        Product.objects.filter(pk=product_id).update(units_sold=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_rating_totals'),
+        ('orders', '0003_remove_returnrequest_order_returnrequest_order_item_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='units_sold',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', '-units_sold', '-rating_average', '-rating_count'], name='product_best_seller_idx'),
+        ),
+        migrations.RunPython(backfill_units_sold, migrations.RunPython.noop),
+    ]
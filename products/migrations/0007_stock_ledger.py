@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0002_cart_totals'),
+        ('orders', '0003_remove_returnrequest_order_returnrequest_order_item_and_more'),
+        ('products', '0006_product_units_sold'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventory',
+            name='ledger_position',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('RESERVE', 'Reserve'), ('COMMIT', 'Commit'), ('RELEASE', 'Release'), ('RESTOCK', 'Restock'), ('RETURN', 'Return')], max_length=8)),
+                ('quantity', models.PositiveIntegerField()),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('cart', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='cart.cart')),
+                ('hold', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='settlements', to='products.stockmovement')),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='orders.order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='products.product')),
+            ],
+            options={
+                'ordering': ['pk'],
+                'indexes': [models.Index(fields=['product', 'kind', 'expires_at'], name='stock_hold_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0003_cart_version'),
+        ('orders', '0004_order_checkout_token'),
+        ('products', '0007_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='kind',
+            field=models.CharField(choices=[('RESERVE', 'Reserve'), ('COMMIT', 'Commit'), ('RELEASE', 'Release'), ('RESTOCK', 'Restock'), ('RETURN', 'Return'), ('ADJUST', 'Adjust')], max_length=8),
+        ),
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='quantity',
+            field=models.IntegerField(),
+        ),
+        migrations.AddConstraint(
+            model_name='stockmovement',
+            constraint=models.CheckConstraint(condition=models.Q(('quantity__gte', 0), ('kind', 'ADJUST'), _connector='OR'), name='stock_movement_quantity_sign'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:34
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def flag_compacted_movements(apps, schema_editor):
+    Inventory = apps.get_model("products", "Inventory")
+    StockMovement = apps.get_model("products", "StockMovement")
+    position = Inventory.objects.filter(product_id=OuterRef("product_id")).values("ledger_position")
+    StockMovement.objects.filter(pk__lte=Subquery(position)).update(compacted=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0003_cart_version'),
+        ('orders', '0004_order_checkout_token'),
+        ('products', '0008_stock_adjust'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockmovement',
+            name='compacted',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(flag_compacted_movements, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='inventory',
+            name='ledger_position',
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['product', 'compacted'], name='stock_pending_idx'),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.conf import settings
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Cast
 from django.urls import reverse
 from django.utils.text import slugify
 
@@ -47,11 +48,30 @@ class Product(models.Model):
     discount_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     image = models.ImageField(upload_to="products/", null=True, blank=True)
     is_active = models.BooleanField(default=True)
+    # Review totals, kept in step with Review saves and deletes (see
+    # apply_rating_change) so that ratings are read and sorted without
+    # aggregating the reviews table.
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_average = models.FloatField(default=0.0, editable=False)
+    # Units in orders outside Order.UNSOLD_STATUSES, kept in step by Order
+    # and OrderItem saves (see orders.models.apply_units_sold).
+    units_sold = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["-rating_average", "-rating_count"], name="product_rating_idx"),
+            models.Index(
+                fields=["is_active", "-units_sold", "-rating_average", "-rating_count"],
+                name="product_best_seller_idx",
+            ),
+            # Keyset pagination seeks on (-created_at, -id), see pagination.py.
+            models.Index(fields=["is_active", "-created_at", "-id"], name="product_active_created_idx"),
+            models.Index(fields=["category", "is_active", "-created_at", "-id"], name="product_category_created_idx"),
+        ]
 
     def __str__(self):
         return self.name
@@ -84,15 +104,31 @@ class Product(models.Model):
         except Inventory.DoesNotExist:
             return 0
 
+    @property
+    def card_version(self):
+        """Changes whenever anything shown on the cached product card changes.
+
+        Rating and sales counters are updated without touching ``updated_at``,
+        so they are part of the version too. Reads the inventory, so callers
+        rendering many cards should ``select_related("inventory")``.
+        """
+        try:
+            stock_version = f"{self.inventory.quantity}@{self.inventory.updated_at.timestamp()}"
+        except Inventory.DoesNotExist:
+            stock_version = "none"
+        return (
+            f"{self.updated_at.timestamp()}:{stock_version}:"
+            f"{self.rating_sum}/{self.rating_count}:{self.units_sold}"
+        )
+
     @property
     def average_rating(self):
         """Return the average review rating, or None if no reviews."""
-        avg = self.reviews.aggregate(models.Avg("rating"))["rating__avg"]
-        return round(avg, 1) if avg is not None else None
+        return round(self.rating_average, 1) if self.rating_count else None
 
     @property
     def review_count(self):
-        return self.reviews.count()
+        return self.rating_count
 
 
 # ---------------------------------------------------------------------------
@@ -128,25 +164,103 @@ class Inventory(models.Model):
 
     def decrease(self, amount=1):
         """Decrease stock by *amount*. Raises ValueError if insufficient."""
-        if amount > self.quantity:
+        from .stock import InsufficientStock, compact_stock, take
+
+        try:
+            with transaction.atomic():
+                take(self.product_id, amount)
+                compact_stock([self.product_id])
+        except InsufficientStock as exc:
             raise ValueError(
-                f"Cannot decrease stock by {amount} — only {self.quantity} available."
-            )
-        self.quantity -= amount
-        self.save(update_fields=["quantity", "updated_at"])
+                f"Cannot decrease stock by {amount} — only {exc.available} available."
+            ) from exc
+        self.refresh_from_db(fields=["quantity", "updated_at"])
 
     def increase(self, amount=1):
         """Increase stock by *amount* (e.g. after a restock)."""
         from django.utils import timezone
 
-        self.quantity += amount
+        from .stock import compact_stock, restock
+
+        with transaction.atomic():
+            restock(self.product_id, amount)
+            compact_stock([self.product_id])
         self.last_restocked = timezone.now()
-        self.save(update_fields=["quantity", "last_restocked", "updated_at"])
+        self.save(update_fields=["last_restocked", "updated_at"])
+        self.refresh_from_db(fields=["quantity"])
+
+
+class StockMovement(models.Model):
+    class Kind(models.TextChoices):
+        RESERVE = "RESERVE", "Reserve"
+        COMMIT = "COMMIT", "Commit"
+        RELEASE = "RELEASE", "Release"
+        RESTOCK = "RESTOCK", "Restock"
+        RETURN = "RETURN", "Return"
+        ADJUST = "ADJUST", "Adjust"
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="stock_movements")
+    kind = models.CharField(max_length=8, choices=Kind.choices)
+    # Negative only on ADJUST rows that remove units.
+    quantity = models.IntegerField()
+    # Set once compact_stock has folded the row into Inventory.quantity.
+    compacted = models.BooleanField(default=False, editable=False)
+    # COMMIT and RELEASE rows that settle a reservation point at its RESERVE row.
+    hold = models.ForeignKey(
+        "self",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="settlements",
+    )
+    cart = models.ForeignKey("cart.Cart", on_delete=models.SET_NULL, null=True, blank=True)
+    order = models.ForeignKey("orders.Order", on_delete=models.SET_NULL, null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["pk"]
+        indexes = [
+            models.Index(fields=["product", "kind", "expires_at"], name="stock_hold_idx"),
+            models.Index(fields=["product", "compacted"], name="stock_pending_idx"),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(quantity__gte=0) | models.Q(kind="ADJUST"),
+                name="stock_movement_quantity_sign",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.quantity}× product {self.product_id}"
 
 
 # ---------------------------------------------------------------------------
 # Review — links a User to a Product with a 1-5 rating and comment
 # ---------------------------------------------------------------------------
+def apply_rating_change(product_id, sum_delta, count_delta):
+    """Add a review's rating to (or remove it from) the product's totals.
+
+    Done as a single UPDATE with F() expressions, so concurrent reviews of the
+    same product never overwrite each other's totals.
+    """
+    if product_id is None or (not sum_delta and not count_delta):
+        return
+    new_sum = models.F("rating_sum") + sum_delta
+    new_count = models.F("rating_count") + count_delta
+    Product.objects.filter(pk=product_id).update(
+        rating_sum=new_sum,
+        rating_count=new_count,
+        rating_average=models.Case(
+            models.When(
+                rating_count__gt=-count_delta,
+                then=Cast(new_sum, models.FloatField()) / new_count,
+            ),
+            default=models.Value(0.0),
+        ),
+    )
+
+
 class Review(models.Model):
     product = models.ForeignKey(
         Product,
@@ -180,3 +294,23 @@ class Review(models.Model):
 
     def __str__(self):
         return f"{self.user.email} — {self.product.name} ({self.rating}/5)"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored rating so that save() only applies the change.
+        instance._stored_rating = (instance.__dict__.get("product_id"), instance.__dict__.get("rating"))
+        return instance
+
+    def save(self, *args, **kwargs):
+        stored = getattr(self, "_stored_rating", None)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if stored is None or stored[1] is None:
+                apply_rating_change(self.product_id, self.rating, 1)
+            elif stored[0] != self.product_id:
+                apply_rating_change(stored[0], -stored[1], -1)
+                apply_rating_change(self.product_id, self.rating, 1)
+            else:
+                apply_rating_change(self.product_id, self.rating - stored[1], 0)
+        self._stored_rating = (self.product_id, self.rating)
@@ -0,0 +1,76 @@
+"""Keyset (seek) pagination for product listings.
+
+Listings are ordered by ``(-created_at, -id)`` and each page starts strictly
+after the last product of the previous one, so fetching page N costs the same
+index seek as page 1 — no ``OFFSET`` scan — and products added meanwhile
+never shift or repeat items across pages. The position is carried in the URL
+as an opaque ``after`` cursor.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+from dataclasses import dataclass
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+
+ORDERING = ("-created_at", "-id")
+
+
+@dataclass(frozen=True)
+class KeysetPage:
+    items: list
+    next_cursor: str | None
+    cursor: str | None
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def is_first(self) -> bool:
+        return self.cursor is None
+
+
+def encode_cursor(product) -> str:
+    raw = f"{product.created_at.isoformat()}|{product.pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str | None) -> tuple[datetime, int] | None:
+    """Return ``(created_at, id)`` for a cursor, or None when it is malformed."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.split("|")
+        return datetime.fromisoformat(created_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def page_size() -> int:
+    return getattr(settings, "PRODUCT_PAGE_SIZE", 24)
+
+
+def paginate_products(queryset, cursor: str | None = None, size: int | None = None) -> KeysetPage:
+    """Return the page of ``queryset`` that follows ``cursor``.
+
+    A missing or malformed cursor yields the first page.
+    """
+    size = size or page_size()
+    position = decode_cursor(cursor)
+    queryset = queryset.order_by(*ORDERING)
+    if position is None:
+        cursor = None
+    else:
+        created_at, pk = position
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+
+    # One extra row tells whether another page exists without a COUNT(*).
+    items = list(queryset[: size + 1])
+    next_cursor = encode_cursor(items[size - 1]) if len(items) > size else None
+    return KeysetPage(items=items[:size], next_cursor=next_cursor, cursor=cursor)
@@ -0,0 +1,231 @@
+"""Full-text product search.
+
+On SQLite builds with FTS5 the catalog is mirrored into the
+``products_product_fts`` virtual table (rowid = product id), so a ``?q=``
+search is an index lookup ranked with BM25, with the product name weighted
+above the description. Every search term is a prefix query: ``vita`` matches
+``vitamin``. Other databases fall back to the previous ``icontains`` filter.
+
+Both backends annotate each result with ``search_name`` and
+``search_snippet``: HTML-escaped text in which the matched terms are wrapped
+in ``<mark>``. The index is kept in sync by the product signals; run
+``manage.py rebuild_search_index`` after bulk writes that bypass them.
+"""
+
+from __future__ import annotations
+
+import re
+import sqlite3
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Product
+
+FTS_TABLE = "products_product_fts"
+
+# Relative BM25 weights of the indexed columns (name, description).
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+# Control characters mark matches inside FTS output; they cannot occur in a
+# term and are swapped for <mark> only after the text has been escaped.
+_OPEN, _CLOSE = "\x02", "\x03"
+
+
+@lru_cache(maxsize=None)
+def fts5_supported() -> bool:
+    """Whether the SQLite library this process links against has FTS5."""
+    try:
+        probe = sqlite3.connect(":memory:")
+        try:
+            probe.execute("CREATE VIRTUAL TABLE probe USING fts5(body)")
+        finally:
+            probe.close()
+    except sqlite3.Error:
+        return False
+    return True
+
+
+def create_search_index(schema_editor) -> bool:
+    """Create and fill the FTS table. Returns False when FTS5 is unavailable."""
+    if schema_editor.connection.vendor != "sqlite" or not fts5_supported():
+        return False
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        "name, description, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    schema_editor.execute(
+        f"INSERT INTO {FTS_TABLE} (rowid, name, description) SELECT id, name, description FROM products_product"
+    )
+    return True
+
+
+def drop_search_index(schema_editor) -> None:
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def search_index_available() -> bool:
+    if connection.vendor != "sqlite" or not fts5_supported():
+        return False
+    return _table_exists(connection.settings_dict["NAME"])
+
+
+@lru_cache(maxsize=None)
+def _table_exists(database_name) -> bool:
+    # Cached per database file; the test runner uses its own database name.
+    return FTS_TABLE in connection.introspection.table_names()
+
+
+def index_product(product) -> None:
+    if not search_index_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product.pk])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)",
+            [product.pk, product.name, product.description],
+        )
+
+
+def unindex_product(product_id: int) -> None:
+    if not search_index_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [product_id])
+
+
+def rebuild_search_index() -> int:
+    """Re-create every index row from the product table. Returns the row count."""
+    if not search_index_available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, description) SELECT id, name, description FROM products_product"
+        )
+        cursor.execute(f"SELECT COUNT(*) FROM {FTS_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def search_terms(query: str) -> list[str]:
+    return TERM_RE.findall(query or "")
+
+
+def match_expression(terms: list[str]) -> str:
+    # Each term is quoted (so FTS operators in user input are literal text)
+    # and made a prefix query; adjacent terms are ANDed.
+    return " ".join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+
+
+def _render_marks(text: str) -> str:
+    return mark_safe(escape(text).replace(_OPEN, "<mark>").replace(_CLOSE, "</mark>"))
+
+
+def _mark_terms(text: str, terms: list[str]) -> str:
+    if not text or not terms:
+        return text or ""
+    pattern = re.compile(r"\b(" + "|".join(re.escape(term) for term in terms) + r")\w*", re.IGNORECASE)
+    return pattern.sub(lambda match: f"{_OPEN}{match.group(0)}{_CLOSE}", text)
+
+
+def _snippet(text: str, terms: list[str], width: int = 160) -> str:
+    # Fallback counterpart of FTS5 snippet(): a window around the first match.
+    marked = _mark_terms(text, terms)
+    start = marked.find(_OPEN)
+    if start <= 0 and len(marked) <= width:
+        return marked
+    start = max(start - width // 4, 0)
+    window = marked[start : start + width]
+    # Never cut a marker pair in half.
+    if window.count(_OPEN) > window.count(_CLOSE):
+        window += _CLOSE
+    return ("…" if start else "") + window + ("…" if start + width < len(marked) else "")
+
+
+def _result_limit() -> int:
+    return getattr(settings, "PRODUCT_SEARCH_RESULT_LIMIT", 100)
+
+
+def search_products(queryset, query: str, limit: int | None = None) -> list:
+    """Return the products of ``queryset`` matching ``query``, best match first."""
+    terms = search_terms(query)
+    if not terms:
+        return []
+    limit = limit or _result_limit()
+    if search_index_available():
+        return _search_fts(queryset, terms, limit)
+    return _search_fallback(queryset, terms, limit)
+
+
+def matching_ids(query: str) -> set[int]:
+    """Ids of every product matching ``query``, without ranking or highlighting."""
+    terms = search_terms(query)
+    if not terms:
+        return set()
+    if search_index_available():
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match_expression(terms)])
+            return {row[0] for row in cursor.fetchall()}
+    return set(Product.objects.filter(_fallback_condition(terms)).values_list("pk", flat=True))
+
+
+def _search_fts(queryset, terms: list[str], limit: int) -> list:
+    # The candidate queryset (active, category, ...) is applied inside the
+    # FTS query so that the limit counts only products the page can show.
+    candidates_sql, candidates_params = queryset.values("pk").query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, "
+            f"highlight({FTS_TABLE}, 0, %s, %s), "
+            f"snippet({FTS_TABLE}, 1, %s, %s, '…', 24) "
+            f"FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND rowid IN ({candidates_sql}) "
+            f"ORDER BY bm25({FTS_TABLE}, %s, %s) "
+            f"LIMIT %s",
+            [
+                _OPEN,
+                _CLOSE,
+                _OPEN,
+                _CLOSE,
+                match_expression(terms),
+                *candidates_params,
+                NAME_WEIGHT,
+                DESCRIPTION_WEIGHT,
+                limit,
+            ],
+        )
+        hits = cursor.fetchall()
+
+    products = queryset.in_bulk([row[0] for row in hits])
+    results = []
+    for pk, name, snippet in hits:
+        product = products.get(pk)
+        if product is None:
+            continue
+        product.search_name = _render_marks(name)
+        product.search_snippet = _render_marks(snippet)
+        results.append(product)
+    return results
+
+
+def _fallback_condition(terms: list[str]) -> Q:
+    condition = Q()
+    for term in terms:
+        condition &= Q(name__icontains=term) | Q(description__icontains=term)
+    return condition
+
+
+def _search_fallback(queryset, terms: list[str], limit: int) -> list:
+    results = list(queryset.filter(_fallback_condition(terms))[:limit])
+    for product in results:
+        product.search_name = _render_marks(_mark_terms(product.name, terms))
+        product.search_snippet = _render_marks(_snippet(product.description, terms))
+    return results
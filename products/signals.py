@@ -0,0 +1,53 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .facets import invalidate_facet_index, mark_product_dirty
+from .models import Category, Inventory, Product, Review, apply_rating_change
+from .search import index_product, unindex_product
+
+SEARCHED_FIELDS = {"name", "description"}
+
+
+@receiver(post_save, sender=Product, dispatch_uid="products_search_index")
+def index_product_on_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields and not SEARCHED_FIELDS & set(update_fields)):
+        return
+    index_product(instance)
+
+
+@receiver(post_delete, sender=Product, dispatch_uid="products_search_unindex")
+def unindex_product_on_delete(sender, instance, **kwargs):
+    unindex_product(instance.pk)
+
+
+@receiver(post_delete, sender=Review, dispatch_uid="products_rating_on_review_delete")
+def remove_rating_on_review_delete(sender, instance, **kwargs):
+    # A receiver rather than Review.delete() so that queryset and cascade
+    # deletes are counted too; deletion runs inside its own transaction.
+    product_id, rating = getattr(instance, "_stored_rating", (instance.product_id, instance.rating))
+    apply_rating_change(product_id, -rating, -1)
+
+
+# ---------------------------------------------------------------------------
+# Facet index — patch the touched product's bits on its next read
+# ---------------------------------------------------------------------------
+def _mark_facets_dirty(sender, instance, raw=False, **kwargs):
+    # After commit, so the re-read cannot miss the change or see a rolled-back one.
+    if not raw:
+        product_id = instance.pk if sender is Product else instance.product_id
+        transaction.on_commit(partial(mark_product_dirty, product_id))
+
+
+for _model in (Product, Inventory, Review):
+    post_save.connect(_mark_facets_dirty, sender=_model, dispatch_uid=f"products_facets_{_model.__name__}")
+    post_delete.connect(_mark_facets_dirty, sender=_model, dispatch_uid=f"products_facets_delete_{_model.__name__}")
+
+
+@receiver(post_save, sender=Category, dispatch_uid="products_facets_category")
+@receiver(post_delete, sender=Category, dispatch_uid="products_facets_category_delete")
+def rebuild_facets_on_category_change(sender, raw=False, **kwargs):
+    if not raw:
+        invalidate_facet_index()
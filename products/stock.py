@@ -0,0 +1,292 @@
+"""Stock ledger.
+
+Stock changes are appended to ``StockMovement`` instead of rewriting the
+``Inventory`` row, so concurrent checkouts of a popular product insert rows
+rather than queueing on one counter:
+
+* ``RESTOCK`` and ``RETURN`` add units on hand, ``COMMIT`` removes them.
+* ``ADJUST`` corrects the units on hand by a signed quantity (staff edits
+  in the admin, stock counts).
+* ``RESERVE`` holds units (for a cart, when ``cart`` is set) until
+  ``expires_at``; the hold is settled by a ``COMMIT`` (checkout) or
+  ``RELEASE`` row pointing at it.
+  Expired holds stop counting on their own; ``release_expired`` records
+  the matching ``RELEASE`` rows.
+
+``Inventory.quantity`` is a compacted snapshot of the ledger: the sum of
+every movement whose ``compacted`` flag is set. ``compact_stock`` folds the
+remaining rows into it and flags them. It runs right after each stock
+change commits (``schedule_compaction``), synchronously for
+``Inventory.decrease``/``increase``, and from ``manage.py compact_stock``,
+so pages that show stock read an up-to-date snapshot. Cart pricing,
+checkout and reservations read snapshot + uncompacted movements − other
+carts' active holds, which is exact even between a commit and its
+compaction.
+
+Only reservations check availability, and they are the one place that
+still takes a row lock: ``reserve`` locks the product's inventory row
+(``select_for_update``) for its balance read and insert. Appending the hold
+first and checking the balance afterwards would not be enough, because
+under READ COMMITTED two concurrent reservations cannot see each other's
+uncommitted holds and could both take the last unit. The lock only
+serializes reservations of the same product (plus its compaction); sales,
+releases, restocks and returns append without it, and the row itself is
+written only by compaction.
+"""
+
+from __future__ import annotations
+
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Inventory, StockMovement
+
+Kind = StockMovement.Kind
+
+# Change in units on hand contributed by one movement.
+ON_HAND_DELTA = Case(
+    When(kind=Kind.COMMIT, then=-F("quantity")),
+    When(kind__in=[Kind.RESTOCK, Kind.RETURN, Kind.ADJUST], then=F("quantity")),
+    default=Value(0),
+    output_field=IntegerField(),
+)
+
+
+class InsufficientStock(ValueError):
+    def __init__(self, product_id, requested, available):
+        self.product_id = product_id
+        self.requested = requested
+        self.available = available
+        super().__init__(f"Only {available} unit(s) of product {product_id} available, {requested} requested.")
+
+
+def hold_duration() -> timedelta:
+    return timedelta(minutes=getattr(settings, "STOCK_HOLD_MINUTES", 15))
+
+
+def active_holds(now=None):
+    """RESERVE rows that are neither settled nor expired."""
+    return StockMovement.objects.filter(
+        kind=Kind.RESERVE,
+        expires_at__gt=now or timezone.now(),
+        settlements__isnull=True,
+    )
+
+
+def pending_delta(product_ref):
+    """On-hand change of the product's movements not yet compacted, as an expression."""
+    pending = (
+        StockMovement.objects.filter(product_id=product_ref, compacted=False)
+        .values("product_id")
+        .annotate(delta=Sum(ON_HAND_DELTA))
+        .values("delta")
+    )
+    return Coalesce(Subquery(pending), 0)
+
+
+def held_quantity(product_ref, exclude_cart_id=None):
+    """Units of the product in active holds, as an expression."""
+    holds = active_holds().filter(product_id=product_ref)
+    if exclude_cart_id is not None:
+        holds = holds.exclude(cart_id=exclude_cart_id)
+    held = holds.values("product_id").annotate(total=Sum("quantity")).values("total")
+    return Coalesce(Subquery(held), 0)
+
+
+def balance(product_id, exclude_cart_id=None) -> tuple[int, int]:
+    """``(on_hand, held)`` for one product from a single query."""
+    row = (
+        Inventory.objects.filter(product_id=product_id)
+        .annotate(
+            on_hand=F("quantity") + pending_delta(OuterRef("product_id")),
+            held=held_quantity(OuterRef("product_id"), exclude_cart_id),
+        )
+        .values_list("on_hand", "held")
+        .first()
+    )
+    return row or (0, 0)
+
+
+def available(product_id, exclude_cart_id=None) -> int:
+    on_hand, held = balance(product_id, exclude_cart_id)
+    return max(on_hand - held, 0)
+
+
+def reserve(product_id, quantity, cart_id=None, order=None, duration=None) -> StockMovement:
+    """Hold ``quantity`` units, or raise ``InsufficientStock``."""
+    with transaction.atomic():
+        # Serializes reservations of this product so the balance read below
+        # sees every competing hold (see the module docstring).
+        Inventory.objects.select_for_update().filter(product_id=product_id).values_list("pk").first()
+        free = available(product_id)
+        if quantity > free:
+            raise InsufficientStock(product_id, quantity, free)
+        return StockMovement.objects.create(
+            product_id=product_id,
+            kind=Kind.RESERVE,
+            quantity=quantity,
+            cart_id=cart_id,
+            order=order,
+            expires_at=timezone.now() + (duration or hold_duration()),
+        )
+
+
+def commit(hold, order=None) -> StockMovement:
+    """Turn a reservation into a sale."""
+    return StockMovement.objects.create(
+        product_id=hold.product_id,
+        kind=Kind.COMMIT,
+        quantity=hold.quantity,
+        hold=hold,
+        order=order or hold.order,
+    )
+
+
+def release(hold) -> StockMovement:
+    return StockMovement.objects.create(
+        product_id=hold.product_id,
+        kind=Kind.RELEASE,
+        quantity=hold.quantity,
+        hold=hold,
+        order=hold.order,
+    )
+
+
+def take(product_id, quantity, order=None) -> StockMovement:
+    """Reserve and commit in one step (a sale without a cart hold)."""
+    with transaction.atomic():
+        return commit(reserve(product_id, quantity, order=order))
+
+
+def restock(product_id, quantity) -> StockMovement:
+    Inventory.objects.get_or_create(product_id=product_id)
+    return StockMovement.objects.create(product_id=product_id, kind=Kind.RESTOCK, quantity=quantity)
+
+
+def return_stock(product_id, quantity, order=None) -> StockMovement:
+    return StockMovement.objects.create(product_id=product_id, kind=Kind.RETURN, quantity=quantity, order=order)
+
+
+def adjust(product_id, quantity) -> StockMovement:
+    """Add ``quantity`` units on hand, or remove them when negative.
+
+    Removals check availability like a reservation, so a correction cannot
+    take units that carts are holding.
+    """
+    with transaction.atomic():
+        Inventory.objects.get_or_create(product_id=product_id)
+        if quantity < 0:
+            Inventory.objects.select_for_update().filter(product_id=product_id).values_list("pk").first()
+            free = available(product_id)
+            if -quantity > free:
+                raise InsufficientStock(product_id, -quantity, free)
+        return StockMovement.objects.create(product_id=product_id, kind=Kind.ADJUST, quantity=quantity)
+
+
+# ---------------------------------------------------------------------------
+# Cart holds
+# ---------------------------------------------------------------------------
+def cart_hold(cart_id, product_id):
+    return active_holds().filter(cart_id=cart_id, product_id=product_id).order_by("-pk").first()
+
+
+def hold_for_cart(cart_id, product_id, quantity) -> StockMovement:
+    """Make the cart's hold on a product exactly ``quantity`` units, with a fresh expiry."""
+    with transaction.atomic():
+        previous = cart_hold(cart_id, product_id)
+        if previous is not None:
+            release(previous)
+        return reserve(product_id, quantity, cart_id=cart_id)
+
+
+def release_cart_holds(cart_id, product_ids=None) -> int:
+    holds = active_holds().filter(cart_id=cart_id)
+    if product_ids is not None:
+        holds = holds.filter(product_id__in=product_ids)
+    released = 0
+    for hold in holds:
+        release(hold)
+        released += 1
+    return released
+
+
+def commit_cart_line(cart_id, product_id, quantity, order) -> StockMovement:
+    """Sell one checkout line, using the cart's hold when it still covers it."""
+    with transaction.atomic():
+        hold = cart_hold(cart_id, product_id)
+        if hold is None or hold.quantity != quantity:
+            if hold is not None:
+                release(hold)
+            hold = reserve(product_id, quantity, cart_id=cart_id)
+        return commit(hold, order)
+
+
+def release_expired(now=None) -> int:
+    """Record a RELEASE for every expired, unsettled hold. Returns the count."""
+    now = now or timezone.now()
+    expired = StockMovement.objects.filter(kind=Kind.RESERVE, expires_at__lte=now, settlements__isnull=True)
+    count = 0
+    for hold in expired.iterator():
+        release(hold)
+        count += 1
+    return count
+
+
+# ---------------------------------------------------------------------------
+# Compaction
+# ---------------------------------------------------------------------------
+def compact_stock(product_ids=None) -> int:
+    """Fold uncompacted ledger rows into ``Inventory.quantity``. Returns products changed.
+
+    Rows are picked by their ``compacted`` flag, not by a pk watermark, so a
+    movement whose transaction commits late (with a lower pk than rows that
+    were already folded) is still folded by the next run.
+    """
+    from .facets import mark_product_dirty
+
+    pending = StockMovement.objects.filter(compacted=False)
+    if product_ids is not None:
+        pending = pending.filter(product_id__in=product_ids)
+
+    changed = 0
+    for product_id in pending.values_list("product_id", flat=True).order_by("product_id").distinct():
+        with transaction.atomic():
+            # Serializes runs for the product: a concurrent run waits here and
+            # then finds the rows already flagged.
+            inventory_id = (
+                Inventory.objects.select_for_update()
+                .filter(product_id=product_id)
+                .values_list("pk", flat=True)
+                .first()
+            )
+            if inventory_id is None:
+                continue
+            rows = list(
+                StockMovement.objects.filter(product_id=product_id, compacted=False)
+                .annotate(delta=ON_HAND_DELTA)
+                .values_list("pk", "delta")
+            )
+            if not rows:
+                continue
+            delta = sum(row_delta for _, row_delta in rows)
+            StockMovement.objects.filter(pk__in=[pk for pk, _ in rows]).update(compacted=True)
+            Inventory.objects.filter(pk=inventory_id).update(
+                quantity=F("quantity") + delta,
+                updated_at=timezone.now(),
+            )
+            if delta:
+                transaction.on_commit(partial(mark_product_dirty, product_id))
+        changed += 1
+    return changed
+
+
+def schedule_compaction(product_ids) -> None:
+    """Compact the products' snapshots once the current transaction commits."""
+    product_ids = sorted(set(product_ids))
+    transaction.on_commit(partial(compact_stock, product_ids))
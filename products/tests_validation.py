@@ -19,14 +19,21 @@ or simply:
     python manage.py test
 """
 
+from datetime import timedelta
 from decimal import Decimal
+from unittest import mock
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
 from bookmarks.models import Bookmark
-from products.models import Category, Inventory, Product
+from products import stock
+from products.facets import get_facet_index, invalidate_facet_index, mark_product_dirty
+from products.models import Category, Inventory, Product, Review, StockMovement
 
 User = get_user_model()
 
@@ -256,3 +263,365 @@ class PersonalPageValidationTests(ValidationBaseTestCase):
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "merchant@example.com")
         self.assertNotContains(response, "shopper@example.com")
+
+
+# ===========================================================================
+# 4. Product search — ranked full-text lookup with highlighting
+# ===========================================================================
+class ProductSearchTests(ValidationBaseTestCase):
+    """Requirement: shoppers can search the catalog by name and description."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.gadget = Product.objects.create(
+            merchant=cls.merchant,
+            category=cls.category,
+            name="Gadget Stand",
+            description="Holds any widget upright.",
+            price=Decimal("9.99"),
+        )
+
+    def search(self, query):
+        response = self.client.get(reverse("products:product_list"), {"q": query})
+        self.assertEqual(response.status_code, 200)
+        return response.context["products"]
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.assertEqual(self.search("widget"), [self.product, self.gadget])
+
+    def test_prefix_query_matches_whole_words(self):
+        self.assertEqual(self.search("gadg"), [self.gadget])
+
+    def test_matches_are_highlighted_and_escaped(self):
+        Product.objects.filter(pk=self.gadget.pk).update(description="<b>bold</b> gadget")
+        self.gadget.refresh_from_db()
+        self.gadget.save()
+
+        result = self.search("gadget")[0]
+        self.assertEqual(result.search_name, "<mark>Gadget</mark> Stand")
+        self.assertIn("&lt;b&gt;bold&lt;/b&gt; <mark>gadget</mark>", result.search_snippet)
+
+    def test_index_follows_renames_and_deletes(self):
+        self.gadget.name = "Phone Holder"
+        self.gadget.save()
+        self.assertEqual(self.search("gadget"), [])
+        self.assertEqual(self.search("phone"), [self.gadget])
+
+        self.gadget.delete()
+        self.assertEqual(self.search("phone"), [])
+
+    def test_search_operators_in_input_are_literal(self):
+        self.assertEqual(self.search('widget" OR "stand'), [])
+
+    def test_fallback_without_full_text_index(self):
+        with mock.patch("products.search.search_index_available", return_value=False):
+            results = self.search("widg")
+
+        highlighted = {product: product.search_name for product in results}
+        self.assertEqual(highlighted[self.product], "Super <mark>Widget</mark>")
+        self.assertEqual(highlighted[self.gadget], "Gadget Stand")
+
+
+# ===========================================================================
+# 5. Listing pagination — keyset cursors for the shop and category pages
+# ===========================================================================
+@override_settings(PRODUCT_PAGE_SIZE=2)
+class KeysetPaginationTests(ValidationBaseTestCase):
+    """Requirement: large catalogs are browsed page by page."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for number in range(4):
+            Product.objects.create(
+                merchant=cls.merchant,
+                category=cls.category,
+                name=f"Widget {number}",
+                description="Numbered widget.",
+                price=Decimal("5.00"),
+            )
+        cls.expected = list(Product.objects.order_by("-created_at", "-id"))
+
+    def test_pages_walk_the_catalog_without_offset(self):
+        seen = []
+        url = reverse("products:product_list")
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                response = self.client.get(url)
+                seen.extend(response.context["products"])
+                url = response.context["next_url"]
+
+        self.assertEqual(seen, self.expected)
+        self.assertFalse(any("OFFSET" in query["sql"] for query in queries.captured_queries))
+
+    def test_category_page_and_json_share_cursors(self):
+        response = self.client.get(reverse("products:category_detail", args=[self.category.slug]))
+        cursor = response.context["page"].next_cursor
+
+        data = self.client.get(
+            reverse("products:api_category_products", args=[self.category.slug]), {"after": cursor}
+        ).json()
+        self.assertEqual([item["id"] for item in data["products"]], [p.pk for p in self.expected[2:4]])
+        self.assertIn("after=", data["next"])
+
+    def test_malformed_cursor_shows_first_page(self):
+        response = self.client.get(reverse("products:product_list"), {"after": "not-a-cursor"})
+
+        self.assertEqual(response.context["products"], self.expected[:2])
+
+
+# ===========================================================================
+# 6. Ratings — denormalized review totals on Product
+# ===========================================================================
+class RatingTotalsTests(ValidationBaseTestCase):
+    """Requirement: product ratings reflect every review without aggregating."""
+
+    def reload(self):
+        return Product.objects.get(pk=self.product.pk)
+
+    def test_totals_follow_review_create_edit_and_delete(self):
+        review = Review.objects.create(product=self.product, user=self.shopper, rating=4, comment="Good")
+        Review.objects.create(product=self.product, user=self.merchant, rating=5, comment="Great")
+        product = self.reload()
+        self.assertEqual((product.rating_sum, product.review_count, product.average_rating), (9, 2, 4.5))
+
+        review = Review.objects.get(pk=review.pk)
+        review.rating = 1
+        review.save()
+        self.assertEqual(self.reload().average_rating, 3.0)
+
+        Review.objects.filter(user=self.merchant).delete()
+        review.delete()
+        product = self.reload()
+        self.assertEqual((product.rating_sum, product.review_count, product.average_rating), (0, 0, None))
+
+    def test_rating_reads_do_not_query(self):
+        Review.objects.create(product=self.product, user=self.shopper, rating=3, comment="Fine")
+        product = self.reload()
+
+        with self.assertNumQueries(0):
+            self.assertEqual((product.average_rating, product.review_count), (3.0, 1))
+
+
+# ===========================================================================
+# 7. Faceted navigation — bitmap facet counts on the shop page
+# ===========================================================================
+class FacetNavigationTests(ValidationBaseTestCase):
+    """Requirement: shoppers can narrow the shop by facets with live counts."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other_category = Category.objects.create(name="Gadgets")
+        cls.gadget = Product.objects.create(
+            merchant=cls.merchant,
+            category=cls.other_category,
+            name="Gadget",
+            description="Out of stock gadget.",
+            price=Decimal("60.00"),
+        )
+        Review.objects.create(product=cls.gadget, user=cls.shopper, rating=5, comment="Great")
+
+    def setUp(self):
+        invalidate_facet_index()
+
+    def facet_counts(self, **params):
+        response = self.client.get(reverse("products:product_list"), params)
+        counts = {
+            facet["key"]: {item["value"]: item["count"] for item in facet["values"]}
+            for facet in response.context["facets"]
+        }
+        return response, counts
+
+    def test_counts_cover_every_facet(self):
+        _, counts = self.facet_counts()
+
+        self.assertEqual(counts["category"], {"widgets": 1, "gadgets": 1})
+        self.assertEqual(counts["price"], {"0-25": 1, "50-100": 1})
+        self.assertEqual(counts["in_stock"], {"1": 1})
+        self.assertEqual(counts["rating"], {"4": 1, "3": 1, "2": 1, "1": 1})
+        self.assertEqual(counts["merchant"], {str(self.merchant.pk): 2})
+
+    def test_selection_filters_listing_and_other_facets(self):
+        response, counts = self.facet_counts(rating="4")
+
+        self.assertEqual(response.context["products"], [self.gadget])
+        self.assertEqual(counts["category"], {"gadgets": 1})
+        # A facet's own counts ignore its selection so alternatives stay visible.
+        self.assertEqual(counts["rating"], {"4": 1, "3": 1, "2": 1, "1": 1})
+
+    def test_inventory_change_patches_the_index_without_group_by(self):
+        self.facet_counts()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.inventory.quantity = 0
+            self.inventory.save()
+
+        with CaptureQueriesContext(connection) as queries:
+            _, counts = self.facet_counts()
+
+        self.assertNotIn("in_stock", counts)
+        self.assertFalse(any("GROUP BY" in query["sql"] for query in queries.captured_queries))
+
+    def test_change_is_marked_dirty_only_once_committed(self):
+        index = get_facet_index()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.inventory.quantity = 0
+            self.inventory.save()
+
+        self.assertIs(get_facet_index(), index)
+        for callback in callbacks:
+            callback()
+        self.assertNotIn("1", get_facet_index().counts({})["in_stock"])
+
+    def test_patch_swaps_in_a_copy_and_reuses_removed_bits(self):
+        index = get_facet_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=self.gadget.pk).update(is_active=False)
+            mark_product_dirty(self.gadget.pk)
+
+        patched = get_facet_index()
+        self.assertIsNot(patched, index)
+        self.assertEqual(index.counts({})["category"], {"widgets": 1, "gadgets": 1})
+        self.assertEqual(patched.counts({})["category"], {"widgets": 1})
+        self.assertNotIn(self.gadget.pk, patched.positions)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            replacement = Product.objects.create(
+                merchant=self.merchant,
+                category=self.other_category,
+                name="Replacement",
+                description="Takes the freed bit.",
+                price=Decimal("70.00"),
+            )
+        latest = get_facet_index()
+        self.assertEqual(latest.positions[replacement.pk], index.positions[self.gadget.pk])
+        self.assertEqual(latest.live.bit_length(), index.live.bit_length())
+
+
+# ===========================================================================
+# 8. Product cards — versioned fragment cache with per-user overlay
+# ===========================================================================
+class ProductCardCacheTests(ValidationBaseTestCase):
+    """Requirement: product cards are rendered once per product version."""
+
+    def test_card_is_reused_until_the_product_changes(self):
+        url = reverse("products:category_detail", args=[self.category.slug])
+        self.client.get(url)
+
+        # A write that bypasses save() leaves the cached card in place ...
+        Product.objects.filter(pk=self.product.pk).update(name="Renamed Widget")
+        self.assertNotContains(self.client.get(url), "Renamed Widget")
+
+        # ... while a save bumps updated_at and therefore the card version.
+        product = Product.objects.get(pk=self.product.pk)
+        product.save()
+        self.assertContains(self.client.get(url), "Renamed Widget")
+
+    def test_stock_change_invalidates_the_card(self):
+        url = reverse("products:category_detail", args=[self.category.slug])
+        self.assertNotContains(self.client.get(url), "Out of stock")
+
+        self.inventory.decrease(10)
+        self.assertContains(self.client.get(url), "Out of stock")
+
+    def test_category_rename_invalidates_the_row_card(self):
+        Product.objects.filter(pk=self.product.pk).update(units_sold=1)
+        url = reverse("products:best_sellers")
+        self.client.get(url)
+
+        self.category.name = "Renamed Category"
+        self.category.save()
+        self.assertContains(self.client.get(url), "Renamed Category")
+
+    def test_bookmark_overlay_is_rendered_per_user(self):
+        Bookmark.objects.create(user=self.shopper, product=self.product)
+        url = reverse("products:product_list")
+        self.client.get(url)
+
+        self.client.force_login(self.shopper)
+        self.assertContains(self.client.get(url), "bi-bookmark-fill")
+        self.client.force_login(self.merchant)
+        self.assertNotContains(self.client.get(url), "bi-bookmark-fill")
+
+
+# ===========================================================================
+# 9. Stock ledger — append-only movements, expiring holds, compaction
+# ===========================================================================
+class StockLedgerTests(ValidationBaseTestCase):
+    """Requirement: every stock change is an auditable ledger row."""
+
+    def test_holds_reduce_availability_until_they_expire(self):
+        hold = stock.reserve(self.product.pk, 4)
+        self.assertEqual(stock.available(self.product.pk), 6)
+        with self.assertRaises(stock.InsufficientStock):
+            stock.reserve(self.product.pk, 7)
+
+        StockMovement.objects.filter(pk=hold.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(stock.available(self.product.pk), 10)
+        self.assertEqual(stock.release_expired(), 1)
+        self.assertEqual(hold.settlements.get().kind, StockMovement.Kind.RELEASE)
+
+    def test_sales_are_appended_and_compacted_into_the_snapshot(self):
+        stock.commit(stock.reserve(self.product.pk, 3))
+        stock.restock(self.product.pk, 5)
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.quantity, 10)
+        self.assertEqual(stock.balance(self.product.pk), (12, 0))
+
+        self.assertEqual(stock.compact_stock(), 1)
+        self.assertEqual(stock.compact_stock(), 0)
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.quantity, 12)
+        self.assertFalse(StockMovement.objects.filter(compacted=False).exists())
+        self.assertEqual(stock.balance(self.product.pk), (12, 0))
+
+    def test_late_commit_below_folded_rows_is_still_folded(self):
+        early = stock.restock(self.product.pk, 5)
+        stock.restock(self.product.pk, 2)
+        # As if the first row's transaction committed after a run folded the second.
+        StockMovement.objects.exclude(pk=early.pk).update(compacted=True)
+        Inventory.objects.filter(pk=self.inventory.pk).update(quantity=12)
+
+        self.assertEqual(stock.compact_stock(), 1)
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.quantity, 17)
+        self.assertEqual(stock.balance(self.product.pk), (17, 0))
+
+    def test_changes_are_compacted_once_they_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            stock.take(self.product.pk, 3)
+            stock.schedule_compaction([self.product.pk])
+            self.inventory.refresh_from_db()
+            self.assertEqual(self.inventory.quantity, 10)
+
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.quantity, 7)
+
+    def test_adjustments_cannot_remove_held_units(self):
+        stock.reserve(self.product.pk, 4)
+        stock.adjust(self.product.pk, -5)
+        self.assertEqual(stock.balance(self.product.pk), (5, 4))
+        with self.assertRaises(stock.InsufficientStock):
+            stock.adjust(self.product.pk, -2)
+
+        stock.adjust(self.product.pk, 3)
+        stock.compact_stock()
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.quantity, 8)
+
+    def test_admin_changes_stock_through_the_ledger(self):
+        admin_user = User.objects.create_superuser(email="admin@example.com", password="AdminPass123!")
+        self.client.force_login(admin_user)
+        url = reverse("admin:products_inventory_change", args=[self.inventory.pk])
+        data = {"product": self.product.pk, "low_stock_threshold": 5}
+
+        response = self.client.post(url, {**data, "adjustment": -11})
+        self.assertContains(response, "Only 10 unit(s) can be removed.")
+
+        response = self.client.post(url, {**data, "adjustment": -4, "quantity": 99})
+        self.assertEqual(response.status_code, 302)
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.quantity, 6)
+        self.assertEqual(list(StockMovement.objects.values_list("kind", "quantity")), [("ADJUST", -4)])
+        self.assertEqual(stock.available(self.product.pk), 6)
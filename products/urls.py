@@ -12,6 +12,9 @@ urlpatterns = [
     path("product/<slug:slug>/review/", views.submit_review, name="submit_review"),
     path("product/<slug:slug>/review/edit/", views.edit_review, name="edit_review"),
     path("category/<slug:slug>/", views.category_detail, name="category_detail"),
+    # Keyset-paginated JSON pages (infinite scroll)
+    path("api/shop/", views.api_product_list, name="api_product_list"),
+    path("api/category/<slug:slug>/", views.api_category_products, name="api_category_products"),
     # Inventory management (merchant only)
     path("inventory/", views.inventory_list, name="inventory_list"),
     path("inventory/<int:pk>/update/", views.inventory_update, name="inventory_update"),
@@ -1,14 +1,17 @@
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db.models import Avg, Count, IntegerField, OuterRef, Q, Subquery, Sum
-from django.db.models.functions import Coalesce
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import require_GET
 
 from accounts.decorators import merchant_required
 from bookmarks.models import Bookmark
 
 from .forms import InventoryUpdateForm, ReviewForm
 from .models import Category, Inventory, Product, Review
+from .facets import facet_groups, filter_queryset, get_facet_index, parse_selection
+from .pagination import paginate_products
+from .search import matching_ids, search_products
 from orders.models import OrderItem, Order
 
 
@@ -39,16 +42,22 @@ def home(request):
 def product_list(request):
     products = Product.objects.filter(is_active=True).select_related("inventory")
     query = request.GET.get("q")
-    category_slug = request.GET.get("category")
+    selected = parse_selection(request.GET)
+    products = filter_queryset(products, selected)
 
+    facet_index = get_facet_index()
+    page = None
     if query:
-        products = products.filter(
-            Q(name__icontains=query) | Q(description__icontains=query)
-        )
-    if category_slug:
-        products = products.filter(category__slug=category_slug)
+        # Ranked full-text lookup; results carry highlighted name/snippet.
+        # The ranking is capped, so search results are not paginated.
+        # Facet counts are limited to the matches.
+        products = search_products(products, query)
+        counts = facet_index.counts(selected, within=facet_index.bitmap_for(matching_ids(query)))
+    else:
+        page = paginate_products(products, request.GET.get("after"))
+        products = page.items
+        counts = facet_index.counts(selected)
 
-    categories = Category.objects.all()
     bookmarked_ids = set()
     if request.user.is_authenticated:
         bookmarked_ids = set(
@@ -57,7 +66,65 @@ def product_list(request):
     return render(
         request,
         "products/product_list.html",
-        {"products": products, "categories": categories, "query": query, "bookmarked_ids": bookmarked_ids},
+        {
+            "products": products,
+            "facets": _facet_links(request, facet_groups(facet_index, selected, counts)),
+            "query": query,
+            "bookmarked_ids": bookmarked_ids,
+            "page": page,
+            "next_url": _next_page_url(request, page),
+            "first_url": _first_page_url(request),
+        },
+    )
+
+
+def _first_page_url(request):
+    params = request.GET.copy()
+    params.pop("after", None)
+    return f"{request.path}?{params.urlencode()}" if params else request.path
+
+
+def _facet_links(request, groups):
+    """Add to every facet value the URL that toggles it (back on page one)."""
+    for group in groups:
+        for item in group["values"]:
+            params = request.GET.copy()
+            params.pop("after", None)
+            values = [value for value in params.getlist(group["param"]) if value != item["value"]]
+            if not item["selected"]:
+                values.append(item["value"])
+            params.setlist(group["param"], values)
+            item["url"] = f"{request.path}?{params.urlencode()}"
+    return groups
+
+
+def _next_page_url(request, page):
+    """Current URL with the ``after`` cursor advanced to the next page."""
+    if page is None or not page.has_next:
+        return None
+    params = request.GET.copy()
+    params["after"] = page.next_cursor
+    return f"{request.path}?{params.urlencode()}"
+
+
+def _page_response(request, page):
+    return JsonResponse(
+        {
+            "products": [
+                {
+                    "id": product.pk,
+                    "name": product.name,
+                    "slug": product.slug,
+                    "price": str(product.effective_price),
+                    "image": product.image.url if product.image else None,
+                    "in_stock": product.in_stock,
+                    "url": product.get_absolute_url(),
+                }
+                for product in page.items
+            ],
+            "next_cursor": page.next_cursor,
+            "next": _next_page_url(request, page),
+        }
     )
 
 
@@ -251,38 +318,13 @@ def edit_review(request, slug):
 def best_sellers(request):
     """Top products ranked by confirmed sales volume and rating.
 
-    Sales volume is summed via a Subquery to avoid the join-multiplication
-    bug that appears when Sum and Avg are annotated across two different
-    relations in the same query.
+    Reads the denormalized ``units_sold`` and rating columns, so the page is
+    an indexed ``ORDER BY … LIMIT 20`` with no aggregation.
     """
-    excluded_statuses = [
-        Order.Status.PENDING,
-        Order.Status.CANCELLED,
-        Order.Status.REFUNDED,
-    ]
-
-    sold_subquery = (
-        OrderItem.objects
-        .filter(product=OuterRef("pk"))
-        .exclude(order__status__in=excluded_statuses)
-        .values("product")
-        .annotate(total=Sum("quantity"))
-        .values("total")
-    )
-
     top_sellers = (
-        Product.objects.filter(is_active=True)
+        Product.objects.filter(is_active=True, units_sold__gt=0)
         .select_related("inventory", "category", "merchant")
-        .annotate(
-            total_sold=Coalesce(
-                Subquery(sold_subquery, output_field=IntegerField()),
-                0,
-            ),
-            avg_rating_anno=Coalesce(Avg("reviews__rating"), 0.0),
-            review_count_anno=Count("reviews"),
-        )
-        .filter(total_sold__gt=0)
-        .order_by("-total_sold", "-avg_rating_anno", "-review_count_anno")[:20]
+        .order_by("-units_sold", "-rating_average", "-rating_count")[:20]
     )
 
     bookmarked_ids = set()
@@ -304,7 +346,34 @@ def best_sellers(request):
 def category_detail(request, slug):
     category = get_object_or_404(Category, slug=slug)
     products = category.products.filter(is_active=True).select_related("inventory")
-    return render(request, "products/category_detail.html", {"category": category, "products": products})
+    page = paginate_products(products, request.GET.get("after"))
+    return render(
+        request,
+        "products/category_detail.html",
+        {
+            "category": category,
+            "products": page.items,
+            "page": page,
+            "next_url": _next_page_url(request, page),
+        },
+    )
+
+
+# ---------------------------------------------------------------------------
+# JSON pages for infinite scroll — same cursors as the HTML pages
+# ---------------------------------------------------------------------------
+@require_GET
+def api_product_list(request):
+    products = Product.objects.filter(is_active=True).select_related("inventory")
+    products = filter_queryset(products, parse_selection(request.GET))
+    return _page_response(request, paginate_products(products, request.GET.get("after")))
+
+
+@require_GET
+def api_category_products(request, slug):
+    category = get_object_or_404(Category, slug=slug)
+    products = category.products.filter(is_active=True).select_related("inventory")
+    return _page_response(request, paginate_products(products, request.GET.get("after")))
 
 
 # ---------------------------------------------------------------------------
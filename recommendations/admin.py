@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import ProductViewEvent
+from .models import PopularityScore, ProductSimilarity, ProductViewEvent, UserPreferenceProfile
 
 
 @admin.register(ProductViewEvent)
@@ -9,3 +9,24 @@ class ProductViewEventAdmin(admin.ModelAdmin):
     list_filter = ("last_viewed_at",)
     search_fields = ("user__email", "product__name")
     readonly_fields = ("last_viewed_at",)
+
+
+@admin.register(ProductSimilarity)
+class ProductSimilarityAdmin(admin.ModelAdmin):
+    list_display = ("product", "similar_product", "score", "reason", "updated_at")
+    search_fields = ("product__name", "similar_product__name")
+    raw_id_fields = ("product", "similar_product")
+
+
+@admin.register(UserPreferenceProfile)
+class UserPreferenceProfileAdmin(admin.ModelAdmin):
+    list_display = ("user", "updated_at")
+    search_fields = ("user__email",)
+    readonly_fields = ("updated_at",)
+
+
+@admin.register(PopularityScore)
+class PopularityScoreAdmin(admin.ModelAdmin):
+    list_display = ("product", "score", "units_sold", "average_rating", "refreshed_at")
+    search_fields = ("product__name",)
+    readonly_fields = ("refreshed_at",)
@@ -1,23 +1,34 @@
 from __future__ import annotations
 
-import math
+import heapq
 import re
 from collections import Counter
 from dataclasses import dataclass
 from decimal import Decimal
+from typing import Iterable, Iterator
 
-from django.db.models import Avg, Sum
-from django.utils import timezone
+from django.core.exceptions import ObjectDoesNotExist
 
 from bookmarks.models import Bookmark
 from cart.models import CartItem
 from orders.models import OrderItem
 from products.models import Product
 
+from .engine import CandidateSnapshot, popularity_scores, profile_scores
 from .models import ProductViewEvent
 
 TOKEN_RE = re.compile(r"[a-zA-Z0-9]+")
 
+POPULAR_REASON = "Trending recommendation (sales, rating, and recency)"
+
+# Points a single interaction adds to the user's preference profile.
+INTERACTION_WEIGHTS = {
+    "view": 1,
+    "favorite": 3,
+    "cart": 4,
+    "purchase": 5,
+}
+
 
 @dataclass
 class ScoredProduct:
@@ -66,6 +77,18 @@ def _tokenize(text: str) -> set[str]:
     return {tok.lower() for tok in TOKEN_RE.findall(text) if len(tok) > 2}
 
 
+def _description_tokens(product: Product) -> set[str]:
+    # Prefer the token set persisted on save (``ProductSignature``). Only an
+    # already-loaded description is tokenized; a deferred one is never fetched.
+    try:
+        return set(product.signature.tokens)
+    except ObjectDoesNotExist:
+        pass
+    if "description" in product.__dict__:
+        return _tokenize(product.description)
+    return set()
+
+
 def _price_similarity(current_price: float, candidate_price: float) -> float:
     max_price = max(current_price, candidate_price, 1.0)
     diff_ratio = abs(current_price - candidate_price) / max_price
@@ -81,87 +104,116 @@ def _jaccard(a: set[str], b: set[str]) -> float:
     return len(a & b) / len(union)
 
 
-def score_popular_products(candidates) -> list[ScoredProduct]:
-    # Popularity blends sales, rating, and recency with transparent weights.
-    now = timezone.now()
-    products = list(
-        candidates.annotate(
-            sold_qty=Sum("orderitem__quantity"),
-            avg_rating=Avg("reviews__rating"),
-        )
-    )
-
-    max_sales = max((p.sold_qty or 0) for p in products) if products else 0
-
-    ranked: list[ScoredProduct] = []
-    for product in products:
-        sales_score = (product.sold_qty or 0) / max(max_sales, 1)
-        rating_score = (product.avg_rating or 0.0) / 5.0
-
-        age_days = max((now - product.created_at).days, 0)
-        recency_score = math.exp(-age_days / 45)
+def top_k(items: Iterable[ScoredProduct], k: int | None) -> list[ScoredProduct]:
+    """Return the ``k`` highest-scoring items, best first.
 
-        score = sales_score * 0.5 + rating_score * 0.3 + recency_score * 0.2
-        ranked.append(
-            ScoredProduct(
-                product=product,
-                score=score,
-                reason="Trending recommendation (sales, rating, and recency)",
-            )
-        )
+    Streams ``items`` through a bounded heap: O(n log k) time and O(k) memory.
+    Ties keep their input order, exactly like a stable descending sort.
+    ``k=None`` keeps every item.
+    """
+    if k is None:
+        return sorted(items, key=lambda item: item.score, reverse=True)
+    return heapq.nlargest(k, items, key=lambda item: item.score)
 
-    ranked.sort(key=lambda item: item.score, reverse=True)
-    return ranked
 
+def _iterate(candidates):
+    # Querysets are streamed so that only the heap, not the catalog, is kept.
+    return candidates.iterator() if hasattr(candidates, "iterator") else iter(candidates)
 
-def score_similar_products(current_product: Product, candidates) -> list[ScoredProduct]:
-    current_category = getattr(current_product, "category_id", None)
-    current_brand = _extract_brand(current_product)
-    current_tags = _extract_tags(current_product)
-    current_desc = _tokenize(current_product.description)
-    current_price = _safe_decimal_to_float(current_product.effective_price)
 
-    ranked: list[ScoredProduct] = []
+def score_popular_products(
+    k: int | None = None,
+    exclude_ids: Iterable[int] | None = None,
+    snapshot: CandidateSnapshot | None = None,
+) -> list[ScoredProduct]:
+    # Popularity blends sales, rating, and recency with transparent weights.
+    snapshot = snapshot or CandidateSnapshot()
+    mask = snapshot.mask_without(exclude_ids)
+    scores = popularity_scores(snapshot.matrix, mask)
+    return [
+        ScoredProduct(
+            product=product,
+            score=score,
+            reason=POPULAR_REASON,
+        )
+        for product, score in snapshot.ranked(scores, mask, k)
+    ]
 
-    for product in candidates:
-        category_match = 1.0 if current_category and product.category_id == current_category else 0.0
 
-        candidate_brand = _extract_brand(product)
-        brand_match = 1.0 if current_brand and candidate_brand and current_brand == candidate_brand else 0.0
+def score_similar_products(current_product: Product, candidates, k: int | None = None) -> list[ScoredProduct]:
+    return score_similar_to_anchors([current_product], candidates, k=k)
 
-        candidate_tags = _extract_tags(product)
-        tag_similarity = _jaccard(current_tags, candidate_tags)
 
-        candidate_desc = _tokenize(product.description)
-        desc_similarity = _jaccard(current_desc, candidate_desc)
+def score_similar_to_anchors(anchors: Iterable[Product], candidates, k: int | None = None) -> list[ScoredProduct]:
+    return top_k(iter_similar_to_anchors(anchors, candidates), k)
 
-        price_similarity = _price_similarity(
-            current_price,
-            _safe_decimal_to_float(product.effective_price),
-        )
 
-        # If brand/tags are unavailable, description fills part of the signal.
-        score = (
-            category_match * 0.4
-            + brand_match * 0.2
-            + tag_similarity * 0.2
-            + price_similarity * 0.1
-            + desc_similarity * 0.1
-        )
+@dataclass
+class _AnchorFeatures:
+    category_id: int | None
+    brand: str
+    tags: set[str]
+    desc: set[str]
+    price: float
+
+
+def _anchor_features(product: Product) -> _AnchorFeatures:
+    return _AnchorFeatures(
+        category_id=getattr(product, "category_id", None),
+        brand=_extract_brand(product),
+        tags=_extract_tags(product),
+        desc=_description_tokens(product),
+        price=_safe_decimal_to_float(product.effective_price),
+    )
 
-        if category_match:
-            reason = "Same category as the current product"
-        elif brand_match:
-            reason = "Similar brand to the current product"
-        elif tag_similarity > 0:
-            reason = "Similar tags to the current product"
-        else:
-            reason = "Similar attributes to the current product"
 
-        ranked.append(ScoredProduct(product=product, score=score, reason=reason))
+def _pair_score(anchor: _AnchorFeatures, product: Product, candidate: _AnchorFeatures) -> tuple[float, str]:
+    category_match = 1.0 if anchor.category_id and product.category_id == anchor.category_id else 0.0
+    brand_match = 1.0 if anchor.brand and candidate.brand and anchor.brand == candidate.brand else 0.0
+    tag_similarity = _jaccard(anchor.tags, candidate.tags)
+    desc_similarity = _jaccard(anchor.desc, candidate.desc)
+    price_similarity = _price_similarity(anchor.price, candidate.price)
+
+    # If brand/tags are unavailable, description fills part of the signal.
+    score = (
+        category_match * 0.4
+        + brand_match * 0.2
+        + tag_similarity * 0.2
+        + price_similarity * 0.1
+        + desc_similarity * 0.1
+    )
 
-    ranked.sort(key=lambda item: item.score, reverse=True)
-    return ranked
+    if category_match:
+        reason = "Same category as the current product"
+    elif brand_match:
+        reason = "Similar brand to the current product"
+    elif tag_similarity > 0:
+        reason = "Similar tags to the current product"
+    else:
+        reason = "Similar attributes to the current product"
+    return score, reason
+
+
+def iter_similar_to_anchors(anchors: Iterable[Product], candidates) -> Iterator[ScoredProduct]:
+    """Score every candidate against all anchors in a single pass.
+
+    Each candidate is fetched and tokenized once regardless of how many
+    anchors there are; its score is the sum over anchors and its reason comes
+    from the first anchor, as when anchors were scored one at a time.
+    """
+    anchor_features = [_anchor_features(anchor) for anchor in anchors]
+    if not anchor_features:
+        return
+
+    for product in _iterate(candidates):
+        candidate = _anchor_features(product)
+        total = 0.0
+        reason = None
+        for anchor in anchor_features:
+            score, anchor_reason = _pair_score(anchor, product, candidate)
+            total += score
+            reason = reason or anchor_reason
+        yield ScoredProduct(product=product, score=total, reason=reason)
 
 
 def build_user_preference_profile(user) -> dict[str, Counter]:
@@ -169,12 +221,7 @@ def build_user_preference_profile(user) -> dict[str, Counter]:
     brand_pref: Counter = Counter()
     tag_pref: Counter = Counter()
 
-    weight = {
-        "view": 1,
-        "favorite": 3,
-        "cart": 4,
-        "purchase": 5,
-    }
+    weight = INTERACTION_WEIGHTS
 
     view_events = ProductViewEvent.objects.filter(user=user).select_related("product__category")
     for event in view_events:
@@ -231,38 +278,27 @@ def build_user_preference_profile(user) -> dict[str, Counter]:
     }
 
 
-def score_for_user_profile(user, candidates) -> list[ScoredProduct]:
-    profile = build_user_preference_profile(user)
+def score_for_user_profile(
+    user,
+    k: int | None = None,
+    exclude_ids: Iterable[int] | None = None,
+    profile: dict[str, Counter] | None = None,
+    snapshot: CandidateSnapshot | None = None,
+) -> list[ScoredProduct]:
+    if profile is None:
+        profile = build_user_preference_profile(user)
 
-    cat_total = sum(profile["category"].values())
-    brand_total = sum(profile["brand"].values())
-    tag_total = sum(profile["tag"].values())
-
-    if cat_total + brand_total + tag_total == 0:
+    if not profile["category"] and not profile["brand"] and not profile["tag"]:
         return []
 
-    ranked: list[ScoredProduct] = []
-    for product in candidates:
-        cat_score = 0.0
-        if product.category_id and cat_total > 0:
-            cat_score = profile["category"][product.category_id] / cat_total
-
-        brand_value = _extract_brand(product)
-        brand_score = profile["brand"][brand_value] / brand_total if brand_value and brand_total > 0 else 0.0
-
-        product_tags = _extract_tags(product)
-        tag_score = 0.0
-        if product_tags and tag_total > 0:
-            tag_score = sum(profile["tag"][tag] for tag in product_tags) / tag_total
-
-        score = cat_score * 0.5 + tag_score * 0.3 + brand_score * 0.2
-        ranked.append(
-            ScoredProduct(
-                product=product,
-                score=score,
-                reason="Based on your recent views, bookmarks, cart, and purchases",
-            )
+    snapshot = snapshot or CandidateSnapshot()
+    scores = profile_scores(snapshot.matrix, profile)
+    mask = snapshot.mask_without(exclude_ids) & (scores > 0)
+    return [
+        ScoredProduct(
+            product=product,
+            score=score,
+            reason="Based on your recent views, bookmarks, cart, and purchases",
         )
-
-    ranked.sort(key=lambda item: item.score, reverse=True)
-    return ranked
+        for product, score in snapshot.ranked(scores, mask, k)
+    ]
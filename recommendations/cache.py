@@ -0,0 +1,100 @@
+"""In-process cache for computed recommendation payloads.
+
+Recommendation inputs change far less often than pages are viewed, so the
+service caches each payload under ``(surface, user id, fingerprint, limit)``
+with a TTL and LRU eviction. Signals clear the whole cache when catalog-wide
+inputs change (products, reviews, order items) and only the affected user's
+entries for personal inputs (bookmarks, cart items).
+
+The cache lives in process memory, so invalidation only reaches the process
+that handled the write. Fingerprints (product ``updated_at``, cart contents)
+keep the most visible surfaces correct everywhere; the TTL bounds the rest.
+
+Payloads are deep-copied on the way in and out, so callers cannot mutate a
+cached entry. Every invalidation bumps a generation counter; a payload whose
+computation started before the latest invalidation is returned to its caller
+but not stored.
+"""
+
+from __future__ import annotations
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+from django.conf import settings
+
+
+class RecommendationCache:
+    def __init__(self, max_entries: int | None = None, ttl: float | None = None):
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def max_entries(self) -> int:
+        if self._max_entries is not None:
+            return self._max_entries
+        return getattr(settings, "RECOMMENDATION_CACHE_MAX_ENTRIES", 1024)
+
+    @property
+    def ttl(self) -> float:
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, "RECOMMENDATION_CACHE_TTL", 60)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], list]) -> list:
+        """Return a copy of the cached payload for ``key``, computing it on a miss."""
+        if self.ttl <= 0:
+            return compute()
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry[1])
+            self.misses += 1
+            generation = self._generation
+
+        value = compute()
+        stored = copy.deepcopy(value)
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (now + self.ttl, stored)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            self._generation += 1
+            for key in [key for key in self._entries if key[1] == user_id]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+            }
+
+
+recommendation_cache = RecommendationCache()
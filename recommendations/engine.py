@@ -0,0 +1,212 @@
+"""Columnar scoring engine for catalog-wide recommendation scorers.
+
+Popularity and profile scoring only need a handful of numeric columns per
+product, so instead of materializing every ``Product`` as an ORM object we
+keep one cached ``FeatureMatrix`` of NumPy arrays and score the whole catalog
+with array operations. Only the top-K winners are loaded as model instances.
+
+The matrix is cached per process and rebuilt when the shared version token
+in the Django cache changes (bumped by signals on product, order item and
+review writes) or when it is older than ``RECOMMENDATION_FEATURE_TTL``.
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import Iterable
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from orders.models import OrderItem
+from products.models import Product
+
+VERSION_CACHE_KEY = "recommendations:feature-matrix-version"
+
+
+@dataclass(frozen=True)
+class FeatureMatrix:
+    ids: np.ndarray
+    category: np.ndarray  # category id, or -1 when uncategorized
+    price: np.ndarray  # effective price
+    sales: np.ndarray  # units ordered
+    rating: np.ndarray  # average review rating, 0 when unrated
+    created: np.ndarray  # creation time as a POSIX timestamp
+    version: str | None
+    built_at: float
+
+    def __len__(self):
+        return len(self.ids)
+
+    def mask_excluding(self, exclude_ids: Iterable[int] | None) -> np.ndarray:
+        mask = np.ones(len(self.ids), dtype=bool)
+        exclude = np.fromiter(set(exclude_ids or ()), dtype=np.int64)
+        if exclude.size:
+            mask &= ~np.isin(self.ids, exclude)
+        return mask
+
+    def age_days(self, now=None) -> np.ndarray:
+        now = (now or timezone.now()).timestamp()
+        return np.maximum(np.floor((now - self.created) / 86400.0), 0.0)
+
+
+_matrix: FeatureMatrix | None = None
+
+
+def _feature_ttl() -> float:
+    return getattr(settings, "RECOMMENDATION_FEATURE_TTL", 300)
+
+
+def build_feature_matrix(version: str | None = None) -> FeatureMatrix:
+    rows = list(
+        Product.objects.filter(is_active=True).values_list(
+            "pk", "category_id", "price", "discount_price", "created_at", "rating_average"
+        )
+    )
+    sales = dict(
+        OrderItem.objects.filter(product__is_active=True)
+        .values("product")
+        .annotate(total=Sum("quantity"))
+        .values_list("product", "total")
+    )
+
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    return FeatureMatrix(
+        ids=ids,
+        category=np.array([row[1] or -1 for row in rows], dtype=np.int64),
+        price=np.array([float(row[3] or row[2]) for row in rows], dtype=np.float64),
+        sales=np.array([sales.get(pk) or 0 for pk in ids.tolist()], dtype=np.float64),
+        rating=np.array([row[5] for row in rows], dtype=np.float64),
+        created=np.array([row[4].timestamp() for row in rows], dtype=np.float64),
+        version=version,
+        built_at=time.monotonic(),
+    )
+
+
+def get_feature_matrix() -> FeatureMatrix:
+    global _matrix
+    version = cache.get(VERSION_CACHE_KEY)
+    current = _matrix
+    if (
+        current is None
+        or current.version != version
+        or time.monotonic() - current.built_at > _feature_ttl()
+    ):
+        current = _matrix = build_feature_matrix(version)
+    return current
+
+
+def invalidate_feature_matrix() -> None:
+    cache.set(VERSION_CACHE_KEY, str(time.time_ns()), timeout=None)
+
+
+def top_k_indices(scores: np.ndarray, mask: np.ndarray, k: int | None) -> np.ndarray:
+    """Indices of the ``k`` best masked scores, best first.
+
+    ``argpartition`` selects the winners in O(n); only those are sorted.
+    Ties keep catalog order (newest first), matching a stable sort.
+    """
+    candidates = np.flatnonzero(mask)
+    if k is not None and k < candidates.size:
+        if k <= 0:
+            return candidates[:0]
+        winners = np.argpartition(-scores[candidates], k - 1)[:k]
+        candidates = candidates[winners]
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order]
+
+
+def popularity_scores(matrix: FeatureMatrix, mask: np.ndarray, now=None) -> np.ndarray:
+    """Blend sales, rating and recency with the same weights as before."""
+    max_sales = matrix.sales[mask].max() if mask.any() else 0.0
+    sales_score = matrix.sales / max(max_sales, 1.0)
+    rating_score = matrix.rating / 5.0
+    recency_score = np.exp(-matrix.age_days(now) / 45)
+    return sales_score * 0.5 + rating_score * 0.3 + recency_score * 0.2
+
+
+def category_preference_scores(matrix: FeatureMatrix, category_weights) -> np.ndarray:
+    total = sum(category_weights.values())
+    scores = np.zeros(len(matrix), dtype=np.float64)
+    if total <= 0:
+        return scores
+    for category_id, weight in category_weights.items():
+        scores[matrix.category == category_id] = weight / total
+    return scores
+
+
+def profile_scores(matrix: FeatureMatrix, profile) -> np.ndarray:
+    # Product has no brand or tag columns, so the brand (0.2) and tag (0.3)
+    # terms are always zero and only the category term is scored.
+    return category_preference_scores(matrix, profile["category"]) * 0.5
+
+
+class CandidateSnapshot:
+    """Request-scoped candidate set shared by every scorer on one page.
+
+    The cached feature matrix is only read when a scorer first needs it, so
+    creating a snapshot costs nothing. Scorers rank rows of the matrix and
+    only hand the winners to ``load_products``, which fetches the card columns
+    in one query and remembers the instances.
+    """
+
+    # Columns needed to render a recommendation card or API entry.
+    PRODUCT_FIELDS = ("id", "name", "slug", "price", "discount_price", "image", "category_id", "is_active")
+
+    def __init__(self, exclude_ids: Iterable[int] | None = None):
+        self.exclude_ids = set(exclude_ids or ())
+        self._products: dict[int, Product] = {}
+
+    @cached_property
+    def matrix(self) -> FeatureMatrix:
+        return get_feature_matrix()
+
+    @cached_property
+    def mask(self) -> np.ndarray:
+        return self.matrix.mask_excluding(self.exclude_ids)
+
+    def mask_without(self, exclude_ids: Iterable[int] | None = None) -> np.ndarray:
+        extra = set(exclude_ids or ()) - self.exclude_ids
+        if not extra:
+            return self.mask
+        return self.mask & self.matrix.mask_excluding(extra)
+
+    def score_map(self, scores: np.ndarray) -> dict[int, float]:
+        """Positive scores of the snapshot's rows, keyed by product id."""
+        selected = self.mask & (scores > 0)
+        return dict(zip(self.matrix.ids[selected].tolist(), scores[selected].tolist()))
+
+    def similarity_candidates(self):
+        """Queryset with just the columns the live content scorer reads.
+
+        Descriptions are not loaded; the scorer uses the persisted tokens.
+        """
+        return (
+            Product.objects.filter(is_active=True)
+            .exclude(pk__in=self.exclude_ids)
+            .select_related("signature")
+            .only(*self.PRODUCT_FIELDS, "signature__tokens")
+        )
+
+    def load_products(self, ids: Iterable[int]) -> dict[int, Product]:
+        ids = list(ids)
+        missing = [pk for pk in ids if pk not in self._products]
+        if missing:
+            self._products.update(Product.objects.only(*self.PRODUCT_FIELDS).in_bulk(missing))
+        return {pk: self._products[pk] for pk in ids if pk in self._products}
+
+    def ranked(self, scores: np.ndarray, mask: np.ndarray, k: int | None) -> list[tuple[Product, float]]:
+        """Select the top ``k`` masked rows and materialize only those, best first."""
+        indices = top_k_indices(scores, mask, k)
+        ids = self.matrix.ids[indices].tolist()
+        products = self.load_products(ids)
+        return [
+            (products[pk], float(scores[index]))
+            for pk, index in zip(ids, indices.tolist())
+            if pk in products
+        ]
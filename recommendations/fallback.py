@@ -1,13 +1,28 @@
 from typing import Iterable
 
-from products.models import Product
+from .algorithms import POPULAR_REASON, ScoredProduct, score_popular_products
+from .engine import CandidateSnapshot
+from .popularity import get_leaderboard, is_dirty, refresh_if_due
 
-from .algorithms import score_popular_products
 
-
-def get_popular_recommendations(limit: int = 8, exclude_ids: Iterable[int] | None = None):
+def get_popular_recommendations(
+    limit: int = 8,
+    exclude_ids: Iterable[int] | None = None,
+    snapshot: CandidateSnapshot | None = None,
+):
     """Return stable popular-product fallback recommendations."""
-    exclude_ids = set(exclude_ids or [])
-    candidates = Product.objects.filter(is_active=True).exclude(pk__in=exclude_ids)
-    ranked = score_popular_products(candidates)
-    return ranked[:limit]
+    refresh_if_due()
+    if is_dirty():
+        # Changes are waiting for a throttled refresh; live scores include them.
+        return score_popular_products(k=limit, exclude_ids=exclude_ids, snapshot=snapshot)
+
+    ranked = [
+        ScoredProduct(product=product, score=score, reason=POPULAR_REASON)
+        for product, score in get_leaderboard(limit, exclude_ids=exclude_ids, snapshot=snapshot)
+    ]
+    if len(ranked) < limit:
+        # Not materialized yet, or too few rows after exclusions: top up live.
+        seen = {item.product.pk for item in ranked}
+        live = score_popular_products(k=limit, exclude_ids=set(exclude_ids or ()) | seen, snapshot=snapshot)
+        ranked.extend(live[: limit - len(ranked)])
+    return ranked
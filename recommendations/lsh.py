@@ -0,0 +1,112 @@
+"""MinHash / LSH shortlisting for content similarity on large catalogs.
+
+Exact scoring compares a product with every other product. Above
+``RECOMMENDATION_LSH_MIN_CATALOG`` active products, the similarity index
+instead shortlists candidates that share at least one LSH bucket with the
+product (i.e. whose descriptions are likely to overlap) plus the products of
+the same category, and the exact scorer only re-ranks that shortlist.
+
+The MinHash signature has ``bands * rows`` values. More bands (or fewer rows
+per band) raise recall and shortlist size; fewer bands or more rows make
+lookups cheaper but miss more weakly similar products. Changing either
+setting requires ``backfill_product_tokens`` to recompute signatures.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import zlib
+from typing import Iterable
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Q
+
+from products.models import Product
+
+from .engine import get_feature_matrix
+from .models import LSHBucket
+
+_PRIME = (1 << 31) - 1
+_SEED = 5430
+
+
+def lsh_shape() -> tuple[int, int]:
+    """Return ``(bands, rows)`` from settings."""
+    return (
+        getattr(settings, "RECOMMENDATION_LSH_BANDS", 16),
+        getattr(settings, "RECOMMENDATION_LSH_ROWS", 4),
+    )
+
+
+def _permutations(size: int) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(_SEED)
+    a = rng.integers(1, _PRIME, size=size, dtype=np.int64)
+    b = rng.integers(0, _PRIME, size=size, dtype=np.int64)
+    return a, b
+
+
+def minhash(tokens: Iterable[str]) -> list[int]:
+    """MinHash signature of a token set; empty when there are no tokens."""
+    tokens = list(tokens)
+    if not tokens:
+        return []
+    bands, rows = lsh_shape()
+    a, b = _permutations(bands * rows)
+    hashed = np.array([zlib.crc32(token.encode()) & _PRIME for token in tokens], dtype=np.int64)
+    # (a * x + b) mod p for every (permutation, token) pair; both factors are
+    # below 2**31 so the product fits in int64.
+    values = (np.outer(a, hashed) + b[:, None]) % _PRIME
+    return values.min(axis=1).tolist()
+
+
+def band_buckets(signature: list[int]) -> list[tuple[int, int]]:
+    """Hash each band of a MinHash signature to a signed 64-bit bucket id."""
+    bands, rows = lsh_shape()
+    if len(signature) != bands * rows:
+        return []
+    buckets = []
+    for band in range(bands):
+        chunk = ",".join(map(str, signature[band * rows:(band + 1) * rows])).encode()
+        digest = hashlib.blake2b(chunk, digest_size=8).digest()
+        buckets.append((band, int.from_bytes(digest, "big", signed=True)))
+    return buckets
+
+
+def index_product(product_id: int, signature: list[int]) -> None:
+    """Replace the LSH buckets of one product."""
+    LSHBucket.objects.filter(product_id=product_id).delete()
+    LSHBucket.objects.bulk_create(
+        [LSHBucket(product_id=product_id, band=band, bucket=bucket) for band, bucket in band_buckets(signature)]
+    )
+
+
+def use_lsh() -> bool:
+    threshold = getattr(settings, "RECOMMENDATION_LSH_MIN_CATALOG", 2000)
+    return len(get_feature_matrix()) >= threshold
+
+
+def shortlist(product: Product, candidates):
+    """Narrow a candidate queryset to the LSH neighbours of ``product``.
+
+    Returns ``candidates`` unchanged for small catalogs or when the product
+    has no signature, so exact scoring is kept wherever it is affordable.
+    """
+    if not use_lsh():
+        return candidates
+    try:
+        signature = product.signature.minhash
+    except ObjectDoesNotExist:
+        return candidates
+
+    buckets = band_buckets(signature)
+    if not buckets:
+        return candidates
+    collisions = Q()
+    for band, bucket in buckets:
+        collisions |= Q(band=band, bucket=bucket)
+    neighbour_ids = LSHBucket.objects.filter(collisions).values("product_id")
+
+    same_category = Q(category_id=product.category_id) if product.category_id else Q(pk__in=[])
+    return candidates.filter(Q(pk__in=neighbour_ids) | same_category)
@@ -0,0 +1,31 @@
+"""
+Management command: backfill_product_tokens
+
+Computes the persisted description token sets (``ProductSignature``) for an
+existing catalog. New and edited products get theirs on save; run this once
+after deploying, or with --missing to fill gaps only.
+
+Usage:
+    python manage.py backfill_product_tokens            # recompute all
+    python manage.py backfill_product_tokens --missing  # only products without one
+"""
+
+from django.core.management.base import BaseCommand
+
+from recommendations.signatures import backfill_signatures
+
+
+class Command(BaseCommand):
+    help = "Backfill pre-tokenized product descriptions for content similarity."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--missing",
+            action="store_true",
+            help="Only create signatures for products that do not have one yet.",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        written = backfill_signatures(only_missing=options["missing"], batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} product signatures."))
@@ -0,0 +1,22 @@
+"""
+Management command: build_similarity_index
+
+Rebuilds the precomputed ``ProductSimilarity`` table from scratch. The table
+is kept up to date incrementally on every Product save, so this is only
+needed after bulk imports or a change to the similarity weights.
+
+Usage:
+    python manage.py build_similarity_index
+"""
+
+from django.core.management.base import BaseCommand
+
+from recommendations.similarity import rebuild_similarity_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product-similarity nearest-neighbour table."
+
+    def handle(self, *args, **options):
+        written = rebuild_similarity_index()
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} similarity rows."))
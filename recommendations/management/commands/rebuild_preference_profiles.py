@@ -0,0 +1,27 @@
+"""
+Management command: rebuild_preference_profiles
+
+Recomputes every stored ``UserPreferenceProfile`` from the raw view,
+bookmark, cart and purchase records. Profiles are normally maintained
+incrementally by signals; run this after bulk imports or to clear drift
+left by products that changed category.
+
+Usage:
+    python manage.py rebuild_preference_profiles
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from recommendations.profiles import rebuild_user_preference_profile
+
+
+class Command(BaseCommand):
+    help = "Rebuild all user preference profiles from scratch."
+
+    def handle(self, *args, **options):
+        rebuilt = 0
+        for user in get_user_model().objects.iterator():
+            rebuild_user_preference_profile(user)
+            rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} preference profiles."))
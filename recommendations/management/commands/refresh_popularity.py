@@ -0,0 +1,23 @@
+"""
+Management command: refresh_popularity
+
+Recomputes the materialized ``PopularityScore`` leaderboard used by the
+popular-product fallback. Writes refresh it automatically (throttled), but
+the recency term decays with time, so schedule this command (e.g. hourly
+via cron) as well.
+
+Usage:
+    python manage.py refresh_popularity
+"""
+
+from django.core.management.base import BaseCommand
+
+from recommendations.popularity import refresh_popularity_scores
+
+
+class Command(BaseCommand):
+    help = "Refresh the materialized popularity leaderboard."
+
+    def handle(self, *args, **options):
+        written = refresh_popularity_scores()
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {written} popularity scores."))
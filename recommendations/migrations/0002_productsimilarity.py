@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_remove_product_stock_inventory_review'),
+        ('recommendations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSimilarity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('reason', models.CharField(max_length=255)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similarity_neighbours', to='products.product')),
+                ('similar_product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product')),
+            ],
+            options={
+                'verbose_name_plural': 'product similarities',
+                'ordering': ['product', '-score'],
+                'indexes': [models.Index(fields=['product', '-score'], name='product_similarity_rank_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'similar_product'), name='unique_product_similarity')],
+            },
+        ),
+    ]
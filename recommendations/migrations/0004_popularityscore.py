@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_remove_product_stock_inventory_review'),
+        ('recommendations', '0003_userpreferenceprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PopularityScore',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity', serialize=False, to='products.product')),
+                ('units_sold', models.PositiveIntegerField(default=0)),
+                ('average_rating', models.FloatField(default=0.0)),
+                ('score', models.FloatField(db_index=True)),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-score'],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_remove_product_stock_inventory_review'),
+        ('recommendations', '0005_productsignature'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productsignature',
+            name='minhash',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.CreateModel(
+            name='LSHBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField()),
+                ('bucket', models.BigIntegerField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lsh_buckets', to='products.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['band', 'bucket'], name='lsh_bucket_lookup_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'band'), name='unique_lsh_band_per_product')],
+            },
+        ),
+    ]
@@ -1,5 +1,87 @@
+from collections import defaultdict
+from contextlib import nullcontext
+
 from django.conf import settings
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import F
+from django.utils import timezone
+
+
+class ProductViewEventManager(models.Manager):
+    """Atomic view counters.
+
+    ``record_views`` adds views with one ``INSERT … ON CONFLICT DO UPDATE``
+    statement per batch, so the count is never read back into Python and
+    concurrent writers cannot lose increments. Like ``QuerySet.update()`` it
+    sends no model signals; callers apply any side effects themselves.
+    """
+
+    # Four parameters per row keeps a batch under SQLite's variable limit.
+    BATCH_SIZE = 200
+
+    def record_view(self, user_id, product_id, count=1):
+        self.record_views({(user_id, product_id): count})
+
+    def record_views(self, counts):
+        """Add ``counts[(user_id, product_id)]`` views, creating missing rows."""
+        counts = [(key, count) for key, count in counts.items() if count > 0]
+        if not counts:
+            return
+
+        connection = connections[self.db]
+        now = timezone.now()
+        if not connection.features.supports_update_conflicts_with_target:
+            self._record_views_fallback(counts, now)
+            return
+
+        meta = self.model._meta
+        table = connection.ops.quote_name(meta.db_table)
+        user_col, product_col, count_col, viewed_col = (
+            connection.ops.quote_name(meta.get_field(name).column)
+            for name in ("user", "product", "view_count", "last_viewed_at")
+        )
+        viewed_at = meta.get_field("last_viewed_at").get_db_prep_save(now, connection)
+
+        # A single batch is already atomic; only multi-batch writes need a transaction.
+        atomic = transaction.atomic(using=self.db) if len(counts) > self.BATCH_SIZE else nullcontext()
+        with atomic, connection.cursor() as cursor:
+            for start in range(0, len(counts), self.BATCH_SIZE):
+                batch = counts[start : start + self.BATCH_SIZE]
+                params = []
+                for (user_id, product_id), count in batch:
+                    params.extend([user_id, product_id, count, viewed_at])
+                cursor.execute(
+                    f"INSERT INTO {table} ({user_col}, {product_col}, {count_col}, {viewed_col}) "
+                    f"VALUES {', '.join(['(%s, %s, %s, %s)'] * len(batch))} "
+                    f"ON CONFLICT ({user_col}, {product_col}) DO UPDATE SET "
+                    f"{count_col} = {table}.{count_col} + EXCLUDED.{count_col}, "
+                    f"{viewed_col} = EXCLUDED.{viewed_col}",
+                    params,
+                )
+
+    def _record_views_fallback(self, counts, now):
+        # Backends without ON CONFLICT: insert empty rows, then F() increments
+        # (one UPDATE per distinct amount; nearly every pair has one view).
+        with transaction.atomic(using=self.db):
+            self.bulk_create(
+                [
+                    self.model(user_id=user_id, product_id=product_id, view_count=0)
+                    for (user_id, product_id), _ in counts
+                ],
+                ignore_conflicts=True,
+            )
+            wanted = dict(counts)
+            rows = self.filter(
+                user_id__in={user_id for (user_id, _), _ in counts},
+                product_id__in={product_id for (_, product_id), _ in counts},
+            ).values_list("pk", "user_id", "product_id")
+            by_amount = defaultdict(list)
+            for pk, user_id, product_id in rows:
+                amount = wanted.get((user_id, product_id))
+                if amount:
+                    by_amount[amount].append(pk)
+            for amount, pks in by_amount.items():
+                self.filter(pk__in=pks).update(view_count=F("view_count") + amount, last_viewed_at=now)
 
 
 class ProductViewEvent(models.Model):
@@ -18,6 +100,8 @@ class ProductViewEvent(models.Model):
     view_count = models.PositiveIntegerField(default=1)
     last_viewed_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductViewEventManager()
+
     class Meta:
         ordering = ["-last_viewed_at"]
         constraints = [
@@ -29,3 +113,123 @@ class ProductViewEvent(models.Model):
 
     def __str__(self):
         return f"{self.user.email} viewed {self.product.name} ({self.view_count})"
+
+
+class ProductSimilarity(models.Model):
+    """Precomputed nearest-neighbour row for content-based recommendations.
+
+    Each product keeps at most ``RECOMMENDATION_SIMILARITY_TOP_K`` rows, so the
+    product page can read its similar items with a single indexed query.
+    """
+
+    product = models.ForeignKey(
+        "products.Product",
+        on_delete=models.CASCADE,
+        related_name="similarity_neighbours",
+    )
+    similar_product = models.ForeignKey(
+        "products.Product",
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    score = models.FloatField()
+    reason = models.CharField(max_length=255)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["product", "-score"]
+        verbose_name_plural = "product similarities"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "similar_product"],
+                name="unique_product_similarity",
+            )
+        ]
+        indexes = [
+            models.Index(fields=["product", "-score"], name="product_similarity_rank_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} ~ {self.similar_product_id} ({self.score:.3f})"
+
+
+class UserPreferenceProfile(models.Model):
+    """Persisted category/brand/tag weights built from a user's interactions.
+
+    Kept in sync incrementally by signals in ``recommendations.signals``; the
+    ``rebuild_preference_profiles`` command recomputes it from raw events.
+    """
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="preference_profile",
+    )
+    category_weights = models.JSONField(default=dict, blank=True)
+    brand_weights = models.JSONField(default=dict, blank=True)
+    tag_weights = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Preference profile for {self.user.email}"
+
+
+class PopularityScore(models.Model):
+    """Materialized popularity leaderboard read by the popular fallback."""
+
+    product = models.OneToOneField(
+        "products.Product",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="popularity",
+    )
+    units_sold = models.PositiveIntegerField(default=0)
+    average_rating = models.FloatField(default=0.0)
+    score = models.FloatField(db_index=True)
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-score"]
+
+    def __str__(self):
+        return f"{self.product_id} popularity {self.score:.3f}"
+
+
+class ProductSignature(models.Model):
+    """Pre-tokenized description of a product for content similarity."""
+
+    product = models.OneToOneField(
+        "products.Product",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="signature",
+    )
+    tokens = models.JSONField(default=list, blank=True)
+    minhash = models.JSONField(default=list, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Signature for product {self.product_id} ({len(self.tokens)} tokens)"
+
+
+class LSHBucket(models.Model):
+    """One MinHash band of a product, hashed to a bucket for LSH lookups."""
+
+    product = models.ForeignKey(
+        "products.Product",
+        on_delete=models.CASCADE,
+        related_name="lsh_buckets",
+    )
+    band = models.PositiveSmallIntegerField()
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["band", "bucket"], name="lsh_bucket_lookup_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["product", "band"], name="unique_lsh_band_per_product"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} band {self.band} -> {self.bucket}"
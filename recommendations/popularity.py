@@ -0,0 +1,142 @@
+"""Materialized popularity leaderboard.
+
+The popular fallback serves every anonymous home page and every error path,
+so instead of scoring the catalog per call we store the blended popularity
+score in ``PopularityScore`` and read a pre-sorted slice.
+
+Commits that change its inputs only mark the leaderboard dirty. A dirty
+leaderboard is refreshed at most once per
+``RECOMMENDATION_POPULARITY_REFRESH_INTERVAL`` seconds (0 refreshes right
+after the commit): by a trailing timer thread when
+``RECOMMENDATION_POPULARITY_REFRESH_THREAD`` is on, otherwise by the first
+popular read once the interval has passed. A change made while a refresh is
+throttled stays marked, so it is picked up by the next one rather than
+dropped. Until then the fallback serves live scores (see ``fallback``).
+The ``refresh_popularity`` command should also run on a schedule so the
+recency term keeps decaying.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Iterable
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connection, transaction
+
+from .engine import CandidateSnapshot, build_feature_matrix, popularity_scores
+from .models import PopularityScore
+
+REFRESH_LOCK_KEY = "recommendations:popularity-refresh-lock"
+DIRTY_KEY = "recommendations:popularity-dirty"
+
+
+def _refresh_interval() -> int:
+    return getattr(settings, "RECOMMENDATION_POPULARITY_REFRESH_INTERVAL", 60)
+
+
+def refresh_popularity_scores() -> int:
+    """Recompute every row from a fresh feature matrix. Returns the row count."""
+    # Cleared first: a change committed during the refresh marks it again.
+    cache.delete(DIRTY_KEY)
+    matrix = build_feature_matrix()
+    scores = popularity_scores(matrix, np.ones(len(matrix), dtype=bool))
+    rows = [
+        PopularityScore(
+            product_id=pk,
+            units_sold=int(sold),
+            average_rating=float(rating),
+            score=float(score),
+        )
+        for pk, sold, rating, score in zip(
+            matrix.ids.tolist(), matrix.sales.tolist(), matrix.rating.tolist(), scores.tolist()
+        )
+    ]
+    with transaction.atomic():
+        # Rows are upserted in place, so readers never see an empty table.
+        PopularityScore.objects.exclude(product_id__in=matrix.ids.tolist()).delete()
+        if connection.features.supports_update_conflicts_with_target:
+            PopularityScore.objects.bulk_create(
+                rows,
+                batch_size=500,
+                update_conflicts=True,
+                unique_fields=["product"],
+                update_fields=["units_sold", "average_rating", "score", "refreshed_at"],
+            )
+        else:
+            PopularityScore.objects.all().delete()
+            PopularityScore.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def is_dirty() -> bool:
+    return cache.get(DIRTY_KEY) is not None
+
+
+def refresh_if_due() -> bool:
+    """Refresh a dirty leaderboard unless one ran within the interval."""
+    if not is_dirty():
+        return False
+    interval = _refresh_interval()
+    if interval > 0 and not cache.add(REFRESH_LOCK_KEY, True, timeout=interval):
+        _schedule_trailing_refresh()
+        return False
+    refresh_popularity_scores()
+    return True
+
+
+_timer: threading.Timer | None = None
+_timer_lock = threading.Lock()
+
+
+def _run_trailing_refresh() -> None:
+    global _timer
+    with _timer_lock:
+        _timer = None
+    try:
+        refresh_if_due()
+    finally:
+        close_old_connections()
+
+
+def _schedule_trailing_refresh() -> None:
+    global _timer
+    if not getattr(settings, "RECOMMENDATION_POPULARITY_REFRESH_THREAD", False):
+        return
+    with _timer_lock:
+        if _timer is None:
+            _timer = threading.Timer(max(_refresh_interval(), 0.1), _run_trailing_refresh)
+            _timer.daemon = True
+            _timer.start()
+
+
+def mark_popularity_dirty() -> None:
+    cache.set(DIRTY_KEY, time.time(), timeout=None)
+    if _refresh_interval() <= 0:
+        refresh_if_due()
+    else:
+        _schedule_trailing_refresh()
+
+
+def schedule_popularity_refresh() -> None:
+    """Mark the leaderboard dirty once the current transaction commits."""
+    transaction.on_commit(mark_popularity_dirty)
+
+
+def get_leaderboard(limit: int, exclude_ids: Iterable[int] | None = None, snapshot: CandidateSnapshot | None = None):
+    """Return ``(product, score)`` pairs from the materialized table, best first."""
+    exclude_ids = set(exclude_ids or ())
+    if snapshot is not None:
+        exclude_ids |= snapshot.exclude_ids
+    fields = CandidateSnapshot.PRODUCT_FIELDS
+    rows = (
+        PopularityScore.objects.filter(product__is_active=True)
+        .exclude(product_id__in=exclude_ids)
+        .select_related("product")
+        .only("score", *(f"product__{field}" for field in fields))
+        .order_by("-score", "-product_id")[:limit]
+    )
+    return [(row.product, row.score) for row in rows]
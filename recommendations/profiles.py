@@ -0,0 +1,129 @@
+"""Cached user preference profiles.
+
+``algorithms.build_user_preference_profile`` replays every view, bookmark,
+cart line and purchase of a user. This module persists its result in
+``UserPreferenceProfile`` and applies per-interaction deltas from signals,
+so reading a profile is a single primary-key lookup.
+
+Deltas are attributed to the product's *current* category/brand/tags, so a
+product moved to another category leaves stale weight behind until the next
+``rebuild_preference_profiles`` run.
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+
+from django.db import transaction
+from django.utils import timezone
+
+from products.models import Product
+
+from .algorithms import INTERACTION_WEIGHTS, _extract_brand, _extract_tags, build_user_preference_profile
+from .models import UserPreferenceProfile
+
+
+def _encode(counter: Counter) -> dict:
+    return {str(key): value for key, value in counter.items() if value > 0}
+
+
+def _decode(weights: dict, int_keys: bool = False) -> Counter:
+    if int_keys:
+        return Counter({int(key): value for key, value in weights.items()})
+    return Counter(weights)
+
+
+def _to_profile(row: UserPreferenceProfile) -> dict[str, Counter]:
+    return {
+        "category": _decode(row.category_weights, int_keys=True),
+        "brand": _decode(row.brand_weights),
+        "tag": _decode(row.tag_weights),
+    }
+
+
+def save_user_preference_profile(user, profile: dict[str, Counter]) -> UserPreferenceProfile:
+    row, _ = UserPreferenceProfile.objects.update_or_create(
+        user=user,
+        defaults={
+            "category_weights": _encode(profile["category"]),
+            "brand_weights": _encode(profile["brand"]),
+            "tag_weights": _encode(profile["tag"]),
+        },
+    )
+    return row
+
+
+def rebuild_user_preference_profile(user) -> dict[str, Counter]:
+    profile = build_user_preference_profile(user)
+    save_user_preference_profile(user, profile)
+    return profile
+
+
+def get_user_preference_profile(user) -> dict[str, Counter]:
+    """Return the stored profile, building it on first access."""
+    row = UserPreferenceProfile.objects.filter(user=user).first()
+    if row is None:
+        return rebuild_user_preference_profile(user)
+    return _to_profile(row)
+
+
+def record_interaction(user_id: int | None, product_id: int | None, kind: str, amount: int = 1) -> None:
+    """Apply ``amount`` interactions of ``kind`` (may be negative) to a stored profile.
+
+    Users without a stored profile are skipped: their profile is built from
+    the raw events on first read, which already includes this interaction.
+    """
+    if user_id is None or product_id is None or not amount:
+        return
+    record_interactions({(user_id, product_id): amount}, kind)
+
+
+def record_interactions(amounts: dict[tuple[int, int], int], kind: str, products=None) -> None:
+    """Apply ``amounts[(user_id, product_id)]`` interactions of ``kind`` in bulk.
+
+    Locks and loads every affected profile in one query, the products in
+    another (unless ``products``, a pk → Product mapping, is given) and
+    writes each profile once.
+    """
+    amounts = {pair: amount for pair, amount in amounts.items() if amount}
+    if not amounts:
+        return
+    if products is None:
+        products = Product.objects.in_bulk({product_id for _, product_id in amounts})
+
+    with transaction.atomic():
+        rows = (
+            UserPreferenceProfile.objects.select_for_update()
+            .filter(user_id__in={user_id for user_id, _ in amounts})
+            .order_by("user_id")
+        )
+        rows = {row.user_id: row for row in rows}
+        changed = {}
+        for (user_id, product_id), amount in amounts.items():
+            row, product = rows.get(user_id), products.get(product_id)
+            if row is None or product is None:
+                continue
+            if user_id not in changed:
+                changed[user_id] = _to_profile(row)
+            profile = changed[user_id]
+            points = INTERACTION_WEIGHTS[kind] * amount
+            if product.category_id:
+                profile["category"][product.category_id] += points
+            brand = _extract_brand(product)
+            if brand:
+                profile["brand"][brand] += points
+            for tag in _extract_tags(product):
+                profile["tag"][tag] += points
+
+        now = timezone.now()
+        for user_id, profile in changed.items():
+            row = rows[user_id]
+            row.category_weights = _encode(profile["category"])
+            row.brand_weights = _encode(profile["brand"])
+            row.tag_weights = _encode(profile["tag"])
+            row.updated_at = now
+        UserPreferenceProfile.objects.bulk_update(
+            [rows[user_id] for user_id in changed],
+            ["category_weights", "brand_weights", "tag_weights", "updated_at"],
+            batch_size=500,
+        )
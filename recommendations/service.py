@@ -1,15 +1,29 @@
 from __future__ import annotations
 
 import logging
+from dataclasses import replace
+from itertools import islice
+from typing import Iterable
 
 from django.conf import settings
 
 from cart.models import CartItem
 from products.models import Product
 
-from .algorithms import ScoredProduct, score_for_user_profile, score_similar_products
+from .algorithms import (
+    ScoredProduct,
+    iter_similar_to_anchors,
+    score_for_user_profile,
+    score_similar_products,
+    top_k,
+)
+from .cache import recommendation_cache
+from .engine import CandidateSnapshot, profile_scores
 from .fallback import get_popular_recommendations
-from .models import ProductViewEvent
+from .lsh import shortlist
+from .profiles import get_user_preference_profile
+from .similarity import get_similar_products
+from .tracking import view_buffer
 
 logger = logging.getLogger(__name__)
 
@@ -19,16 +33,16 @@ def _feature_enabled() -> bool:
 
 
 def track_product_view(user, product: Product) -> None:
-    """Record view behavior in a dedicated recommendation-only table."""
+    """Record view behavior in a dedicated recommendation-only table.
+
+    The view is buffered in process and written later in bulk (see ``tracking``).
+    """
     if not _feature_enabled():
         return
     if not user.is_authenticated:
         return
 
-    event, created = ProductViewEvent.objects.get_or_create(user=user, product=product)
-    if not created:
-        event.view_count += 1
-        event.save(update_fields=["view_count", "last_viewed_at"])
+    view_buffer.record(user.pk, product.pk)
 
 
 def _to_payload(recommendations: list[ScoredProduct], strategy: str):
@@ -43,21 +57,56 @@ def _to_payload(recommendations: list[ScoredProduct], strategy: str):
     ]
 
 
-def _fill_with_popular(existing: list[ScoredProduct], limit: int, exclude_ids=None) -> list[ScoredProduct]:
-    existing = list(existing)
+def _fill_with_popular(
+    existing: Iterable[ScoredProduct],
+    limit: int,
+    exclude_ids=None,
+    snapshot: CandidateSnapshot | None = None,
+) -> list[ScoredProduct]:
+    result = list(islice(existing, limit))
+    if len(result) >= limit:
+        return result
+
     exclude_ids = set(exclude_ids or [])
-    exclude_ids.update(item.product.pk for item in existing)
+    exclude_ids.update(item.product.pk for item in result)
+    result.extend(
+        get_popular_recommendations(limit=limit - len(result), exclude_ids=exclude_ids, snapshot=snapshot)
+    )
+    return result
 
-    if len(existing) >= limit:
-        return existing[:limit]
 
-    needed = limit - len(existing)
-    fallback = get_popular_recommendations(limit=needed, exclude_ids=exclude_ids)
-    existing.extend(fallback)
-    return existing[:limit]
+def _user_key(user):
+    return user.pk if user is not None and user.is_authenticated else None
 
 
 def get_home_recommendations(user, limit: int = 8):
+    return recommendation_cache.get_or_compute(
+        ("home", _user_key(user), None, limit),
+        lambda: _compute_home_recommendations(user, limit),
+    )
+
+
+def get_product_recommendations(product: Product, user=None, limit: int = 4):
+    return recommendation_cache.get_or_compute(
+        ("product", _user_key(user), (product.pk, product.updated_at), limit),
+        lambda: _compute_product_recommendations(product, user, limit),
+    )
+
+
+def get_cart_recommendations(user, limit: int = 4):
+    user_key = _user_key(user)
+    fingerprint = None
+    if user_key is not None:
+        fingerprint = tuple(
+            CartItem.objects.filter(cart__user=user).order_by("product_id").values_list("product_id", "quantity")
+        )
+    return recommendation_cache.get_or_compute(
+        ("cart", user_key, fingerprint, limit),
+        lambda: _compute_cart_recommendations(user, limit),
+    )
+
+
+def _compute_home_recommendations(user, limit: int):
     if not _feature_enabled():
         fallback = get_popular_recommendations(limit=limit)
         return _to_payload(fallback, strategy="popular")
@@ -67,8 +116,7 @@ def get_home_recommendations(user, limit: int = 8):
             fallback = get_popular_recommendations(limit=limit)
             return _to_payload(fallback, strategy="popular")
 
-        candidates = Product.objects.filter(is_active=True).select_related("category")
-        personalized = score_for_user_profile(user, candidates)
+        personalized = score_for_user_profile(user, k=limit, profile=get_user_preference_profile(user))
 
         if not personalized:
             fallback = get_popular_recommendations(limit=limit)
@@ -82,27 +130,38 @@ def get_home_recommendations(user, limit: int = 8):
         return _to_payload(fallback, strategy="popular")
 
 
-def get_product_recommendations(product: Product, user=None, limit: int = 4):
+def _compute_product_recommendations(product: Product, user, limit: int):
     if not _feature_enabled():
         fallback = get_popular_recommendations(limit=limit, exclude_ids=[product.pk])
         return _to_payload(fallback, strategy="popular")
 
     try:
-        candidates = Product.objects.filter(is_active=True).exclude(pk=product.pk).select_related("category")
-        similar = score_similar_products(product, candidates)
+        # One snapshot of the catalog is shared by every scorer below, and
+        # each stage only runs if the previous ones left slots to fill, so
+        # the page issues a constant number of queries.
+        snapshot = CandidateSnapshot(exclude_ids=[product.pk])
+        similar = get_similar_products(product, limit=limit)
+        if not similar:
+            # The index has no row for this product yet (e.g. never built).
+            similar = score_similar_products(product, shortlist(product, snapshot.similarity_candidates()), k=limit)
+
         if user and user.is_authenticated:
-            personalized = score_for_user_profile(user, candidates)
-            merged = []
-            seen = set()
-            for item in similar + personalized:
-                if item.product.pk in seen:
-                    continue
-                seen.add(item.product.pk)
-                merged.append(item)
-            result = _fill_with_popular(merged, limit=limit, exclude_ids=[product.pk])
+            merged = list(similar)
+            if len(merged) < limit:
+                seen = {item.product.pk for item in merged}
+                merged.extend(
+                    score_for_user_profile(
+                        user,
+                        k=limit - len(merged),
+                        exclude_ids=seen,
+                        profile=get_user_preference_profile(user),
+                        snapshot=snapshot,
+                    )
+                )
+            result = _fill_with_popular(merged, limit=limit, snapshot=snapshot)
             return _to_payload(result, strategy="content+personalized")
 
-        result = _fill_with_popular(similar, limit=limit, exclude_ids=[product.pk])
+        result = _fill_with_popular(similar, limit=limit, snapshot=snapshot)
         return _to_payload(result, strategy="content")
     except Exception:
         logger.exception("Product recommendations failed, fallback to popular.")
@@ -110,7 +169,7 @@ def get_product_recommendations(product: Product, user=None, limit: int = 4):
         return _to_payload(fallback, strategy="popular")
 
 
-def get_cart_recommendations(user, limit: int = 4):
+def _compute_cart_recommendations(user, limit: int):
     if not _feature_enabled():
         fallback = get_popular_recommendations(limit=limit)
         return _to_payload(fallback, strategy="popular")
@@ -121,37 +180,29 @@ def get_cart_recommendations(user, limit: int = 4):
             return _to_payload(fallback, strategy="popular")
 
         cart_items = list(
-            CartItem.objects.filter(cart__user=user).select_related("product__category")
+            CartItem.objects.filter(cart__user=user).select_related("product__signature")
         )
 
         if not cart_items:
             return get_home_recommendations(user, limit=limit)
 
         in_cart_ids = {item.product_id for item in cart_items}
-        candidates = Product.objects.filter(is_active=True).exclude(pk__in=in_cart_ids).select_related("category")
-
-        merged_scores = {}
-        for item in cart_items:
-            similar = score_similar_products(item.product, candidates)
-            for scored in similar:
-                merged_scores.setdefault(scored.product.pk, {"product": scored.product, "score": 0.0, "reason": scored.reason})
-                merged_scores[scored.product.pk]["score"] += scored.score
-
-        personalized = score_for_user_profile(user, candidates)
-        for scored in personalized:
-            merged_scores.setdefault(
-                scored.product.pk,
-                {"product": scored.product, "score": 0.0, "reason": "You may also need these items"},
-            )
-            merged_scores[scored.product.pk]["score"] += scored.score
-
-        ranked = [
-            ScoredProduct(product=value["product"], score=value["score"], reason=value["reason"])
-            for value in merged_scores.values()
-        ]
-        ranked.sort(key=lambda item: item.score, reverse=True)
-
-        result = _fill_with_popular(ranked, limit=limit, exclude_ids=in_cart_ids)
+        snapshot = CandidateSnapshot(exclude_ids=in_cart_ids)
+
+        # Profile affinity is added to each candidate's summed similarity to
+        # all cart anchors, which are scored together in one streamed pass.
+        profile = get_user_preference_profile(user)
+        affinity = snapshot.score_map(profile_scores(snapshot.matrix, profile))
+        similar = iter_similar_to_anchors(
+            [item.product for item in cart_items],
+            snapshot.similarity_candidates(),
+        )
+        ranked = top_k(
+            (replace(item, score=item.score + affinity.get(item.product.pk, 0.0)) for item in similar),
+            limit,
+        )
+
+        result = _fill_with_popular(ranked, limit=limit, snapshot=snapshot)
         return _to_payload(result, strategy="cart-hybrid")
     except Exception:
         logger.exception("Cart recommendations failed, fallback to popular.")
@@ -0,0 +1,195 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from bookmarks.models import Bookmark
+from cart.models import CartItem
+from orders.models import Order, OrderItem
+from orders.signals import order_placed
+from products.models import Product, Review
+
+from .cache import recommendation_cache
+from .engine import invalidate_feature_matrix
+from .models import ProductViewEvent
+from .popularity import schedule_popularity_refresh
+from .profiles import record_interaction
+from .signatures import refresh_product_signature
+from .similarity import refresh_product_similarity
+
+
+# Product fields read by the content scorer; saves that touch none of them
+# leave the similarity index as it is.
+SIMILARITY_FIELDS = ("category_id", "price", "discount_price", "description", "is_active")
+
+
+def _similarity_inputs(instance):
+    # Read from __dict__ so deferred fields are not fetched on load.
+    return tuple(instance.__dict__.get(field) for field in SIMILARITY_FIELDS)
+
+
+def _remember_similarity_inputs(sender, instance, **kwargs):
+    instance._similarity_inputs = _similarity_inputs(instance)
+
+
+post_init.connect(_remember_similarity_inputs, sender=Product, dispatch_uid="recommendations_similarity_inputs")
+
+
+def _refresh_similarity(product_id):
+    product = Product.objects.filter(pk=product_id).select_related("category").first()
+    if product is None:
+        return
+    # The similarity refresh reads the tokens, so the signature goes first.
+    refresh_product_signature(product)
+    refresh_product_similarity(product)
+
+
+@receiver(post_save, sender=Product, dispatch_uid="recommendations_refresh_similarity")
+def refresh_similarity_on_product_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous, current = instance._similarity_inputs, _similarity_inputs(instance)
+    instance._similarity_inputs = current
+    if not created and previous == current:
+        return
+    # Rescoring is O(catalog); run it once the product write has committed
+    # rather than inside the request's transaction.
+    transaction.on_commit(partial(_refresh_similarity, instance.pk))
+
+
+# ---------------------------------------------------------------------------
+# Feature matrix, popularity leaderboard and cached results — any change to
+# the scored columns makes them stale
+# ---------------------------------------------------------------------------
+def _invalidate_features(sender, raw=False, **kwargs):
+    if not raw:
+        invalidate_feature_matrix()
+        schedule_popularity_refresh()
+        recommendation_cache.clear()
+
+
+for _model in (Product, OrderItem, Review):
+    post_save.connect(_invalidate_features, sender=_model, dispatch_uid=f"recommendations_features_{_model.__name__}")
+    post_delete.connect(
+        _invalidate_features,
+        sender=_model,
+        dispatch_uid=f"recommendations_features_delete_{_model.__name__}",
+    )
+
+
+def _remember_status(sender, instance, **kwargs):
+    instance._popularity_status = instance.__dict__.get("status")
+
+
+post_init.connect(_remember_status, sender=Order, dispatch_uid="recommendations_order_status")
+
+
+@receiver(post_save, sender=Order, dispatch_uid="recommendations_popularity_order_status")
+def refresh_popularity_on_status_change(sender, instance, created, raw=False, **kwargs):
+    if raw or created or instance.status == instance._popularity_status:
+        return
+    instance._popularity_status = instance.status
+    schedule_popularity_refresh()
+
+
+# ---------------------------------------------------------------------------
+# Preference profiles — apply each interaction as a delta
+# ---------------------------------------------------------------------------
+# Quantity-like fields are remembered when an instance is loaded so that a
+# later save only contributes the difference.
+_COUNTED_FIELDS = {
+    ProductViewEvent: "view_count",
+    CartItem: "quantity",
+    OrderItem: "quantity",
+}
+
+
+def _remember_count(sender, instance, **kwargs):
+    # Read from __dict__ so deferred fields are not fetched on load.
+    instance._profile_count = instance.__dict__.get(_COUNTED_FIELDS[sender])
+
+
+for _model in _COUNTED_FIELDS:
+    post_init.connect(_remember_count, sender=_model, dispatch_uid=f"recommendations_count_{_model.__name__}")
+
+
+def _count_delta(instance, created):
+    field = _COUNTED_FIELDS[type(instance)]
+    current = getattr(instance, field)
+    previous = 0 if created else instance._profile_count
+    instance._profile_count = current
+    if previous is None:
+        return 0
+    return current - previous
+
+
+def _owner_id(instance, relation):
+    """Return the user id behind ``instance.<relation>`` without failing mid-cascade."""
+    field = instance._meta.get_field(relation)
+    if field.is_cached(instance):
+        return getattr(instance, relation).user_id
+    return (
+        field.related_model.objects.filter(pk=getattr(instance, field.attname))
+        .values_list("user_id", flat=True)
+        .first()
+    )
+
+
+@receiver(post_save, sender=ProductViewEvent, dispatch_uid="recommendations_profile_view")
+def profile_on_view(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        record_interaction(instance.user_id, instance.product_id, "view", _count_delta(instance, created))
+
+
+@receiver(post_delete, sender=ProductViewEvent, dispatch_uid="recommendations_profile_view_delete")
+def profile_on_view_delete(sender, instance, **kwargs):
+    record_interaction(instance.user_id, instance.product_id, "view", -instance.view_count)
+
+
+@receiver(post_save, sender=Bookmark, dispatch_uid="recommendations_profile_bookmark")
+def profile_on_bookmark(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        record_interaction(instance.user_id, instance.product_id, "favorite")
+        recommendation_cache.invalidate_user(instance.user_id)
+
+
+@receiver(post_delete, sender=Bookmark, dispatch_uid="recommendations_profile_bookmark_delete")
+def profile_on_bookmark_delete(sender, instance, **kwargs):
+    record_interaction(instance.user_id, instance.product_id, "favorite", -1)
+    recommendation_cache.invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=CartItem, dispatch_uid="recommendations_profile_cart")
+def profile_on_cart_item(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        user_id = _owner_id(instance, "cart")
+        record_interaction(user_id, instance.product_id, "cart", _count_delta(instance, created))
+        recommendation_cache.invalidate_user(user_id)
+
+
+@receiver(post_delete, sender=CartItem, dispatch_uid="recommendations_profile_cart_delete")
+def profile_on_cart_item_delete(sender, instance, **kwargs):
+    user_id = _owner_id(instance, "cart")
+    record_interaction(user_id, instance.product_id, "cart", -instance.quantity)
+    recommendation_cache.invalidate_user(user_id)
+
+
+@receiver(post_save, sender=OrderItem, dispatch_uid="recommendations_profile_purchase")
+def profile_on_purchase(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        record_interaction(_owner_id(instance, "order"), instance.product_id, "purchase", _count_delta(instance, created))
+
+
+@receiver(post_delete, sender=OrderItem, dispatch_uid="recommendations_profile_purchase_delete")
+def profile_on_purchase_delete(sender, instance, **kwargs):
+    record_interaction(_owner_id(instance, "order"), instance.product_id, "purchase", -instance.quantity)
+
+
+@receiver(order_placed, dispatch_uid="recommendations_order_placed")
+def profile_on_order_placed(sender, order, items, **kwargs):
+    # Checkout bulk-creates the lines, which skips the OrderItem receivers
+    # above; apply their effects once for the whole order.
+    for item in items:
+        record_interaction(order.user_id, item.product_id, "purchase", item.quantity)
+    _invalidate_features(OrderItem)
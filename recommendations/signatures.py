@@ -0,0 +1,69 @@
+"""Persisted description token sets used by content similarity.
+
+Tokenizing every candidate's description on each similarity computation is
+wasted work: the text only changes when the product is saved. The token set
+is stored in ``ProductSignature`` on save and read through
+``select_related("signature")`` by the scorers, together with the MinHash
+signature and LSH buckets used to shortlist candidates (see ``lsh``).
+"""
+
+from __future__ import annotations
+
+from django.db import transaction
+
+from products.models import Product
+
+from .algorithms import _tokenize
+from .lsh import band_buckets, index_product, minhash
+from .models import LSHBucket, ProductSignature
+
+
+def _signature_for(product: Product) -> ProductSignature:
+    tokens = sorted(_tokenize(product.description))
+    return ProductSignature(product=product, tokens=tokens, minhash=minhash(tokens))
+
+
+def refresh_product_signature(product: Product) -> ProductSignature:
+    signature = _signature_for(product)
+    signature.save()
+    index_product(product.pk, signature.minhash)
+    # Keep the instance's cached relation in step for scorers that run next.
+    product.signature = signature
+    return signature
+
+
+def backfill_signatures(only_missing: bool = False, batch_size: int = 500) -> int:
+    """(Re)compute signatures for the catalog. Returns the number written."""
+    products = Product.objects.only("pk", "description")
+    if only_missing:
+        products = products.filter(signature__isnull=True)
+
+    written = 0
+    batch: list[ProductSignature] = []
+    for product in products.iterator(chunk_size=batch_size):
+        batch.append(_signature_for(product))
+        if len(batch) >= batch_size:
+            written += _write(batch)
+            batch = []
+    if batch:
+        written += _write(batch)
+    return written
+
+
+def _write(batch: list[ProductSignature]) -> int:
+    with transaction.atomic():
+        ProductSignature.objects.bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=["product"],
+            update_fields=["tokens", "minhash", "updated_at"],
+        )
+        LSHBucket.objects.filter(product_id__in=[signature.product_id for signature in batch]).delete()
+        LSHBucket.objects.bulk_create(
+            [
+                LSHBucket(product_id=signature.product_id, band=band, bucket=bucket)
+                for signature in batch
+                for band, bucket in band_buckets(signature.minhash)
+            ]
+        )
+    return len(batch)
@@ -0,0 +1,130 @@
+"""Precomputed product-similarity index.
+
+The content scorer in ``algorithms.score_similar_products`` is O(catalog) per
+call. This module stores its top-K output per product in ``ProductSimilarity``
+so request-time lookups become a single indexed query. The pair score is
+symmetric, which lets a single product save patch every affected row.
+On large catalogs the candidates are first shortlisted with LSH (``lsh``).
+"""
+
+from __future__ import annotations
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min
+
+from products.models import Product
+
+from .algorithms import ScoredProduct, score_similar_products
+from .engine import CandidateSnapshot
+from .lsh import shortlist
+from .models import ProductSimilarity
+
+
+def _top_k() -> int:
+    return getattr(settings, "RECOMMENDATION_SIMILARITY_TOP_K", 20)
+
+
+def _active_candidates(product: Product):
+    candidates = Product.objects.filter(is_active=True).exclude(pk=product.pk).select_related("category", "signature")
+    return shortlist(product, candidates)
+
+
+def _rows_for(product: Product, ranked: list[ScoredProduct]) -> list[ProductSimilarity]:
+    return [
+        ProductSimilarity(
+            product=product,
+            similar_product=item.product,
+            score=item.score,
+            reason=item.reason,
+        )
+        for item in ranked[: _top_k()]
+    ]
+
+
+def rebuild_similarity_index() -> int:
+    """Recompute the whole table from scratch. Returns the number of rows written."""
+    rows: list[ProductSimilarity] = []
+    for product in Product.objects.filter(is_active=True).select_related("category", "signature"):
+        ranked = score_similar_products(product, _active_candidates(product), k=_top_k())
+        rows.extend(_rows_for(product, ranked))
+
+    with transaction.atomic():
+        ProductSimilarity.objects.all().delete()
+        ProductSimilarity.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+@transaction.atomic
+def refresh_product_similarity(product: Product) -> None:
+    """Incrementally update the index after *product* was created or changed."""
+    # Drop every row mentioning the product; the neighbours that lose it
+    # temporarily keep K-1 entries until the next rebuild or re-insert below.
+    ProductSimilarity.objects.filter(product=product).delete()
+    ProductSimilarity.objects.filter(similar_product=product).delete()
+
+    if not product.is_active:
+        return
+
+    ranked = score_similar_products(product, _active_candidates(product))
+    ProductSimilarity.objects.bulk_create(_rows_for(product, ranked))
+
+    # Because the score is symmetric, ``ranked`` also tells us where the
+    # product would land in each neighbour's own list.
+    top_k = _top_k()
+    neighbour_ids = [item.product.pk for item in ranked]
+    floors = {
+        row["product"]: (row["size"], row["floor"])
+        for row in ProductSimilarity.objects.filter(product_id__in=neighbour_ids)
+        .exclude(similar_product=product)
+        .values("product")
+        .annotate(size=Count("id"), floor=Min("score"))
+    }
+
+    reverse_rows = []
+    evict_from = set()
+    for item in ranked:
+        size, floor = floors.get(item.product.pk, (0, None))
+        if size < top_k:
+            reverse_rows.append(item)
+        elif item.score > floor:
+            reverse_rows.append(item)
+            evict_from.add(item.product.pk)
+
+    ProductSimilarity.objects.bulk_create(
+        [
+            ProductSimilarity(
+                product=item.product,
+                similar_product=product,
+                score=item.score,
+                reason=item.reason,
+            )
+            for item in reverse_rows
+        ]
+    )
+    if evict_from:
+        # The weakest existing row of every full neighbour, found in one
+        # ordered read and removed with one DELETE.
+        weakest = {}
+        for pk, neighbour_id in (
+            ProductSimilarity.objects.filter(product_id__in=evict_from)
+            .exclude(similar_product=product)
+            .order_by("-score", "-pk")
+            .values_list("pk", "product_id")
+        ):
+            weakest[neighbour_id] = pk
+        ProductSimilarity.objects.filter(pk__in=weakest.values()).delete()
+
+
+def get_similar_products(product: Product, limit: int) -> list[ScoredProduct]:
+    """Read the precomputed neighbours of *product* with one indexed query."""
+    rows = (
+        ProductSimilarity.objects.filter(product=product, similar_product__is_active=True)
+        .select_related("similar_product")
+        .only("score", "reason", *(f"similar_product__{field}" for field in CandidateSnapshot.PRODUCT_FIELDS))
+        .order_by("-score")[:limit]
+    )
+    return [
+        ScoredProduct(product=row.similar_product, score=row.score, reason=row.reason)
+        for row in rows
+    ]
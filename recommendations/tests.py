@@ -1,14 +1,59 @@
+from collections import Counter
+from io import StringIO
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
 from bookmarks.models import Bookmark
-from products.models import Category, Product
-from recommendations.models import ProductViewEvent
-from recommendations.service import get_cart_recommendations, get_home_recommendations, get_product_recommendations
+from cart.models import Cart, CartItem
+from orders.models import Order, OrderItem
+from products.models import Category, Product, Review
+from recommendations.algorithms import (
+    ScoredProduct,
+    build_user_preference_profile,
+    score_popular_products,
+    score_similar_products,
+    top_k,
+)
+from recommendations.cache import RecommendationCache, recommendation_cache
+from recommendations.engine import CandidateSnapshot, get_feature_matrix
+from recommendations.fallback import get_popular_recommendations
+from recommendations.lsh import minhash, shortlist
+from recommendations.models import (
+    PopularityScore,
+    ProductSignature,
+    ProductSimilarity,
+    ProductViewEvent,
+    UserPreferenceProfile,
+)
+from recommendations.popularity import (
+    REFRESH_LOCK_KEY,
+    is_dirty,
+    refresh_if_due,
+    refresh_popularity_scores,
+)
+from recommendations.profiles import get_user_preference_profile
+from recommendations.service import (
+    get_cart_recommendations,
+    get_home_recommendations,
+    get_product_recommendations,
+    track_product_view,
+)
+from recommendations.similarity import get_similar_products, rebuild_similarity_index
+from recommendations.tracking import ViewBuffer, view_buffer
 
 
-class RecommendationServiceTests(TestCase):
+class RecommendationTestBase(TestCase):
     def setUp(self):
+        # Views buffered by earlier tests (product pages of other apps) refer
+        # to rows that no longer exist.
+        view_buffer.clear()
+        self.addCleanup(view_buffer.clear)
         self.user_model = get_user_model()
         self.merchant = self.user_model.objects.create_user(
             email="merchant@example.com",
@@ -24,31 +69,35 @@ class RecommendationServiceTests(TestCase):
         self.cat_a = Category.objects.create(name="Sports")
         self.cat_b = Category.objects.create(name="Office")
 
-        self.p1 = Product.objects.create(
-            merchant=self.merchant,
-            category=self.cat_a,
-            name="Running Shoes",
-            description="Lightweight running sneakers",
-            price=100,
-            is_active=True,
-        )
-        self.p2 = Product.objects.create(
-            merchant=self.merchant,
-            category=self.cat_a,
-            name="Gym Bag",
-            description="Sports bag for training",
-            price=60,
-            is_active=True,
-        )
-        self.p3 = Product.objects.create(
-            merchant=self.merchant,
-            category=self.cat_b,
-            name="Office Chair",
-            description="Ergonomic chair",
-            price=140,
-            is_active=True,
-        )
+        # Similarity and signatures are refreshed once the product commits.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.p1 = Product.objects.create(
+                merchant=self.merchant,
+                category=self.cat_a,
+                name="Running Shoes",
+                description="Lightweight running sneakers",
+                price=100,
+                is_active=True,
+            )
+            self.p2 = Product.objects.create(
+                merchant=self.merchant,
+                category=self.cat_a,
+                name="Gym Bag",
+                description="Sports bag for training",
+                price=60,
+                is_active=True,
+            )
+            self.p3 = Product.objects.create(
+                merchant=self.merchant,
+                category=self.cat_b,
+                name="Office Chair",
+                description="Ergonomic chair",
+                price=140,
+                is_active=True,
+            )
 
+
+class RecommendationServiceTests(RecommendationTestBase):
     def test_home_recommendations_for_anonymous_uses_fallback(self):
         class Anonymous:
             is_authenticated = False
@@ -71,3 +120,416 @@ class RecommendationServiceTests(TestCase):
     def test_cart_recommendations_for_user_without_cart_still_returns_data(self):
         recs = get_cart_recommendations(self.user, limit=2)
         self.assertEqual(len(recs), 2)
+
+
+class ProductSimilarityIndexTests(RecommendationTestBase):
+    def test_index_is_maintained_on_product_save(self):
+        neighbours = [item.product for item in get_similar_products(self.p1, limit=5)]
+        self.assertEqual(neighbours[0], self.p2)
+        self.assertIn(self.p3, neighbours)
+        self.assertTrue(ProductSimilarity.objects.filter(product=self.p3, similar_product=self.p1).exists())
+
+    def test_deactivated_product_is_removed_from_index(self):
+        self.p2.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.p2.save()
+
+        self.assertFalse(ProductSimilarity.objects.filter(similar_product=self.p2).exists())
+        self.assertFalse(ProductSimilarity.objects.filter(product=self.p2).exists())
+
+    def test_incremental_index_matches_full_rebuild(self):
+        with self.settings(RECOMMENDATION_SIMILARITY_TOP_K=1):
+            rebuild_similarity_index()
+            with self.captureOnCommitCallbacks(execute=True):
+                Product.objects.create(
+                    merchant=self.merchant,
+                    category=self.cat_b,
+                    name="Desk Lamp",
+                    description="Ergonomic lamp for the office",
+                    price=40,
+                )
+            incremental = set(ProductSimilarity.objects.values_list("product", "similar_product"))
+            rebuild_similarity_index()
+            rebuilt = set(ProductSimilarity.objects.values_list("product", "similar_product"))
+
+        self.assertEqual(incremental, rebuilt)
+
+    def test_saves_without_scored_changes_skip_the_refresh(self):
+        product = Product.objects.get(pk=self.p1.pk)
+        product.name = "Running Shoes v2"
+        with mock.patch("recommendations.signals.refresh_product_similarity") as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                product.save()
+            refresh.assert_not_called()
+
+            product.price = 95
+            with self.captureOnCommitCallbacks(execute=True):
+                product.save()
+            refresh.assert_called_once()
+
+    def test_product_recommendations_use_single_index_lookup(self):
+        class Anonymous:
+            is_authenticated = False
+
+        with self.assertNumQueries(1):
+            recs = get_product_recommendations(self.p1, user=Anonymous(), limit=2)
+        self.assertEqual([item["product"] for item in recs], [self.p2, self.p3])
+
+
+class UserPreferenceProfileTests(RecommendationTestBase):
+    def test_profile_is_built_once_and_read_from_storage(self):
+        Bookmark.objects.create(user=self.user, product=self.p1)
+        get_user_preference_profile(self.user)
+
+        with self.assertNumQueries(1):
+            profile = get_user_preference_profile(self.user)
+        self.assertEqual(profile["category"][self.cat_a.pk], 3)
+
+    def test_signals_keep_profile_equal_to_full_rebuild(self):
+        get_user_preference_profile(self.user)
+
+        ProductViewEvent.objects.create(user=self.user, product=self.p3)
+        bookmark = Bookmark.objects.create(user=self.user, product=self.p1)
+        cart = Cart.objects.create(user=self.user)
+        item = CartItem.objects.create(cart=cart, product=self.p2, quantity=1)
+        item.quantity = 3
+        item.save()
+        bookmark.delete()
+
+        stored = UserPreferenceProfile.objects.get(user=self.user)
+        self.assertEqual(
+            get_user_preference_profile(self.user)["category"],
+            build_user_preference_profile(self.user)["category"],
+        )
+        self.assertEqual(stored.category_weights, {str(self.cat_a.pk): 12, str(self.cat_b.pk): 1})
+
+    def test_deleting_product_with_interactions_does_not_fail(self):
+        get_user_preference_profile(self.user)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.p2, quantity=2)
+
+        self.p2.delete()
+
+        self.assertEqual(get_user_preference_profile(self.user)["category"], Counter())
+
+
+class FeatureMatrixScoringTests(RecommendationTestBase):
+    def test_matrix_is_reused_until_invalidated(self):
+        matrix = get_feature_matrix()
+        self.assertIs(get_feature_matrix(), matrix)
+
+        Review.objects.create(product=self.p3, user=self.user, rating=5, comment="Great")
+        rebuilt = get_feature_matrix()
+        self.assertIsNot(rebuilt, matrix)
+        self.assertEqual(rebuilt.rating[rebuilt.ids.tolist().index(self.p3.pk)], 5.0)
+
+    def test_popular_scoring_materializes_only_top_k(self):
+        order = Order.objects.create(user=self.user, shipping_name="S", shipping_address="A")
+        OrderItem.objects.create(order=order, product=self.p3, product_name="Office Chair", product_price=140, quantity=3)
+        get_feature_matrix()
+
+        with self.assertNumQueries(1):
+            ranked = score_popular_products(k=2, exclude_ids=[self.p1.pk])
+        self.assertEqual([item.product for item in ranked], [self.p3, self.p2])
+
+
+class TopKSelectionTests(RecommendationTestBase):
+    def test_top_k_matches_stable_full_sort(self):
+        items = [
+            ScoredProduct(product=None, score=score, reason=str(index))
+            for index, score in enumerate([0.2, 0.9, 0.5, 0.9, 0.1])
+        ]
+
+        expected = sorted(items, key=lambda item: item.score, reverse=True)[:3]
+        self.assertEqual(top_k(iter(items), 3), expected)
+        self.assertEqual(top_k(items, None), sorted(items, key=lambda item: item.score, reverse=True))
+
+    def test_similar_scoring_keeps_only_k_results(self):
+        candidates = Product.objects.exclude(pk=self.p1.pk)
+
+        ranked = score_similar_products(self.p1, candidates, k=1)
+        self.assertEqual([item.product for item in ranked], [self.p2])
+
+
+class SharedCandidateSnapshotTests(RecommendationTestBase):
+    def _count_product_page_queries(self):
+        get_user_preference_profile(self.user)
+        get_feature_matrix()
+        with CaptureQueriesContext(connection) as captured:
+            recs = get_product_recommendations(self.p1, user=self.user, limit=8)
+        self.assertTrue(all(item["product"].pk != self.p1.pk for item in recs))
+        return len(captured)
+
+    def test_product_page_query_count_is_bounded_regardless_of_catalog(self):
+        Bookmark.objects.create(user=self.user, product=self.p3)
+        # Index lookup, stored profile, personalized picks, popular fill.
+        self.assertLessEqual(self._count_product_page_queries(), 4)
+
+        for index in range(10):
+            Product.objects.create(
+                merchant=self.merchant,
+                category=self.cat_b,
+                name=f"Filing Cabinet {index}",
+                description="Steel office storage",
+                price=80 + index,
+            )
+
+        self.assertLessEqual(self._count_product_page_queries(), 4)
+
+
+class PopularityLeaderboardTests(RecommendationTestBase):
+    def test_fallback_reads_presorted_slice_with_exclusions(self):
+        order = Order.objects.create(user=self.user, shipping_name="S", shipping_address="A")
+        OrderItem.objects.create(order=order, product=self.p1, product_name="Running Shoes", product_price=100)
+        refresh_popularity_scores()
+
+        with self.assertNumQueries(1):
+            ranked = get_popular_recommendations(limit=2, exclude_ids=[self.p3.pk])
+        self.assertEqual([item.product for item in ranked], [self.p1, self.p2])
+        self.assertEqual(PopularityScore.objects.get(product=self.p1).units_sold, 1)
+
+    @override_settings(RECOMMENDATION_POPULARITY_REFRESH_INTERVAL=0)
+    def test_review_save_refreshes_leaderboard_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(product=self.p3, user=self.user, rating=5, comment="Comfortable")
+
+        self.assertEqual(PopularityScore.objects.get(product=self.p3).average_rating, 5.0)
+        self.assertEqual(PopularityScore.objects.count(), 3)
+
+    @override_settings(RECOMMENDATION_POPULARITY_REFRESH_INTERVAL=60)
+    def test_change_during_throttle_is_refreshed_once_lock_expires(self):
+        refresh_popularity_scores()
+        cache.set(REFRESH_LOCK_KEY, True, timeout=60)
+        self.addCleanup(cache.delete, REFRESH_LOCK_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(product=self.p3, user=self.user, rating=5, comment="Comfortable")
+
+        # Throttled: the change stays marked and the fallback scores it live.
+        self.assertFalse(refresh_if_due())
+        self.assertTrue(is_dirty())
+        self.assertEqual(PopularityScore.objects.get(product=self.p3).average_rating, 0.0)
+        ranked = get_popular_recommendations(limit=3)
+        self.assertEqual(ranked[0].product, self.p3)
+
+        cache.delete(REFRESH_LOCK_KEY)
+        self.assertTrue(refresh_if_due())
+        self.assertFalse(is_dirty())
+        self.assertEqual(PopularityScore.objects.get(product=self.p3).average_rating, 5.0)
+
+    def test_short_leaderboard_is_topped_up_with_live_scores(self):
+        refresh_popularity_scores()
+        PopularityScore.objects.filter(product=self.p2).delete()
+
+        ranked = get_popular_recommendations(limit=3)
+        self.assertCountEqual([item.product for item in ranked], [self.p1, self.p2, self.p3])
+
+
+class CartAnchorBatchingTests(RecommendationTestBase):
+    def _cart_page_queries(self):
+        get_user_preference_profile(self.user)
+        get_feature_matrix()
+        with CaptureQueriesContext(connection) as captured:
+            recs = get_cart_recommendations(self.user, limit=1)
+        return len(captured), recs
+
+    def test_query_count_is_flat_as_cart_grows(self):
+        extra = [
+            Product.objects.create(
+                merchant=self.merchant,
+                category=self.cat_b,
+                name=f"Monitor Arm {index}",
+                description="Office desk accessory",
+                price=30,
+            )
+            for index in range(3)
+        ]
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.p3)
+        one_item, recs = self._cart_page_queries()
+        self.assertEqual(recs[0]["product"].category_id, self.cat_b.pk)
+
+        for product in extra[:2] + [self.p1]:
+            CartItem.objects.create(cart=cart, product=product)
+        self.assertEqual(self._cart_page_queries()[0], one_item)
+
+
+class ProductSignatureTests(RecommendationTestBase):
+    def test_tokens_are_refreshed_on_save(self):
+        self.assertEqual(ProductSignature.objects.get(product=self.p3).tokens, ["chair", "ergonomic"])
+
+        self.p3.description = "Mesh office chair"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.p3.save()
+        self.assertEqual(ProductSignature.objects.get(product=self.p3).tokens, ["chair", "mesh", "office"])
+
+    def test_similarity_scoring_does_not_load_descriptions(self):
+        anchor = Product.objects.select_related("signature").get(pk=self.p1.pk)
+        candidates = CandidateSnapshot(exclude_ids=[self.p1.pk]).similarity_candidates()
+
+        with self.assertNumQueries(1):
+            ranked = score_similar_products(anchor, candidates)
+        self.assertTrue(all("description" not in item.product.__dict__ for item in ranked))
+        self.assertEqual(ranked[0].product, self.p2)
+
+    def test_backfill_command_creates_missing_signatures(self):
+        ProductSignature.objects.all().delete()
+
+        call_command("backfill_product_tokens", "--missing", stdout=StringIO())
+        self.assertEqual(ProductSignature.objects.count(), 3)
+
+
+@override_settings(RECOMMENDATION_LSH_MIN_CATALOG=0)
+class LSHShortlistTests(RecommendationTestBase):
+    def test_minhash_estimates_jaccard(self):
+        first = minhash(f"token{index}" for index in range(100))
+        second = minhash(f"token{index}" for index in range(50, 150))
+
+        agreement = sum(x == y for x, y in zip(first, second)) / len(first)
+        self.assertAlmostEqual(agreement, 1 / 3, delta=0.2)
+
+    def test_shortlist_keeps_description_and_category_neighbours(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            trail_runner = Product.objects.create(
+                merchant=self.merchant,
+                category=self.cat_b,
+                name="Trail Runner",
+                description="Lightweight running sneakers",
+                price=90,
+            )
+        product = Product.objects.select_related("signature").get(pk=self.p1.pk)
+
+        shortlisted = set(shortlist(product, Product.objects.exclude(pk=product.pk)))
+        self.assertEqual(shortlisted, {self.p2, trail_runner})
+
+
+class RecommendationCacheTests(RecommendationTestBase):
+    def test_lru_evicts_oldest_entry_and_counts_hits(self):
+        cache = RecommendationCache(max_entries=2, ttl=60)
+        cache.get_or_compute(("home", None, None, 1), lambda: ["a"])
+        cache.get_or_compute(("home", 1, None, 1), lambda: ["b"])
+        cache.get_or_compute(("home", None, None, 1), lambda: ["stale"])
+        cache.get_or_compute(("home", 2, None, 1), lambda: ["c"])
+
+        self.assertEqual(cache.get_or_compute(("home", None, None, 1), lambda: ["fresh"]), ["a"])
+        self.assertEqual(cache.get_or_compute(("home", 1, None, 1), lambda: ["fresh"]), ["fresh"])
+        self.assertEqual(cache.stats(), {"hits": 2, "misses": 4, "evictions": 2, "size": 2})
+
+    def test_callers_cannot_mutate_cached_payload(self):
+        cache = RecommendationCache(max_entries=2, ttl=60)
+        cache.get_or_compute(("home", None, None, 1), lambda: [{"score": 1}])[0]["score"] = 99
+        cache.get_or_compute(("home", None, None, 1), list)[0]["score"] = 99
+
+        self.assertEqual(cache.get_or_compute(("home", None, None, 1), list), [{"score": 1}])
+
+    def test_payload_computed_across_clear_is_not_stored(self):
+        cache = RecommendationCache(max_entries=2, ttl=60)
+
+        def compute():
+            cache.clear()
+            return ["stale"]
+
+        self.assertEqual(cache.get_or_compute(("home", None, None, 1), compute), ["stale"])
+        self.assertEqual(cache.get_or_compute(("home", None, None, 1), lambda: ["fresh"]), ["fresh"])
+
+    def test_repeat_page_is_served_from_cache(self):
+        get_home_recommendations(self.user, limit=2)
+
+        with self.assertNumQueries(0):
+            get_home_recommendations(self.user, limit=2)
+
+    def test_bookmark_invalidates_only_that_users_entries(self):
+        class Anonymous:
+            is_authenticated = False
+
+        get_home_recommendations(self.user, limit=2)
+        get_home_recommendations(Anonymous(), limit=2)
+        Bookmark.objects.create(user=self.user, product=self.p3)
+
+        misses = recommendation_cache.stats()["misses"]
+        get_home_recommendations(Anonymous(), limit=2)
+        recs = get_home_recommendations(self.user, limit=2)
+        self.assertEqual(recommendation_cache.stats()["misses"], misses + 1)
+        self.assertEqual(recs[0]["strategy"], "personalized")
+
+
+class BufferedViewTrackingTests(RecommendationTestBase):
+    def test_views_are_coalesced_until_flush(self):
+        buffer = ViewBuffer(max_size=100, interval=60)
+        buffer.record(self.user.pk, self.p1.pk)
+        buffer.record(self.user.pk, self.p1.pk)
+        buffer.record(self.user.pk, self.p2.pk)
+
+        self.assertEqual(len(buffer), 2)
+        self.assertFalse(ProductViewEvent.objects.exists())
+
+        buffer.flush()
+        counts = dict(ProductViewEvent.objects.values_list("product_id", "view_count"))
+        self.assertEqual(counts, {self.p1.pk: 2, self.p2.pk: 1})
+        self.assertEqual(len(buffer), 0)
+
+    def test_flush_increments_existing_rows_and_profile(self):
+        ProductViewEvent.objects.create(user=self.user, product=self.p3, view_count=2)
+        get_user_preference_profile(self.user)
+
+        buffer = ViewBuffer(max_size=1, interval=60)
+        buffer.record(self.user.pk, self.p3.pk)
+
+        self.assertEqual(ProductViewEvent.objects.get(user=self.user, product=self.p3).view_count, 3)
+        self.assertEqual(get_user_preference_profile(self.user)["category"][self.cat_b.pk], 3)
+
+    def test_flush_cost_does_not_grow_with_the_number_of_pairs(self):
+        get_user_preference_profile(self.user)
+
+        def flush_queries(product_ids):
+            buffer = ViewBuffer(max_size=100, interval=60)
+            for product_id in product_ids:
+                buffer.record(self.user.pk, product_id)
+            with CaptureQueriesContext(connection) as captured:
+                buffer.flush()
+            return len(captured)
+
+        self.assertEqual(flush_queries([self.p1.pk]), flush_queries([self.p1.pk, self.p2.pk, self.p3.pk]))
+        self.assertEqual(get_user_preference_profile(self.user)["category"][self.cat_a.pk], 3)
+
+    def test_views_of_deleted_products_are_dropped(self):
+        buffer = ViewBuffer(max_size=100, interval=60)
+        buffer.record(self.user.pk, self.p2.pk)
+        buffer.record(self.user.pk, self.p3.pk)
+        self.p2.delete()
+
+        buffer.flush()
+        self.assertEqual(list(ProductViewEvent.objects.values_list("product_id", flat=True)), [self.p3.pk])
+
+    def test_track_product_view_writes_immediately_without_interval(self):
+        with override_settings(RECOMMENDATION_VIEW_FLUSH_INTERVAL=0):
+            track_product_view(self.user, self.p1)
+            track_product_view(self.user, self.p1)
+
+        self.assertEqual(ProductViewEvent.objects.get(user=self.user, product=self.p1).view_count, 2)
+
+
+class ProductViewUpsertTests(RecommendationTestBase):
+    def test_record_view_is_a_single_statement(self):
+        ProductViewEvent.objects.record_view(self.user.pk, self.p1.pk)
+        with self.assertNumQueries(1):
+            ProductViewEvent.objects.record_view(self.user.pk, self.p1.pk)
+
+        self.assertEqual(ProductViewEvent.objects.get(user=self.user, product=self.p1).view_count, 2)
+
+    def test_record_views_batches_new_and_existing_rows(self):
+        ProductViewEvent.objects.create(user=self.user, product=self.p1, view_count=4)
+
+        with self.assertNumQueries(1):
+            ProductViewEvent.objects.record_views({(self.user.pk, self.p1.pk): 2, (self.user.pk, self.p2.pk): 3})
+
+        counts = dict(ProductViewEvent.objects.values_list("product_id", "view_count"))
+        self.assertEqual(counts, {self.p1.pk: 6, self.p2.pk: 3})
+
+    def test_backends_without_upsert_use_f_increments(self):
+        ProductViewEvent.objects.create(user=self.user, product=self.p1, view_count=4)
+
+        with mock.patch.object(connection.features, "supports_update_conflicts_with_target", False):
+            ProductViewEvent.objects.record_views({(self.user.pk, self.p1.pk): 1, (self.user.pk, self.p2.pk): 1})
+
+        counts = dict(ProductViewEvent.objects.values_list("product_id", "view_count"))
+        self.assertEqual(counts, {self.p1.pk: 5, self.p2.pk: 1})
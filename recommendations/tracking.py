@@ -0,0 +1,137 @@
+"""Buffered product-view tracking.
+
+Recording a view used to cost a ``get_or_create`` plus an ``UPDATE`` on the
+product page request, which on SQLite queues every page view behind the
+database write lock. Views are now counted in an in-process buffer keyed by
+``(user id, product id)`` and written in bulk:
+
+* when the buffer holds ``RECOMMENDATION_VIEW_BUFFER_SIZE`` distinct pairs,
+* when its oldest entry is older than ``RECOMMENDATION_VIEW_FLUSH_INTERVAL``
+  seconds (checked on each new view, and by a background thread when
+  ``RECOMMENDATION_VIEW_FLUSH_THREAD`` is enabled),
+* and once more when the process exits.
+
+A flush is one ``ProductViewEvent.objects.record_views`` upsert, so
+concurrent flushes from several processes never overwrite each other. Bulk
+writes bypass model signals, so the flush applies the preference-profile
+deltas itself. Views still in the buffer of a process that is killed
+without a clean exit are lost.
+"""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections
+
+from products.models import Product
+
+from .models import ProductViewEvent
+from .profiles import record_interactions
+
+logger = logging.getLogger(__name__)
+
+
+def write_view_counts(counts: dict[tuple[int, int], int]) -> None:
+    """Add ``counts[(user_id, product_id)]`` views to the stored events."""
+    if not counts:
+        return
+
+    # Drop pairs whose user or product was deleted while they were buffered.
+    user_ids = set(
+        get_user_model().objects.filter(pk__in={user_id for user_id, _ in counts}).values_list("pk", flat=True)
+    )
+    products = Product.objects.in_bulk({product_id for _, product_id in counts})
+    counts = {
+        (user_id, product_id): amount
+        for (user_id, product_id), amount in counts.items()
+        if user_id in user_ids and product_id in products
+    }
+    if not counts:
+        return
+
+    ProductViewEvent.objects.record_views(counts)
+    record_interactions(counts, "view", products=products)
+
+
+class ViewBuffer:
+    def __init__(self, max_size: int | None = None, interval: float | None = None):
+        self._max_size = max_size
+        self._interval = interval
+        self._pending: Counter = Counter()
+        self._first_at: float | None = None
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+    @property
+    def max_size(self) -> int:
+        if self._max_size is not None:
+            return self._max_size
+        return getattr(settings, "RECOMMENDATION_VIEW_BUFFER_SIZE", 500)
+
+    @property
+    def interval(self) -> float:
+        if self._interval is not None:
+            return self._interval
+        return getattr(settings, "RECOMMENDATION_VIEW_FLUSH_INTERVAL", 5)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def record(self, user_id: int, product_id: int) -> None:
+        with self._lock:
+            if not self._pending:
+                self._first_at = time.monotonic()
+            self._pending[(user_id, product_id)] += 1
+            due = len(self._pending) >= self.max_size or self._is_stale()
+        self._ensure_thread()
+        if due:
+            self.flush()
+
+    def _is_stale(self) -> bool:
+        return self._first_at is not None and time.monotonic() - self._first_at >= self.interval
+
+    def flush(self) -> None:
+        with self._lock:
+            counts, self._pending = dict(self._pending), Counter()
+            self._first_at = None
+        if not counts:
+            return
+        try:
+            write_view_counts(counts)
+        except Exception:
+            logger.exception("Flushing %d buffered product views failed.", len(counts))
+
+    def clear(self) -> None:
+        """Drop buffered views without writing them."""
+        with self._lock:
+            self._pending = Counter()
+            self._first_at = None
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None or not getattr(settings, "RECOMMENDATION_VIEW_FLUSH_THREAD", False):
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="view-buffer-flush", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(max(self.interval, 0.1)):
+            self.flush()
+            close_old_connections()
+
+    def shutdown(self) -> None:
+        self._stopped.set()
+        self.flush()
+
+
+view_buffer = ViewBuffer()
+atexit.register(view_buffer.shutdown)